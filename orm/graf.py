@@ -0,0 +1,162 @@
+#
+#   Graf sodelovanj v pomnilniku
+#
+
+import random
+import time
+from array import array
+from collections import Counter
+
+
+def _csr(pari, n):
+    """
+    Vrni tabeli začetkov in sosedov (stisnjene vrstice, CSR)
+    za urejen seznam parov indeksov in število vozlišč `n`.
+    """
+    zacetki = array('q', [0] * (n + 1))
+    for izvor, _ in pari:
+        zacetki[izvor + 1] += 1
+    for i in range(n):
+        zacetki[i + 1] += zacetki[i]
+    return zacetki, array('q', (cilj for _, cilj in pari))
+
+
+class Graf:
+    """
+    Dvodelni graf v pomnilniku, zgrajen iz tabele odnosov.
+
+    Povezave med vozlišči in skupinami (npr. med osebami in filmi)
+    so shranjene v obliki stisnjenih vrstic (CSR) v obe smeri.
+    """
+
+    def __init__(self, odnos, vozlisca, skupine, **pogoji):
+        """
+        Konstruktor grafa.
+
+        Graf se zgradi iz stolpcev `vozlisca` in `skupine` tabele `odnos`,
+        pri čemer se upoštevajo le vrstice, ki ustrezajo pogojem.
+        """
+        self.odnos = odnos
+        self.vozlisca = vozlisca
+        self.skupine = skupine
+        self.pogoji = pogoji
+        self.zgradi()
+
+    def zgradi(self):
+        """
+        Na novo zgradi graf iz podatkov v bazi.
+        """
+        stolpci = self.odnos.stolpci(self.vozlisca, self.skupine, **self.pogoji)
+        pari = set(zip(map(int, stolpci[self.vozlisca]), map(int, stolpci[self.skupine])))
+        self.oznake_vozlisc = array('q', sorted({v for v, _ in pari}))
+        self.oznake_skupin = array('q', sorted({s for _, s in pari}))
+        self.indeksi_vozlisc = {v: i for i, v in enumerate(self.oznake_vozlisc)}
+        self.indeksi_skupin = {s: i for i, s in enumerate(self.oznake_skupin)}
+        pari = [(self.indeksi_vozlisc[v], self.indeksi_skupin[s]) for v, s in pari]
+        self.skupine_vozlisc = _csr(sorted(pari), len(self.oznake_vozlisc))
+        self.vozlisca_skupin = _csr(sorted((s, v) for v, s in pari), len(self.oznake_skupin))
+
+    @staticmethod
+    def _sosedi(csr, i):
+        """
+        Vrni sosede `i`-tega vozlišča v podanih stisnjenih vrsticah.
+        """
+        zacetki, sosedi = csr
+        return sosedi[zacetki[i]:zacetki[i + 1]]
+
+    def sodelavci(self, vozlisce, k=10):
+        """
+        Vrni seznam največ `k` parov (vozlišče, število skupnih skupin)
+        za vozlišča, s katerimi ima podano vozlišče največ skupnih skupin.
+        """
+        i = self.indeksi_vozlisc.get(vozlisce)
+        if i is None:
+            return []
+        stevci = Counter()
+        for s in self._sosedi(self.skupine_vozlisc, i):
+            stevci.update(self._sosedi(self.vozlisca_skupin, s))
+        del stevci[i]
+        return [(self.oznake_vozlisc[j], stevilo) for j, stevilo in
+                sorted(stevci.items(), key=lambda par: (-par[1], par[0]))[:k]]
+
+    def _razsiri(self, meja, starsi):
+        """
+        Razširi mejo iskanja v širino za en korak.
+
+        V slovar staršev doda nova vozlišča s parom (prejšnje vozlišče, skupina)
+        in vrne seznam novih vozlišč.
+        """
+        nova = []
+        for i in meja:
+            for s in self._sosedi(self.skupine_vozlisc, i):
+                for j in self._sosedi(self.vozlisca_skupin, s):
+                    if j not in starsi:
+                        starsi[j] = (i, s)
+                        nova.append(j)
+        return nova
+
+    def pot(self, od, do):
+        """
+        Vrni najkrajšo pot med podanima vozliščema
+        kot seznam izmenjujočih se oznak vozlišč in skupin.
+
+        Uporablja dvosmerno iskanje v širino.
+        Če poti ni, vrne `None`.
+        """
+        if od not in self.indeksi_vozlisc or do not in self.indeksi_vozlisc:
+            return None
+        a, b = self.indeksi_vozlisc[od], self.indeksi_vozlisc[do]
+        starsi_a, starsi_b = {a: None}, {b: None}
+        globine_a, globine_b = {a: 0}, {b: 0}
+        meja_a, meja_b = [a], [b]
+        while a not in starsi_b and meja_a and meja_b:
+            obrni = len(meja_b) < len(meja_a)
+            if obrni:
+                meja_a, meja_b = meja_b, meja_a
+                starsi_a, starsi_b = starsi_b, starsi_a
+                globine_a, globine_b = globine_b, globine_a
+            globina = globine_a[meja_a[0]] + 1
+            meja_a = self._razsiri(meja_a, starsi_a)
+            globine_a.update((j, globina) for j in meja_a)
+            srecanja = [j for j in meja_a if j in starsi_b]
+            if obrni:
+                meja_a, meja_b = meja_b, meja_a
+                starsi_a, starsi_b = starsi_b, starsi_a
+                globine_a, globine_b = globine_b, globine_a
+            if srecanja:
+                srecanje = min(srecanja, key=lambda j: globine_a[j] + globine_b[j])
+                break
+        else:
+            if a not in starsi_b:
+                return None
+            srecanje = a
+        pot = [self.oznake_vozlisc[srecanje]]
+        for starsi, dodaj in ((starsi_a, lambda x: pot.insert(0, x)),
+                              (starsi_b, pot.append)):
+            j = srecanje
+            while starsi[j] is not None:
+                j, s = starsi[j]
+                dodaj(self.oznake_skupin[s])
+                dodaj(self.oznake_vozlisc[j])
+        return pot
+
+
+if __name__ == '__main__':
+    from model import Vloga
+    zacetek = time.perf_counter()
+    graf = Graf(Vloga, 'oseba', 'film')
+    print(f"gradnja: {(time.perf_counter() - zacetek) * 1000:.1f} ms "
+          f"({len(graf.oznake_vozlisc)} oseb, {len(graf.oznake_skupin)} filmov, "
+          f"{len(graf.skupine_vozlisc[1])} povezav)")
+    random.seed(0)
+    osebe = graf.oznake_vozlisc
+    for opis, poizvedba in [('sodelavci', lambda: graf.sodelavci(random.choice(osebe))),
+                            ('pot', lambda: graf.pot(random.choice(osebe),
+                                                     random.choice(osebe)))]:
+        zakasnitve = []
+        for _ in range(200):
+            zacetek = time.perf_counter()
+            poizvedba()
+            zakasnitve.append((time.perf_counter() - zacetek) * 1000)
+        zakasnitve.sort()
+        print(f"{opis:10}: p50 = {zakasnitve[100]:.2f} ms, p99 = {zakasnitve[198]:.2f} ms")
@@ -0,0 +1,379 @@
+#
+#   Sprotne spremembe sheme baze
+#
+
+import time
+from dataclasses import dataclass, field, fields
+from orm import conn, Kazalec, Transakcija, Tabela, Entiteta, Pogled
+from orm import predpomnilnik, _ustvari_pomozne_tabele
+
+
+@dataclass
+class Korak:
+    """
+    Razred za korak migracije ene tabele.
+
+    Dejanje je 'ustvari' (nova tabela), 'dodaj' (dodajanje stolpcev na mestu),
+    'prezidaj' (prepis v novo tabelo), 'ponovi' (ponovna izdelava pogleda)
+    ali 'dopolni' (ustvarjanje manjkajočih in brisanje odvečnih pomožnih objektov,
+    npr. lestvic ter prožilcev dnevnika sprememb, generacij in pogledov).
+    """
+    razred: type
+    dejanje: str
+    stolpci: list = field(default_factory=list)
+    razlogi: list = field(default_factory=list)
+
+
+def _obstojeci_stolpci(cur, tabela):
+    """
+    Vrni slovar, ki imenom obstoječih stolpcev tabele priredi
+    tip, obveznost, privzeto vrednost in mesto v primarnem ključu.
+    """
+    cur.execute(f"PRAGMA table_info({tabela});")
+    return {ime: (tip.upper(), bool(obvezno), privzeto, kljuc)
+            for _, ime, tip, obvezno, privzeto, kljuc in cur.fetchall()}
+
+
+def _obstojece_enolicnosti(cur, tabela):
+    """
+    Vrni množico naborov stolpcev z omejitvijo UNIQUE v obstoječi tabeli.
+    """
+    cur.execute(f"PRAGMA index_list({tabela});")
+    indeksi = [vrstica[1] for vrstica in cur.fetchall() if vrstica[3] == 'u']
+    enolicnosti = set()
+    for indeks in indeksi:
+        cur.execute(f"PRAGMA index_info({indeks});")
+        enolicnosti.add(tuple(ime for _, _, ime in sorted(cur.fetchall())))
+    return enolicnosti
+
+
+def _obstojeci_tuji_kljuci(cur, tabela):
+    """
+    Vrni slovar, ki stolpcem s tujim ključem v obstoječi tabeli
+    priredi referencirano tabelo in njene stolpce.
+    """
+    cur.execute(f"PRAGMA foreign_key_list({tabela});")
+    tuji = {}
+    for _, _, referenca, stolpec, ciljni, *_ in cur.fetchall():
+        tuji.setdefault(stolpec, (referenca, []))[1].append(ciljni)
+    return {stolpec: (referenca, tuple(ciljni)) for stolpec, (referenca, ciljni) in tuji.items()}
+
+
+def _zeleni_stolpci(razred):
+    """
+    Vrni slovar, ki imenom stolpcev razreda priredi
+    tip, obveznost, privzeto vrednost in mesto v primarnem ključu.
+    """
+    kljuc = [f.name for f in razred._kljuc()]
+    return {f.name: (razred._tip(f).upper(), bool(f.metadata['obvezno']),
+                     None if f.default is None else str(f.default),
+                     kljuc.index(f.name) + 1 if f.name in kljuc else 0)
+            for f in fields(razred)}
+
+
+def _zelene_enolicnosti(razred):
+    """
+    Vrni množico naborov stolpcev, ki morajo biti v tabeli razreda enolični.
+    """
+    return {(f.name, ) for f in fields(razred) if f.metadata['enolicno']} | \
+        {tuple(enolicnost) for enolicnost in razred.ENOLICNOST}
+
+
+def _zeleni_tuji_kljuci(razred, reference=True):
+    """
+    Vrni slovar, ki stolpcem razreda s tujim ključem
+    priredi referencirano tabelo in njene stolpce.
+    """
+    if not reference:
+        return {}
+    return {f.name: (f.type._ime_tabele(), tuple(k.name for k in f.type._kljuc()))
+            for f in fields(razred) if issubclass(f.type, Entiteta)}
+
+
+def _mozno_dodati(razred, f):
+    """
+    Vrni, ali je mogoče stolpec za podano polje dodati obstoječi tabeli
+    z `ALTER TABLE ... ADD COLUMN`.
+    """
+    obvezno = f.metadata['obvezno']
+    return f not in razred._kljuc() and not f.metadata['enolicno'] and \
+        (not obvezno or f.default is not None) and \
+        not (issubclass(f.type, Entiteta) and obvezno)
+
+
+def _korak(cur, razred):
+    """
+    Vrni korak, potreben za uskladitev tabele razreda s sliko v bazi,
+    ali `None`, če sprememba ni potrebna.
+    """
+    tabela = razred._ime_tabele()
+    cur.execute("SELECT type, sql FROM sqlite_master WHERE name = ?;", [tabela])
+    vrstica = cur.fetchone()
+    if vrstica is None:
+        return Korak(razred, 'ustvari')
+    tip, sql = vrstica
+    if issubclass(razred, Pogled):
+        if (tip == 'view') != (not razred.MATERIALIZIRAN):
+            return Korak(razred, 'ponovi', razlogi=['vrsta pogleda'])
+        if tip == 'view':
+            zeleno = f"CREATE VIEW {tabela} ({razred._stolpci()}) AS {razred.POIZVEDBA}"
+            if sql.split() != zeleno.rstrip('; \n').split():
+                return Korak(razred, 'ponovi', razlogi=['poizvedba'])
+            return None
+    obstojeci = _obstojeci_stolpci(cur, tabela)
+    zeleni = _zeleni_stolpci(razred)
+    reference = not issubclass(razred, Pogled)
+    razlogi = [f"stolpec {ime} odstranjen" for ime in obstojeci if ime not in zeleni]
+    razlogi += [f"stolpec {ime} spremenjen" for ime, opis in zeleni.items()
+                if ime in obstojeci and obstojeci[ime] != opis]
+    if _obstojece_enolicnosti(cur, tabela) != _zelene_enolicnosti(razred):
+        razlogi.append("omejitve UNIQUE")
+    obstojeci_tuji = _obstojeci_tuji_kljuci(cur, tabela)
+    zeleni_tuji = _zeleni_tuji_kljuci(razred, reference)
+    razlogi += [f"tuji ključ stolpca {ime}" for ime in obstojeci_tuji
+                if ime in zeleni and obstojeci_tuji[ime] != zeleni_tuji.get(ime)]
+    razlogi += [f"tuji ključ stolpca {ime}" for ime in zeleni_tuji
+                if ime in obstojeci and ime not in obstojeci_tuji]
+    novi = [f for f in fields(razred) if f.name not in obstojeci]
+    razlogi += [f"stolpca {f.name} ni mogoče dodati" for f in novi
+                if not _mozno_dodati(razred, f)]
+    if issubclass(razred, Pogled) and (razlogi or novi):
+        return Korak(razred, 'ponovi', razlogi=razlogi or ["novi stolpci"])
+    if razlogi:
+        return Korak(razred, 'prezidaj', [f.name for f in novi], razlogi)
+    if novi:
+        return Korak(razred, 'dodaj', [f.name for f in novi])
+    return None
+
+
+def _pomozni_objekti(cur, razred):
+    """
+    Vrni seznam imen manjkajočih pomožnih objektov tabele razreda
+    in seznam parov tipa in imena odvečnih pomožnih objektov.
+    """
+    cur.execute("SELECT type, name FROM sqlite_master;")
+    obstojeci = {ime: tip for tip, ime in cur.fetchall()}
+    zeleni = razred._pomozni_objekti()
+    manjkajoci = sorted(ime for ime in zeleni if ime not in obstojeci)
+    odvecni = sorted((tip, ime) for ime, tip in obstojeci.items() if ime not in zeleni and
+                     ime.startswith(razred._predpone_pomoznih_objektov()))
+    return manjkajoci, odvecni
+
+
+def _korak_objektov(cur, razred):
+    """
+    Vrni korak, potreben za uskladitev pomožnih objektov tabele razreda,
+    ali `None`, če sprememba ni potrebna.
+    """
+    manjkajoci, odvecni = _pomozni_objekti(cur, razred)
+    if not manjkajoci and not odvecni:
+        return None
+    return Korak(razred, 'dopolni', razlogi=[*(f"manjka {ime}" for ime in manjkajoci),
+                                             *(f"odveč {ime}" for _, ime in odvecni)])
+
+
+def nacrt(razredi=None):
+    """
+    Vrni seznam korakov, potrebnih za uskladitev sheme baze z definicijami razredov.
+
+    Če seznam razredov ni podan, se preverijo vse tabele.
+    Razdeljene tabele se ne preverjajo.
+    Za obstoječe tabele se preverijo tudi pomožni objekti, ki jih ustvari ORM.
+    """
+    if razredi is None:
+        razredi = Tabela.TABELE
+    koraki = []
+    with Kazalec() as cur:
+        for razred in razredi:
+            if razred.RAZDELITEV is not None:
+                continue
+            korak = _korak(cur, razred)
+            if korak is not None:
+                koraki.append(korak)
+            if korak is None or korak.dejanje in ('dodaj', 'prezidaj'):
+                koraki.append(_korak_objektov(cur, razred))
+    return [korak for korak in koraki if korak is not None]
+
+
+def _dodaj_stolpce(razred, stolpci):
+    """
+    Dodaj stolpce obstoječi tabeli razreda.
+    """
+    polja = {f.name: f for f in fields(razred)}
+    with Kazalec() as cur:
+        with Transakcija(nacin='immediate'):
+            for stolpec in stolpci:
+                cur.execute(f"""
+                    ALTER TABLE {razred._ime_tabele()}
+                    ADD COLUMN {razred._sql_stolpec(polja[stolpec])};
+                """)
+
+
+def _dopolni(razred):
+    """
+    Odstrani odvečne in ustvari manjkajoče pomožne objekte tabele razreda.
+
+    Materializirani pogled se nato osveži,
+    saj spremembe odvisnih tabel brez prožilcev niso bile zabeležene.
+    """
+    with Kazalec() as cur:
+        with Transakcija(nacin='immediate'):
+            _, odvecni = _pomozni_objekti(cur, razred)
+            for tip, ime in sorted(odvecni, key=lambda par:
+                                   ('trigger', 'index', 'table', 'view').index(par[0])):
+                cur.execute(f"DROP {tip.upper()} IF EXISTS {ime};")
+            razred._ustvari_pomozne_objekte(cur=cur)
+            if issubclass(razred, Pogled) and razred.MATERIALIZIRAN:
+                razred.osvezi(cur=cur)
+
+
+def _ponovi(razred):
+    """
+    Na novo ustvari pogled ali materializirano tabelo pogleda.
+    """
+    tabela = razred._ime_tabele()
+    with Kazalec() as cur:
+        with Transakcija(nacin='immediate'):
+            cur.execute("SELECT type FROM sqlite_master WHERE name = ?;", [tabela])
+            tip, = cur.fetchone()
+            cur.execute(f"DROP {'VIEW' if tip == 'view' else 'TABLE'} {tabela};")
+            razred.pobrisi_tabelo(cur=cur)
+            razred.ustvari_tabelo(cur=cur)
+
+
+def _prezidaj(razred, paket, pavza):
+    """
+    Tabelo razreda prepiši v novo tabelo z želeno shemo,
+    ne da bi jo za dlje časa zaklenil.
+
+    Nova tabela se najprej ustvari ob obstoječi,
+    prožilci na obstoječi tabeli pa vanjo sproti prepisujejo vsa pisanja.
+    Vrstice se nato v kratkih transakcijah prepisujejo v paketih po `paket` vrstic,
+    med katerimi se počaka `pavza` sekund, tako da branje in pisanje
+    med migracijo nista ovirana.
+    Na koncu se v eni transakciji obstoječa tabela zamenja z novo
+    in se na njej ponovno ustvarijo indeksi in prožilci.
+    """
+    tabela = razred._ime_tabele()
+    nova = f"{tabela}_migracija"
+    prozilci = [f"{nova}_{operacija}" for operacija in ('vstavi', 'posodobi', 'izbrisi')]
+    with Kazalec() as cur:
+        obstojeci = _obstojeci_stolpci(cur, tabela)
+        skupni = [f.name for f in fields(razred) if f.name in obstojeci]
+        kljuc = [ime for ime, (*_, mesto) in sorted(obstojeci.items(), key=lambda x: x[1][3])
+                 if mesto]
+        if not kljuc or any(stolpec not in skupni for stolpec in kljuc):
+            raise ValueError("Tabele brez ohranjenega primarnega ključa ni mogoče prezidati!")
+        stolpci = ', '.join(skupni)
+        ujemanje = ' AND '.join(f"{nova}.{stolpec} = {{vrstica}}.{stolpec}"
+                                for stolpec in kljuc)
+        vstavi = f"""
+            INSERT INTO {nova} ({stolpci})
+            VALUES ({', '.join(f'NEW.{stolpec}' for stolpec in skupni)});
+        """
+        izbrisi = f"DELETE FROM {nova} WHERE {ujemanje.format(vrstica='OLD')};"
+        cur.execute("SELECT name, sql FROM sqlite_master WHERE tbl_name = ? "
+                    "AND type IN ('index', 'trigger') AND sql IS NOT NULL;", [tabela])
+        objekti = [(ime, sql) for ime, sql in cur.fetchall() if ime not in prozilci]
+        try:
+            with Transakcija(nacin='immediate'):
+                cur.execute(f"DROP TABLE IF EXISTS {nova};")
+                cur.execute(razred._sql_ustvari(nova))
+                for prozilec, operacija, telo in zip(prozilci, ('INSERT', 'UPDATE', 'DELETE'),
+                                                      (vstavi, izbrisi + vstavi, izbrisi)):
+                    cur.execute(f"""
+                        CREATE TRIGGER {prozilec} AFTER {operacija} ON {tabela}
+                        BEGIN
+                            {telo}
+                        END;
+                    """)
+            od = None
+            while True:
+                with Transakcija(nacin='immediate'):
+                    cur.execute(f"""
+                        SELECT MAX(rowid) FROM (
+                            SELECT rowid FROM {tabela}
+                             {'' if od is None else 'WHERE rowid > :od'}
+                             ORDER BY rowid LIMIT :paket
+                        );
+                    """, dict(od=od, paket=paket))
+                    do, = cur.fetchone()
+                    if do is None:
+                        break
+                    cur.execute(f"""
+                        INSERT INTO {nova} ({stolpci})
+                        SELECT {stolpci} FROM {tabela}
+                         WHERE {'' if od is None else 'rowid > :od AND'} rowid <= :do
+                           AND NOT EXISTS (
+                            SELECT 1 FROM {nova} WHERE {ujemanje.format(vrstica=tabela)}
+                        );
+                    """, dict(od=od, do=do))
+                od = do
+                if pavza:
+                    time.sleep(pavza)
+            _zamenjaj(cur, razred, nova, objekti)
+        except BaseException:
+            with Transakcija():
+                for prozilec in prozilci:
+                    cur.execute(f"DROP TRIGGER IF EXISTS {prozilec};")
+                cur.execute(f"DROP TABLE IF EXISTS {nova};")
+            raise
+
+
+def _zamenjaj(cur, razred, nova, objekti):
+    """
+    V eni transakciji zamenjaj tabelo razreda z novo tabelo
+    in na njej ponovno ustvari podane indekse in prožilce.
+
+    Tuji ključi se med zamenjavo izklopijo, na koncu pa se preveri,
+    da jih nova tabela ne krši.
+    """
+    tabela = razred._ime_tabele()
+    cur.execute("PRAGMA foreign_keys = OFF;")
+    cur.execute("PRAGMA legacy_alter_table = ON;")
+    try:
+        with Transakcija(nacin='immediate'):
+            cur.execute(f"DROP TABLE {tabela};")
+            cur.execute(f"ALTER TABLE {nova} RENAME TO {tabela};")
+            for _, sql in objekti:
+                cur.execute(sql)
+            for t in Tabela.TABELE:
+                if t is razred or any(issubclass(f.type, Entiteta) and f.type is razred
+                                      for f in fields(t)):
+                    cur.execute(f"PRAGMA foreign_key_check({t._ime_tabele()});")
+                    if cur.fetchone() is not None:
+                        raise ValueError("Nova tabela krši tuje ključe!")
+    finally:
+        cur.execute("PRAGMA legacy_alter_table = OFF;")
+        cur.execute("PRAGMA foreign_keys = ON;")
+
+
+def migriraj(razredi=None, paket=1000, pavza=0.0):
+    """
+    Uskladi shemo baze z definicijami razredov in vrni seznam izvedenih korakov.
+
+    Nove tabele se ustvarijo, stolpci, ki jih je mogoče dodati,
+    se dodajo na mestu, ostale tabele pa se prezidajo sproti (glej `_prezidaj`).
+    Pogledi se na novo ustvarijo.
+    Manjkajoči pomožni objekti (npr. lestvice in prožilci) se ustvarijo
+    in po potrebi napolnijo, odvečni pa odstranijo.
+    """
+    _ustvari_pomozne_tabele()
+    conn.commit()
+    koraki = nacrt(razredi)
+    for korak in koraki:
+        if korak.dejanje == 'ustvari':
+            with Transakcija(nacin='immediate'):
+                korak.razred.ustvari_tabelo()
+        elif korak.dejanje == 'dodaj':
+            _dodaj_stolpce(korak.razred, korak.stolpci)
+        elif korak.dejanje == 'ponovi':
+            _ponovi(korak.razred)
+        elif korak.dejanje == 'dopolni':
+            _dopolni(korak.razred)
+        else:
+            _prezidaj(korak.razred, paket, pavza)
+        korak.razred._razveljavi()
+    if koraki:
+        predpomnilnik.pocisti()
+    return koraki
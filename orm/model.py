@@ -6,8 +6,9 @@
 #
 
 import bcrypt
-from orm import Entiteta, Odnos
-from orm import polje, Padajoce, Vzorec
+from graf import Graf
+from orm import Entiteta, Odnos, Pogled
+from orm import polje, Padajoce, Vzorec, Lestvica
 
 
 class Uporabnik(Entiteta, vir='uporabnik.csv'):
@@ -32,6 +33,16 @@ class Uporabnik(Entiteta, vir='uporabnik.csv'):
             vrstica["geslo"] = None
         return vrstica
 
+    @classmethod
+    def _obdelaj_izvoz(cls, vrstica, pridruzeni):
+        """
+        Obdelaj vrstico pred izvozom.
+
+        Gesla se ne izvozijo.
+        """
+        return dict(uporabnisko_ime=vrstica['uporabnisko_ime'], geslo=None,
+                    admin=vrstica['admin'])
+
     @staticmethod
     def prijavi(uporabnisko_ime, geslo):
         """
@@ -93,7 +104,8 @@ class Oznaka(Entiteta, kljuc='kratica', uredi=['kratica']):
     IME = 'kratica'
 
 
-class Film(Entiteta, vir='film.csv'):
+class Film(Entiteta, vir='film.csv', spremembe=True,
+           lestvice=[Lestvica('leto', [Padajoce('ocena')])]):
     """
     Razred za film.
     """
@@ -130,7 +142,14 @@ class Film(Entiteta, vir='film.csv'):
         """
         Vrni najboljših n filmov v danem letu.
         """
-        yield from Film.seznam(leto=leto, uredi=[Padajoce('ocena')], omejitev=n)
+        yield from Film.lestvica('leto', leto, n)
+
+    @staticmethod
+    def najboljsi_po_letih(n=1):
+        """
+        Vrni najboljših n filmov v vsakem letu, urejene po letih.
+        """
+        yield from Film.lestvica('leto', n=n)
 
     def zasedba(self):
         """
@@ -141,6 +160,24 @@ class Film(Entiteta, vir='film.csv'):
         """
         yield from self.vloga_film(uredi=[Padajoce('tip'), 'mesto'])
 
+    @staticmethod
+    def z_zasedbo(idf):
+        """
+        Vrni film z danim ID-jem in seznam njegove zasedbe
+        v vrstnem redu kot pri metodi zasedba,
+        prebrana z eno samo poizvedbo.
+        """
+        film, odnosi = Film.z_odnosi(idf, vloga_film=dict(uredi=[Padajoce('tip'), 'mesto']))
+        return film, odnosi['vloga_film']
+
+    def podobni(self, k=10):
+        """
+        Vrni največ k filmov, ki so filmu self
+        najbolj podobni po žanrih in zasedbi.
+        Podobnosti so izračunane vnaprej s podobnosti.izracunaj().
+        """
+        yield from (p.podoben for p in self.podobnost_film(uredi=['mesto'], omejitev=k))
+
 
 class Oseba(Entiteta, vir='oseba.csv'):
     """
@@ -150,6 +187,39 @@ class Oseba(Entiteta, vir='oseba.csv'):
     ime: str = polje()
 
     IME = 'ime'
+    GRAF = None
+
+    @classmethod
+    def graf(cls, zgradi=False):
+        """
+        Vrni graf sodelovanj oseb pri filmih.
+        Graf se zgradi ob prvi uporabi ali če je to zahtevano.
+        """
+        if zgradi or cls.GRAF is None:
+            cls.GRAF = Graf(Vloga, 'oseba', 'film')
+        return cls.GRAF
+
+    def pogosti_sodelavci(self, k=10):
+        """
+        Vrni seznam največ k parov (oseba, število skupnih filmov)
+        za osebe, s katerimi je oseba self najpogosteje sodelovala.
+        """
+        sodelavci = self.graf().sodelavci(self.id, k)
+        osebe = Oseba.z_idji(ido for ido, _ in sodelavci)
+        return [(oseba, stevilo) for oseba, (_, stevilo) in zip(osebe, sodelavci)]
+
+    def pot_do(self, oseba):
+        """
+        Vrni najkrajšo verigo sodelovanj od osebe self do dane osebe
+        kot seznam izmenjujočih se oseb in filmov.
+        Če verige ni, vrni None.
+        """
+        pot = self.graf().pot(self.id, oseba.id)
+        if pot is None:
+            return None
+        osebe = iter(Oseba.z_idji(pot[::2]))
+        filmi = iter(Film.z_idji(pot[1::2]))
+        return [next(osebe if i % 2 == 0 else filmi) for i in range(len(pot))]
 
     def poisci_vloge(self):
         """
@@ -159,6 +229,16 @@ class Oseba(Entiteta, vir='oseba.csv'):
         """
         yield from self.vloga_oseba(uredi=[('film', 'leto')])
 
+    @staticmethod
+    def z_vlogami(ido):
+        """
+        Vrni osebo z danim ID-jem in seznam njenih vlog
+        v vrstnem redu kot pri metodi poisci_vloge,
+        prebrana z eno samo poizvedbo.
+        """
+        oseba, odnosi = Oseba.z_odnosi(ido, vloga_oseba=dict(uredi=[('film', 'leto')]))
+        return oseba, odnosi['vloga_oseba']
+
     @staticmethod
     def poisci(niz):
         """
@@ -229,3 +309,71 @@ class Pripada(Odnos, vir='zanr.csv'):
         del vrstica['naziv']
         return vrstica
 
+    @classmethod
+    def _obdelaj_izvoz(cls, vrstica, pridruzeni):
+        """
+        Obdelaj vrstico pred izvozom.
+        """
+        return dict(film=vrstica['film'], naziv=pridruzeni['zanr_naziv'])
+
+
+class Podobnost(Odnos, enolicnost=[('film', 'mesto')]):
+    """
+    Razred za vnaprej izračunano podobnost filmov.
+    """
+
+    film: Film = polje()
+    podoben: Film = polje()
+    mesto: int = polje()
+    podobnost: float = polje()
+
+    def __str__(self):
+        """
+        Znakovna predstavitev podobnosti.
+        """
+        return f"{self.podoben} je {self.mesto}. najbolj podoben filmu {self.film}"
+
+
+class StatistikaZanra(Pogled, materializiran=True, prozilci=True,
+                      odvisnosti=[Film, Pripada], uredi=[Padajoce('filmov')]):
+    """
+    Pogled s številom filmov in povprečno oceno filmov posameznega žanra.
+    """
+
+    zanr: Zanr = polje()
+    filmov: int = polje()
+    povprecna_ocena: float = polje(obvezno=False)
+
+    POIZVEDBA = """
+        SELECT pripada.zanr, COUNT(*), AVG(NULLIF(film.ocena, ''))
+          FROM pripada JOIN film ON pripada.film = film.id
+         GROUP BY pripada.zanr
+    """
+
+    def __str__(self):
+        """
+        Znakovna predstavitev statistike žanra.
+        """
+        return f"{self.zanr}: {self.filmov} filmov s povprečno oceno {self.povprecna_ocena:.2f}"
+
+
+class Filmografija(Pogled, odvisnosti=[Vloga]):
+    """
+    Pogled s številom vlog posamezne osebe.
+    """
+
+    oseba: Oseba = polje()
+    igralec: int = polje()
+    reziser: int = polje()
+
+    POIZVEDBA = """
+        SELECT oseba, SUM(tip = 'I'), SUM(tip = 'R')
+          FROM vloga
+         GROUP BY oseba
+    """
+
+    def __str__(self):
+        """
+        Znakovna predstavitev filmografije.
+        """
+        return f"{self.oseba}: {self.igralec}-krat igralec, {self.reziser}-krat režiser"
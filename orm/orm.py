@@ -1,11 +1,90 @@
 import sqlite3 as dbapi
 import csv
+import hashlib
+import json
+import math
+import os
+import pickle
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Iterator
+from array import array
 from dataclasses import dataclass, field, fields
-from dataclasses_json import dataclass_json
+from functools import cache
+from itertools import islice
 
 
-conn = dbapi.connect('filmi.sqlite')
-conn.execute("PRAGMA foreign_keys = ON;")
+class Povezava:
+    """
+    Povezava na bazo, ki se odpre ob prvi uporabi.
+
+    Dostop do atributov se preusmeri na odprto povezavo.
+    """
+
+    def __init__(self, pot='filmi.sqlite', **opcije):
+        """
+        Konstruktor povezave na bazo na podani poti.
+
+        Ostali parametri se ob odprtju podajo funkciji `sqlite3.connect`.
+        """
+        self.pot = pot
+        self.opcije = opcije
+        self.conn = None
+
+    def odprta(self):
+        """
+        Vrni, ali je povezava odprta.
+        """
+        return self.conn is not None
+
+    def odpri(self):
+        """
+        Odpri povezavo, če še ni odprta, in jo vrni.
+
+        Ob odprtju se vklopijo tuji ključi in priključijo deli razdeljenih tabel.
+        """
+        if self.conn is None:
+            self.conn = dbapi.connect(self.pot, **self.opcije)
+            self.conn.execute("PRAGMA foreign_keys = ON;")
+            for t in Tabela.TABELE:
+                if t.RAZDELITEV is not None:
+                    t.RAZDELITEV.prikljuci()
+        return self.conn
+
+    def zapri(self):
+        """
+        Zapri povezavo, če je odprta.
+        """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __getattr__(self, ime):
+        """
+        Preusmeri dostop do atributa na odprto povezavo.
+        """
+        return getattr(self.odpri(), ime)
+
+    def __enter__(self):
+        """
+        Vstop v kontekst z `with`.
+        """
+        return self.odpri().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Izstop iz konteksta.
+        """
+        return self.odpri().__exit__(exc_type, exc_value, traceback)
+
+
+conn = Povezava()
+vir_branja = None
+snemalnik = None
 
 
 TIPI = {
@@ -16,6 +95,87 @@ TIPI = {
     bytes: 'BLOB'
 }
 
+DNEVNIK = 'dnevnik_sprememb'
+ZGOSTITVE = 'zgostitve_virov'
+ZASTARELI = 'zastareli_pogledi'
+GENERACIJE = 'generacije_tabel'
+
+TIPI_NUMPY = {
+    int: 'int64',
+    bool: 'bool',
+    float: 'float64',
+}
+
+TIPI_ARRAY = {
+    int: 'q',
+    bool: 'b',
+    float: 'd',
+}
+
+
+def povezi(pot='filmi.sqlite', **opcije):
+    """
+    Poveži ORM z bazo na podani poti in vrni odprto povezavo.
+
+    Ostali parametri se podajo funkciji `sqlite3.connect`.
+    Morebitna prejšnja povezava se zapre.
+    Če ta funkcija ni poklicana, se ob prvi uporabi
+    odpre povezava na `filmi.sqlite`.
+    """
+    conn.zapri()
+    conn.pot = pot
+    conn.opcije = opcije
+    return conn.odpri()
+
+
+@cache
+def _numpy():
+    """
+    Vrni modul NumPy ali `None`, če ni na voljo.
+
+    Modul se uvozi ob prvi uporabi.
+    """
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def _uri(pot, parametri):
+    """
+    Vrni URI za odprtje datoteke baze na podani poti s podanimi parametri.
+    """
+    from urllib.request import pathname2url
+    return f"file:{pathname2url(os.path.abspath(pot))}?{parametri}"
+
+
+class _ObPrviUporabi:
+    """
+    Razredni atribut, katerega vrednost se izračuna ob prvem dostopu
+    in shrani v razred, iz katerega smo dostopali.
+    """
+
+    def __init__(self, funkcija):
+        """
+        Konstruktor atributa s funkcijo, ki iz razreda izračuna vrednost.
+        """
+        self.funkcija = funkcija
+
+    def __set_name__(self, razred, ime):
+        """
+        Zapomni si ime atributa.
+        """
+        self.ime = ime
+
+    def __get__(self, objekt, razred):
+        """
+        Izračunaj vrednost in jo shrani v razred.
+        """
+        vrednost = self.funkcija(razred)
+        setattr(razred, self.ime, vrednost)
+        return vrednost
+
 
 def polje(kljuc=None, samodejno=None, enolicno=False, obvezno=True, shrani=True, privzeto=None):
     """
@@ -31,6 +191,54 @@ def polje(kljuc=None, samodejno=None, enolicno=False, obvezno=True, shrani=True,
                     ))
 
 
+def _dodaj_v_array(tabela, vrednosti):
+    """
+    Dodaj vrednosti v tabelo `array.array` ali seznam in jo vrni.
+
+    Če med celimi ali logičnimi vrednostmi naleti na NULL,
+    tabelo pretvori v realno, manjkajoče vrednosti pa predstavi z NaN.
+    """
+    if isinstance(tabela, list):
+        tabela.extend(vrednosti)
+        return tabela
+    if tabela.typecode != 'd' and None in vrednosti:
+        tabela = array('d', tabela)
+    if tabela.typecode == 'd':
+        tabela.extend(math.nan if v is None else v for v in vrednosti)
+    else:
+        tabela.extend(vrednosti)
+    return tabela
+
+
+def _vrednost_csv(vrednost):
+    """
+    Vrni vrednost, kot je zapisana v viru v obliki CSV.
+
+    Manjkajoče vrednosti so prazni nizi,
+    realna števila s celo vrednostjo pa so zapisana brez decimalk.
+    """
+    if vrednost is None:
+        return ''
+    if isinstance(vrednost, float) and vrednost.is_integer():
+        return int(vrednost)
+    return vrednost
+
+
+def _normaliziraj(tip, vrednost):
+    """
+    Vrni vrednost, kot bi jo za stolpec podanega tipa shranila baza.
+
+    Nize, ki predstavljajo števila, pretvori v števila,
+    tako kot to stori SQLite za številske stolpce.
+    """
+    if tip in TIPI_ARRAY and isinstance(vrednost, str) and vrednost:
+        try:
+            return float(vrednost)
+        except ValueError:
+            pass
+    return vrednost
+
+
 @dataclass
 class Padajoce:
     """
@@ -45,6 +253,17 @@ class Padajoce:
         return f"{Tabela._stolpec_za_urejanje(self.stolpec)} DESC"
 
 
+@dataclass
+class Sprememba:
+    """
+    Razred za zapis v dnevniku sprememb.
+    """
+    zaporedje: int
+    tabela: str
+    kljuc: tuple
+    operacija: str
+
+
 @dataclass
 class Vzorec:
     """
@@ -59,30 +278,681 @@ class Vzorec:
         return self.vzorec
 
 
+class Posnetek:
+    """
+    Nespremenljiv posnetek baze, namenjen le branju.
+
+    Vsaka nit bere s svojo povezavo na posnetek.
+    """
+
+    MMAP = 2 ** 30
+
+    def __init__(self, pot, mmap=MMAP):
+        """
+        Konstruktor posnetka na podani poti.
+
+        Parameter `mmap` določa največjo velikost pomnilniško preslikanega dela datoteke.
+        """
+        self.pot = pot
+        self.mmap = mmap
+        self.lokalno = threading.local()
+
+    def objavi(self):
+        """
+        Objavi posnetek trenutnega stanja baze.
+
+        Posnetek se s pomočjo varnostnega kopiranja zapiše v začasno datoteko,
+        ta pa nato atomarno zamenja prejšnji posnetek.
+        Če objava ni uspešna, se začasna datoteka odstrani.
+        Že odprte povezave na prejšnji posnetek ga še naprej vidijo nespremenjenega.
+        """
+        zacasna = f"{self.pot}.{os.getpid()}.tmp"
+        try:
+            kopija = dbapi.connect(zacasna)
+            try:
+                conn.backup(kopija)
+                kopija.execute("PRAGMA journal_mode = DELETE;")
+            finally:
+                kopija.close()
+            os.replace(zacasna, self.pot)
+        except BaseException:
+            if os.path.exists(zacasna):
+                os.remove(zacasna)
+            raise
+
+    def povezava(self):
+        """
+        Vrni povezavo trenutne niti na zadnji objavljeni posnetek.
+
+        Če je bil medtem objavljen nov posnetek, odpre povezavo nanj.
+        Prejšnja povezava se zapre, ko je ne uporablja noben kazalec več.
+        """
+        stanje = os.stat(self.pot)
+        stanje = (stanje.st_ino, stanje.st_mtime_ns)
+        if stanje != getattr(self.lokalno, 'stanje', None):
+            self.lokalno.povezava = dbapi.connect(_uri(self.pot, "mode=ro&immutable=1"),
+                                                  uri=True)
+            self.lokalno.povezava.execute(f"PRAGMA mmap_size = {self.mmap};")
+            self.lokalno.stanje = stanje
+        return self.lokalno.povezava
+
+
+class Predpomnilnik:
+    """
+    Predpomnilnik rezultatov poizvedb za branje.
+
+    Vnosi so ključani s poizvedbo SQL in njenimi parametri,
+    hranijo pa prebrane vrstice in generacije tabel, iz katerih so bile prebrane.
+    Vsaka sprememba tabele poveča njeno generacijo,
+    s čimer postanejo vsi vnosi, ki jo vsebujejo, neveljavni.
+    Ko skupna velikost vnosov preseže `najvec_bajtov`,
+    se zavržejo najdlje neuporabljeni vnosi.
+    """
+
+    NAJVEC_BAJTOV = 2 ** 26
+
+    def __init__(self, najvec_bajtov=NAJVEC_BAJTOV):
+        """
+        Konstruktor predpomnilnika z omejeno velikostjo.
+        """
+        self.najvec_bajtov = najvec_bajtov
+        self.generacije = {}
+        self.vnosi = OrderedDict()
+        self.velikost = 0
+        self.zadetki = 0
+        self.zgresitve = 0
+        self.kljucavnica = threading.Lock()
+
+    def generacija(self, tabele):
+        """
+        Vrni trenutne generacije podanih tabel.
+        """
+        return tuple(self.generacije.get(tabela, 0) for tabela in tabele)
+
+    def razveljavi(self, *tabele):
+        """
+        Povečaj generacije podanih tabel.
+        """
+        with self.kljucavnica:
+            for tabela in tabele:
+                self.generacije[tabela] = self.generacije.get(tabela, 0) + 1
+
+    def preberi(self, kljuc):
+        """
+        Vrni shranjene vrstice za podani ključ
+        ali `None`, če veljavnega vnosa ni.
+        """
+        with self.kljucavnica:
+            vnos = self.vnosi.get(kljuc)
+            if vnos is not None:
+                tabele, generacija, vrstice, velikost = vnos
+                if generacija == self.generacija(tabele):
+                    self.vnosi.move_to_end(kljuc)
+                    self.zadetki += 1
+                    return vrstice
+                del self.vnosi[kljuc]
+                self.velikost -= velikost
+            self.zgresitve += 1
+            return None
+
+    def shrani(self, kljuc, tabele, generacija, vrstice):
+        """
+        Shrani vrstice, prebrane iz tabel s podanimi generacijami.
+
+        Vnosi, ki so večji od celotnega predpomnilnika, se ne shranijo.
+        """
+        velikost = sys.getsizeof(vrstice) + sum(
+            sys.getsizeof(vrstica) + sum(map(sys.getsizeof, vrstica)) for vrstica in vrstice)
+        if velikost > self.najvec_bajtov:
+            return
+        with self.kljucavnica:
+            if generacija != self.generacija(tabele):
+                return
+            prejsnji = self.vnosi.pop(kljuc, None)
+            if prejsnji is not None:
+                self.velikost -= prejsnji[3]
+            self.vnosi[kljuc] = (tabele, generacija, vrstice, velikost)
+            self.velikost += velikost
+            while self.velikost > self.najvec_bajtov:
+                *_, velikost = self.vnosi.popitem(last=False)[1]
+                self.velikost -= velikost
+
+    def pocisti(self):
+        """
+        Zavrzi vse vnose in razveljavi vse generacije.
+        """
+        with self.kljucavnica:
+            for tabela in self.generacije:
+                self.generacije[tabela] += 1
+            self.vnosi.clear()
+            self.velikost = 0
+
+
+predpomnilnik = Predpomnilnik()
+trajni_predpomnilnik = None
+
+
+class TrajniPredpomnilnik:
+    """
+    Predpomnilnik rezultatov poizvedb v ločeni datoteki SQLite,
+    ki se ohrani ob ponovnem zagonu procesa.
+
+    Vnosi hranijo generacije tabel iz tabele `generacije_tabel` glavne baze,
+    ki jih ob vsaki spremembi tabel povečajo prožilci,
+    zato so zastareli vnosi zavrnjeni tudi po pisanju iz drugih procesov.
+    Tabela generacij in prožilci se v bazi ustvarijo šele ob prvi uporabi
+    trajnega predpomnilnika in ostanejo v njej tudi pozneje.
+    Poizvedbe po tabelah brez prožilcev (npr. razdeljenih) se ne predpomnijo trajno.
+    Ko skupna velikost vnosov preseže `najvec_bajtov`,
+    se zavržejo najdlje neuporabljeni vnosi.
+    """
+
+    NAJVEC_BAJTOV = 2 ** 28
+
+    def __init__(self, pot, najvec_bajtov=NAJVEC_BAJTOV):
+        """
+        Konstruktor predpomnilnika v datoteki na podani poti.
+        """
+        self.pot = pot
+        self.najvec_bajtov = najvec_bajtov
+        self.zadetki = 0
+        self.zgresitve = 0
+        self.kljucavnica = threading.Lock()
+        self.conn = dbapi.connect(pot, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode = WAL;")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS vnosi (
+                    kljuc TEXT PRIMARY KEY,
+                    tabele TEXT NOT NULL,
+                    generacija TEXT NOT NULL,
+                    vrstice BLOB NOT NULL,
+                    velikost INTEGER NOT NULL,
+                    uporaba REAL NOT NULL
+                );
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS vnosi_uporaba ON vnosi (uporaba);")
+            self._obrezi()
+        self.spremljane = self._namesti_prozilce()
+
+    @staticmethod
+    def _namesti_prozilce():
+        """
+        Ustvari tabelo generacij in prožilce generacij na obstoječih tabelah,
+        če še ne obstajajo, ter vrni množico imen tabel, katerih generacije se beležijo.
+        """
+        spremljane = set()
+        with Kazalec() as cur:
+            with Transakcija():
+                _ustvari_tabelo_generacij(cur=cur)
+                cur.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view');")
+                obstojece = {ime for ime, in cur.fetchall()}
+                for t in Tabela.TABELE:
+                    if t.RAZDELITEV is not None:
+                        continue
+                    spremljane.add(t._ime_tabele())
+                    if issubclass(t, Pogled) and not t.MATERIALIZIRAN:
+                        continue
+                    if t._ime_tabele() in obstojece:
+                        t._ustvari_prozilce_generacij(cur=cur)
+        return spremljane
+
+    @staticmethod
+    def kljuc_pomnilnika(kljuc, generacija):
+        """
+        Vrni ključ vnosa v predpomnilniku v pomnilniku
+        za podani ključ poizvedbe in generacije tabel iz glavne baze.
+
+        Ker ključ vsebuje generacije, vnosi v pomnilniku zastarijo
+        tudi ob pisanju iz drugih procesov.
+        """
+        return repr((kljuc, generacija))
+
+    def spremlja(self, tabele):
+        """
+        Vrni, ali se beležijo generacije vseh podanih tabel.
+        """
+        return all(tabela in self.spremljane for tabela in tabele)
+
+    @staticmethod
+    def generacija(tabele):
+        """
+        Vrni trenutne generacije podanih tabel iz glavne baze.
+        """
+        with Kazalec() as cur:
+            cur.execute(f"""
+                SELECT tabela, generacija FROM {GENERACIJE}
+                 WHERE tabela IN ({', '.join('?' for tabela in tabele)});
+            """, tabele)
+            generacije = dict(cur)
+        return [generacije.get(tabela, 0) for tabela in tabele]
+
+    def preberi(self, kljuc, generacija):
+        """
+        Vrni shranjene vrstice za podani ključ in generacije tabel
+        ali `None`, če veljavnega vnosa ni.
+        """
+        with self.kljucavnica, self.conn:
+            vnos = self.conn.execute("SELECT generacija, vrstice FROM vnosi WHERE kljuc = ?;",
+                                     [kljuc]).fetchone()
+            if vnos is not None:
+                if json.loads(vnos[0]) == generacija:
+                    self.conn.execute("UPDATE vnosi SET uporaba = ? WHERE kljuc = ?;",
+                                      [time.time(), kljuc])
+                    self.zadetki += 1
+                    return pickle.loads(vnos[1])
+                self.conn.execute("DELETE FROM vnosi WHERE kljuc = ?;", [kljuc])
+            self.zgresitve += 1
+            return None
+
+    def shrani(self, kljuc, tabele, generacija, vrstice):
+        """
+        Shrani vrstice, prebrane iz tabel s podanimi generacijami,
+        in zavrzi najdlje neuporabljene vnose, če je predpomnilnik prevelik.
+        """
+        vrstice = pickle.dumps(vrstice, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(vrstice) > self.najvec_bajtov:
+            return
+        with self.kljucavnica, self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO vnosi (kljuc, tabele, generacija, vrstice, velikost, uporaba)
+                VALUES (?, ?, ?, ?, ?, ?);
+            """, [kljuc, json.dumps(tabele), json.dumps(generacija), vrstice, len(vrstice),
+                  time.time()])
+            self._obrezi()
+
+    def _obrezi(self):
+        """
+        Zavrzi najdlje neuporabljene vnose, dokler velikost presega omejitev.
+        """
+        presezek, = self.conn.execute("SELECT TOTAL(velikost) FROM vnosi;").fetchone()
+        presezek -= self.najvec_bajtov
+        if presezek <= 0:
+            return
+        zavrzeni = []
+        for kljuc, velikost in self.conn.execute(
+                "SELECT kljuc, velikost FROM vnosi ORDER BY uporaba;"):
+            zavrzeni.append((kljuc, ))
+            presezek -= velikost
+            if presezek <= 0:
+                break
+        self.conn.executemany("DELETE FROM vnosi WHERE kljuc = ?;", zavrzeni)
+
+    def ogrej(self, vroci=None, n=1000):
+        """
+        Prenesi veljavne vnose v predpomnilnik v pomnilniku in vrni njihovo število.
+
+        Če je podan seznam `vroci` parov (razred ali njegovo ime, slovar pogojev),
+        se za vsak par izvede predpomnjena poizvedba `seznam`,
+        sicer pa se prenese `n` nazadnje uporabljenih vnosov.
+        """
+        if vroci is not None:
+            razredi = {t.__name__: t for t in Tabela.TABELE}
+            for razred, kwargs in vroci:
+                razred = razredi.get(razred, razred)
+                list(razred.seznam(predpomni=True, **kwargs))
+            return len(vroci)
+        with self.kljucavnica:
+            vnosi = self.conn.execute("""
+                SELECT kljuc, tabele, generacija, vrstice FROM vnosi
+                 ORDER BY uporaba DESC LIMIT ?;
+            """, [n]).fetchall()
+        ogretih = 0
+        for kljuc, tabele, generacija, vrstice in vnosi:
+            tabele = tuple(json.loads(tabele))
+            generacija = json.loads(generacija)
+            if generacija == self.generacija(tabele):
+                predpomnilnik.shrani(self.kljuc_pomnilnika(kljuc, generacija), tabele,
+                                     predpomnilnik.generacija(tabele), pickle.loads(vrstice))
+                ogretih += 1
+        return ogretih
+
+    def zapri(self):
+        """
+        Zapri povezavo na datoteko predpomnilnika.
+        """
+        self.conn.close()
+
+
+def uporabi_trajni_predpomnilnik(pot, najvec_bajtov=TrajniPredpomnilnik.NAJVEC_BAJTOV,
+                                 vroci=None):
+    """
+    Predpomnjene poizvedbe hrani tudi v trajnem predpomnilniku na podani poti
+    in ga ogrej s podanimi vročimi poizvedbami
+    oziroma z nazadnje uporabljenimi vnosi.
+
+    Če je pot `None`, se trajni predpomnilnik ne uporablja več.
+    """
+    global trajni_predpomnilnik
+    if trajni_predpomnilnik is not None:
+        trajni_predpomnilnik.zapri()
+    trajni_predpomnilnik = None if pot is None else TrajniPredpomnilnik(pot, najvec_bajtov)
+    if trajni_predpomnilnik is not None:
+        trajni_predpomnilnik.ogrej(vroci)
+
+
+def objavi_posnetek(pot):
+    """
+    Objavi posnetek trenutnega stanja baze na podani poti.
+    """
+    Posnetek(pot).objavi()
+
+
+class Replika:
+    """
+    Replika baze za branje, ki jo nit v ozadju sproti osvežuje.
+
+    Osvežitev z varnostnim kopiranjem vsakič prepiše celotno bazo,
+    tako da je njena cena sorazmerna velikosti baze in ne številu sprememb.
+    Interval osveževanja naj bo zato dovolj dolg glede na velikost baze.
+    Vsaka nit bere iz replike prek svoje povezave.
+    """
+
+    def __init__(self, pot, osvezitev=1, najvecji_zaostanek=None, strani=1024):
+        """
+        Konstruktor replike na podani poti.
+
+        Replika se osveži vsakih `osvezitev` sekund,
+        pri čemer se ob vsakem koraku varnostnega kopiranja prenese `strani` strani.
+        Če je zaostanek replike večji od `najvecji_zaostanek` sekund,
+        se bere iz glavne baze.
+        """
+        self.pot = pot
+        self.osvezitev = osvezitev
+        self.najvecji_zaostanek = najvecji_zaostanek
+        self.strani = strani
+        self.glavna = pot_baze()
+        with dbapi.connect(self.pot) as cilj:
+            cilj.execute("PRAGMA journal_mode = WAL;")
+        self.osvezeno = None
+        self.osvezi()
+        self.lokalno = threading.local()
+        self.povezave = []
+        self.kljucavnica = threading.Lock()
+        self.ustavi = threading.Event()
+        self.nit = threading.Thread(target=self._osvezuj, daemon=True)
+        self.nit.start()
+
+    def osvezi(self):
+        """
+        Osveži repliko s trenutnim stanjem glavne baze.
+
+        Replika je v načinu WAL, tako da bralci med osveževanjem
+        nemoteno berejo prejšnje stanje.
+        """
+        zacetek = time.monotonic()
+        vir = dbapi.connect(self.glavna)
+        cilj = dbapi.connect(self.pot)
+        try:
+            vir.backup(cilj, pages=self.strani)
+        finally:
+            cilj.close()
+            vir.close()
+        self.osvezeno = zacetek
+
+    def _osvezuj(self):
+        """
+        Periodično osvežuj repliko, dokler ni ustavljena.
+        """
+        while not self.ustavi.wait(self.osvezitev):
+            try:
+                self.osvezi()
+            except dbapi.Error:
+                pass
+
+    def zaostanek(self):
+        """
+        Vrni število sekund, odkar se je začela zadnja uspešna osvežitev.
+        """
+        return time.monotonic() - self.osvezeno
+
+    def _povezava(self):
+        """
+        Vrni povezavo trenutne niti na repliko in jo odpri, če še ni odprta.
+
+        Povezave se lahko zaprejo iz poljubne niti, zato se odprejo
+        z `check_same_thread=False`, seznam odprtih povezav pa ščiti ključavnica.
+        """
+        povezava = getattr(self.lokalno, 'povezava', None)
+        if povezava is None:
+            povezava = dbapi.connect(_uri(self.pot, "mode=ro"), uri=True,
+                                     check_same_thread=False)
+            with self.kljucavnica:
+                if self.ustavi.is_set():
+                    povezava.close()
+                    raise dbapi.ProgrammingError("Replika je zaprta!")
+                self.povezave.append(povezava)
+            self.lokalno.povezava = povezava
+        return povezava
+
+    def povezava(self):
+        """
+        Vrni povezavo za branje.
+
+        Če replika še ne vsebuje zadnjih potrjenih sprememb te povezave
+        ali preveč zaostaja, vrne povezavo na glavno bazo.
+        """
+        if Transakcija.potrjeno() >= self.osvezeno or \
+                (self.najvecji_zaostanek is not None and
+                 self.zaostanek() > self.najvecji_zaostanek):
+            return conn
+        return self._povezava()
+
+    def zapri(self):
+        """
+        Ustavi osveževanje in zapri povezave na repliko.
+        """
+        self.ustavi.set()
+        self.nit.join()
+        with self.kljucavnica:
+            povezave, self.povezave = self.povezave, []
+        for povezava in povezave:
+            povezava.close()
+
+
+def uporabi_posnetek(pot, mmap=Posnetek.MMAP):
+    """
+    Poizvedbe za branje izvajaj na posnetku na podani poti.
+
+    Znotraj transakcij se bere iz glavne baze, da so vidne lastne spremembe.
+    Če je pot `None`, se branje spet izvaja na glavni bazi.
+    """
+    _nastavi_vir_branja(None if pot is None else Posnetek(pot, mmap))
+
+
+def uporabi_repliko(pot, osvezitev=1, najvecji_zaostanek=None, strani=1024):
+    """
+    Poizvedbe za branje izvajaj na repliki na podani poti,
+    ki se osvežuje v ozadju.
+
+    Znotraj transakcij in dokler replika ne vsebuje zadnjih potrjenih sprememb,
+    se bere iz glavne baze, da so vidne lastne spremembe.
+    Če je pot `None`, se branje spet izvaja na glavni bazi.
+    """
+    _nastavi_vir_branja(None if pot is None
+                        else Replika(pot, osvezitev, najvecji_zaostanek, strani))
+
+
+def _nastavi_vir_branja(vir):
+    """
+    Nastavi vir za poizvedbe za branje in zapri prejšnjega.
+    """
+    global vir_branja
+    if isinstance(vir_branja, Replika):
+        vir_branja.zapri()
+    vir_branja = vir
+
+
+def metrike():
+    """
+    Vrni slovar s trenutnimi vrednostmi metrik.
+    """
+    vrednosti = {
+        'predpomnilnik_zadetki': predpomnilnik.zadetki,
+        'predpomnilnik_zgresitve': predpomnilnik.zgresitve,
+        'predpomnilnik_velikost': predpomnilnik.velikost,
+        'prekinjene_poizvedbe': Rok.PREKINITVE,
+    }
+    if trajni_predpomnilnik is not None:
+        vrednosti['trajni_predpomnilnik_zadetki'] = trajni_predpomnilnik.zadetki
+        vrednosti['trajni_predpomnilnik_zgresitve'] = trajni_predpomnilnik.zgresitve
+    if isinstance(vir_branja, Replika):
+        vrednosti['zaostanek_replike'] = vir_branja.zaostanek()
+    return vrednosti
+
+
+def pot_baze():
+    """
+    Vrni pot do datoteke glavne baze.
+    """
+    return next(vrstica[2] for vrstica in conn.execute("PRAGMA database_list;")
+                if vrstica[1] == 'main')
+
+
+def povezava(branje=False):
+    """
+    Vrni povezavo, na kateri naj se izvede poizvedba.
+
+    Poizvedbe za branje izven transakcij se izvedejo na posnetku ali repliki,
+    če je ta v uporabi.
+    V nitih bazena se vse poizvedbe izvedejo na povezavi niti.
+    """
+    if getattr(Bazen.LOKALNO, 'aktivna', False):
+        return Bazen.LOKALNO.povezava
+    if branje and vir_branja is not None and Transakcija.globina() == 0:
+        return vir_branja.povezava()
+    return conn
+
+
+def uporabi_snemalnik(novi):
+    """
+    Poizvedbe, izvedene prek kazalcev ORM, beleži s podanim snemalnikom.
+
+    Snemalnik mora imeti metodo `kazalec`, ki za podano povezavo
+    vrne kazalec (podrazred `sqlite3.Cursor`).
+    Če je snemalnik `None`, se poizvedbe ne beležijo več.
+    """
+    global snemalnik
+    snemalnik = novi
+
+
+class PrekoracitevCasa(Exception):
+    """
+    Napaka, ki se sproži, ko poizvedba prekorači dodeljeni čas.
+    """
+
+
+class Rok:
+    """
+    Upravitelj konteksta, ki omeji čas izvajanja poizvedb.
+
+    Poizvedbe, ki se izvajajo po izteku roka, SQLite prekine
+    s pomočjo upravljalnika napredka,
+    kar se sporoči z napako `PrekoracitevCasa`.
+    Gnezdeni roki veljajo hkrati, tako da se upošteva najzgodnejši.
+    """
+
+    KORAKI = 1000
+    PREKINITVE = 0
+    LOKALNO = threading.local()
+
+    def __init__(self, sekunde):
+        """
+        Konstruktor upravitelja konteksta z rokom čez podano število sekund.
+
+        Če je število sekund `None`, rok ni omejen.
+        """
+        self.sekunde = sekunde
+        self.konec = None
+
+    def __enter__(self):
+        """
+        Vstop v kontekst z `with`.
+
+        Zabeleži rok za trenutno nit.
+        """
+        if self.sekunde is not None:
+            self.konec = time.monotonic() + self.sekunde
+            Rok._roki().append(self.konec)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Izstop iz konteksta.
+
+        Odstrani zabeleženi rok.
+        """
+        if self.konec is not None:
+            Rok._roki().remove(self.konec)
+            self.konec = None
+
+    @staticmethod
+    def _roki():
+        """
+        Vrni seznam rokov za trenutno nit.
+        """
+        if not hasattr(Rok.LOKALNO, 'roki'):
+            Rok.LOKALNO.roki = []
+        return Rok.LOKALNO.roki
+
+    @staticmethod
+    def potekel():
+        """
+        Vrni, ali je v trenutni niti potekel kakšen rok.
+        """
+        roki = Rok._roki()
+        return bool(roki) and time.monotonic() > min(roki)
+
+    @staticmethod
+    def namesti(povezava):
+        """
+        Namesti upravljalnik napredka, ki preverja roke, na podano povezavo.
+        """
+        povezava.set_progress_handler(Rok.potekel, Rok.KORAKI)
+
+    @staticmethod
+    def odstrani(povezava):
+        """
+        Odstrani upravljalnik napredka s podane povezave.
+        """
+        povezava.set_progress_handler(None, 0)
+
+
 class Kazalec:
     """
     Upravitelj konteksta za kazalce.
     """
 
-    def __init__(self, cur=None):
+    def __init__(self, cur=None, branje=False, rok=None):
         """
         Konstruktor upravitelja konteksta.
 
         Če kazalec ni podan, odpre novega, sicer uporabi podanega.
+        Če je `branje` nastavljeno, se kazalec lahko odpre na posnetku za branje.
+        Če je podan `rok`, se poizvedbe, izvedene znotraj konteksta,
+        prekinejo po toliko sekundah.
         """
         if cur is None:
-            self.cur = conn.cursor()
+            self.cur = povezava(branje).cursor() if snemalnik is None \
+                else povezava(branje).cursor(snemalnik.kazalec)
             self.close = True
         else:
             self.cur = cur
             self.close = False
+        self.rok = Rok(rok)
+        self.namescen = False
 
     def __enter__(self):
         """
         Vstop v kontekst z `with`.
 
+        Zabeleži rok in po potrebi namesti upravljalnik napredka.
         Vrne kazalec - ta se shrani v spremenljivko, podano z `as`.
         """
+        self.rok.__enter__()
+        if Rok._roki():
+            Rok.namesti(self.cur.connection)
+            self.namescen = True
         return self.cur
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -90,37 +960,708 @@ class Kazalec:
         Izstop iz konteksta.
 
         Če je bil ustvarjen nov kazalec, se ta zapre.
-        """
+        Upravljalnik napredka se odstrani, če v niti ni več nobenega roka.
+        Če je bila poizvedba prekinjena zaradi izteka roka,
+        se sproži napaka `PrekoracitevCasa`.
+        """
+        prekinjeno = exc_type is not None and issubclass(exc_type, dbapi.OperationalError) \
+            and str(exc_value) == 'interrupted' and Rok.potekel()
+        self.rok.__exit__(exc_type, exc_value, traceback)
+        if self.namescen and not Rok._roki():
+            Rok.odstrani(self.cur.connection)
         if self.close:
             self.cur.close()
+        if prekinjeno:
+            Rok.PREKINITVE += 1
+            raise PrekoracitevCasa("Poizvedba je prekoračila dodeljeni čas!") from exc_value
 
 
 class Transakcija:
     """
     Upravitelj konteksta za transakcije.
+
+    Gnezdene transakcije so izvedene s shranjevalnimi točkami (SAVEPOINT),
+    tako da se potrdi le zunanja transakcija.
+
+    Način zunanje transakcije določa, kdaj se baza zaklene:
+    - `deferred`: zaklepanje ob prvem branju oziroma pisanju.
+      Transakcija, ki najprej bere in nato piše, mora ob pisanju
+      nadgraditi zaklep; če ga ima v tem času drug pisar,
+      se nadgradnja ne more počakati in takoj konča z napako `database is locked`.
+    - `immediate`: zaklep za pisanje ob začetku transakcije.
+      Sočasni pisarji počakajo že na začetku (v okviru časa čakanja povezave),
+      zato ne pride do napak ob nadgradnji, bralci pa niso ovirani.
+    - `exclusive`: izključni zaklep ob začetku transakcije.
+      V načinu WAL je enak `immediate`, sicer pa onemogoči tudi branje
+      drugim povezavam do konca transakcije.
+    Če način ni podan, se transakcija začne implicitno ob prvem pisanju.
+    Način je mogoče podati le za zunanjo transakcijo,
+    ko povezava še ni v (implicitni) transakciji.
+
+    Globina gnezdenja in čas zadnje potrditve se beležita ločeno za vsako nit.
     """
 
-    def __init__(self, transakcija=True):
+    LOKALNO = threading.local()
+    NACINI = ('deferred', 'immediate', 'exclusive')
+
+    def __init__(self, transakcija=True, nacin=None):
         """
         Konstruktor upravitelja konteksta.
 
-        Zabeleži, ali naj se po koncu izvajanja zaključi transakcija.
+        Zabeleži, ali naj se po koncu izvajanja zaključi transakcija,
+        in način začetka zunanje transakcije.
         """
+        assert nacin is None or nacin in self.NACINI, f"Neznan način transakcije: {nacin}"
         self.transakcija = transakcija
+        self.nacin = nacin
+        self.tocka = None
+
+    @staticmethod
+    def globina():
+        """
+        Vrni globino gnezdenja transakcij v trenutni niti.
+        """
+        return getattr(Transakcija.LOKALNO, 'globina', 0)
+
+    @staticmethod
+    def potrjeno():
+        """
+        Vrni čas zadnje potrditve transakcije v trenutni niti.
+        """
+        return getattr(Transakcija.LOKALNO, 'potrjeno', -math.inf)
 
     def __enter__(self):
         """
         Vstop v kontekst z `with`.
+
+        Če smo že znotraj transakcije, ustvari novo shranjevalno točko,
+        sicer pa začne transakcijo v podanem načinu.
+        Če je način podan, transakcija pa je gnezdena
+        ali je povezava že v implicitni transakciji,
+        sproži napako, saj se načina ne da več upoštevati.
+        V nitih bazena, ki le berejo, transakcij ni mogoče začeti.
         """
         if self.transakcija:
+            if getattr(Bazen.LOKALNO, 'aktivna', False):
+                raise ValueError("V nitih bazena transakcij ni mogoče začeti!")
+            globina = Transakcija.globina()
+            if globina > 0:
+                if self.nacin is not None:
+                    raise ValueError(f"Gnezdene transakcije v načinu {self.nacin} "
+                                     "ni mogoče začeti!")
+                if not conn.in_transaction:
+                    conn.execute("BEGIN;")
+                self.tocka = f"tocka_{globina}"
+                conn.execute(f"SAVEPOINT {self.tocka};")
+            elif self.nacin is not None:
+                if conn.in_transaction:
+                    raise ValueError(f"Transakcije v načinu {self.nacin} ni mogoče začeti, "
+                                     "ker je povezava že v transakciji!")
+                conn.execute(f"BEGIN {self.nacin.upper()};")
+            Transakcija.LOKALNO.globina = globina + 1
             return conn.__enter__()
 
     def __exit__(self, exc_type, exc_value, traceback):
         """
         Izstop iz konteksta.
+
+        Zunanja transakcija se potrdi ali razveljavi,
+        gnezdena pa se sprosti ali razveljavi do svoje shranjevalne točke.
         """
         if self.transakcija:
-            conn.__exit__(exc_type, exc_value, traceback)
+            Transakcija.LOKALNO.globina = Transakcija.globina() - 1
+            if self.tocka is None:
+                conn.__exit__(exc_type, exc_value, traceback)
+                Transakcija.LOKALNO.potrjeno = time.monotonic()
+            else:
+                if exc_type is not None:
+                    conn.execute(f"ROLLBACK TO {self.tocka};")
+                conn.execute(f"RELEASE {self.tocka};")
+                self.tocka = None
+
+
+class Branje(Transakcija):
+    """
+    Upravitelj konteksta, ki vse poizvedbe znotraj njega izvede
+    v isti bralni transakciji na glavni bazi,
+    tako da vidijo isto stanje baze.
+
+    Posnetek stanja se določi ob vstopu v kontekst.
+    V načinu WAL bralna transakcija ne ovira pisarjev,
+    ki pa morajo datoteko WAL ohranjati, dokler se branje ne konča.
+    V običajnem načinu (DELETE) pa drugim povezavam
+    do konca branja onemogoči potrditev pisanja,
+    zato naj bodo bralne transakcije kratke.
+    """
+
+    def __init__(self):
+        """
+        Konstruktor upravitelja konteksta.
+        """
+        super().__init__(nacin='deferred')
+
+    def __enter__(self):
+        """
+        Vstop v kontekst z `with`.
+
+        Začne transakcijo in z branjem določi njen posnetek.
+        """
+        super().__enter__()
+        conn.execute("SELECT COUNT(*) FROM sqlite_master;").fetchone()
+        return self
+
+
+class Bazen:
+    """
+    Bazen niti za sočasno izvajanje med seboj neodvisnih poizvedb za branje.
+
+    Vsaka nit bazena ob prvi poizvedbi odpre svojo povezavo na glavno bazo
+    s priključenimi deli razdeljenih tabel in jo uporablja tudi za vse nadaljnje poizvedbe.
+    Povezave niti so namenjene le branju, zato pisanja in transakcije v njih niso mogoči.
+    Niti bazena ne berejo s posnetka ali replike.
+    """
+
+    NITI = 4
+    LOKALNO = threading.local()
+
+    def __init__(self, niti=NITI):
+        """
+        Konstruktor bazena s podanim največjim številom niti.
+
+        Niti se zaženejo ob prvi uporabi.
+        """
+        self.niti = niti
+        self.izvajalec = None
+        self.povezave = []
+        self.kljucavnica = threading.Lock()
+
+    def _povezava(self):
+        """
+        Vrni povezavo trenutne niti bazena
+        in jo odpri, če še ni odprta ali je ORM medtem povezan z drugo bazo.
+        """
+        povezava = getattr(Bazen.LOKALNO, 'povezava', None)
+        if povezava is not None and Bazen.LOKALNO.pot == conn.pot:
+            return povezava
+        if povezava is not None:
+            with self.kljucavnica:
+                self.povezave.remove(povezava)
+            povezava.close()
+        povezava = dbapi.connect(_uri(conn.pot, "mode=ro"), **{
+            **conn.opcije, 'uri': True, 'check_same_thread': False, 'isolation_level': None})
+        povezava.execute("PRAGMA query_only = ON;")
+        for t in Tabela.TABELE:
+            if t.RAZDELITEV is not None:
+                for shema, datoteka in zip(t.RAZDELITEV.sheme(), t.RAZDELITEV.datoteke):
+                    povezava.execute(f"ATTACH DATABASE ? AS {shema};", [datoteka])
+        with self.kljucavnica:
+            self.povezave.append(povezava)
+        Bazen.LOKALNO.povezava = povezava
+        Bazen.LOKALNO.pot = conn.pot
+        return povezava
+
+    @staticmethod
+    def _izvedi(poizvedba):
+        """
+        Izvedi poizvedbo in vrni njen rezultat.
+
+        Če poizvedba vrne iterator, se ta prebere v seznam,
+        da se vse branje izvede v trenutni niti.
+        """
+        rezultat = poizvedba()
+        if isinstance(rezultat, Iterator):
+            rezultat = list(rezultat)
+        return rezultat
+
+    def _izvedi_v_niti(self, poizvedba, roki):
+        """
+        Izvedi poizvedbo na povezavi niti bazena
+        z enakimi roki, kot so veljali v niti, ki jo je oddala.
+        """
+        Bazen.LOKALNO.povezava = self._povezava()
+        Bazen.LOKALNO.aktivna = True
+        Rok.LOKALNO.roki = list(roki)
+        try:
+            return self._izvedi(poizvedba)
+        finally:
+            Bazen.LOKALNO.aktivna = False
+            Rok.LOKALNO.roki = []
+
+    def izvedi(self, poizvedbe, izjeme=False):
+        """
+        Sočasno izvedi podane funkcije brez argumentov in vrni seznam njihovih rezultatov.
+
+        Počaka se na vse poizvedbe; če katera sproži napako,
+        se nato sproži prva napaka po vrstnem redu poizvedb.
+        Če je nastavljen parameter `izjeme`, se napake namesto tega vrnejo med rezultati.
+        Znotraj transakcij in v nitih bazena se poizvedbe izvedejo zaporedno
+        v trenutni niti, da vidijo nepotrjene spremembe in da se bazen ne zaklene.
+        Zastareli materializirani pogledi se pred oddajo poizvedb osvežijo v trenutni niti.
+        """
+        if Transakcija.globina() > 0 or getattr(Bazen.LOKALNO, 'aktivna', False):
+            rezultati = []
+            for poizvedba in poizvedbe:
+                try:
+                    rezultati.append(self._izvedi(poizvedba))
+                except Exception as napaka:
+                    if not izjeme:
+                        raise
+                    rezultati.append(napaka)
+            return rezultati
+        from concurrent.futures import ThreadPoolExecutor, wait
+        Pogled.osvezi_zastarele()
+        with self.kljucavnica:
+            if self.izvajalec is None:
+                self.izvajalec = ThreadPoolExecutor(self.niti, thread_name_prefix='bazen')
+        roki = Rok._roki()
+        prihodnosti = [self.izvajalec.submit(self._izvedi_v_niti, poizvedba, roki)
+                       for poizvedba in poizvedbe]
+        wait(prihodnosti)
+        rezultati = []
+        for prihodnost in prihodnosti:
+            napaka = prihodnost.exception()
+            if napaka is None:
+                rezultati.append(prihodnost.result())
+            elif izjeme:
+                rezultati.append(napaka)
+            else:
+                raise napaka
+        return rezultati
+
+    def zapri(self):
+        """
+        Ustavi niti bazena in zapri njihove povezave.
+        """
+        with self.kljucavnica:
+            izvajalec, self.izvajalec = self.izvajalec, None
+        if izvajalec is not None:
+            izvajalec.shutdown()
+        with self.kljucavnica:
+            povezave, self.povezave = self.povezave, []
+        for povezava in povezave:
+            povezava.close()
+
+
+bazen = Bazen()
+
+
+def hkrati(*poizvedbe, izjeme=False):
+    """
+    Sočasno izvedi podane funkcije brez argumentov, ki berejo iz baze,
+    in vrni seznam njihovih rezultatov.
+
+    Poizvedbe se izvedejo v nitih bazena z ločenimi povezavami,
+    tako da je skupni čas približno enak času najdaljše poizvedbe.
+    Glej `Bazen.izvedi`.
+    """
+    return bazen.izvedi(poizvedbe, izjeme)
+
+
+class Seja:
+    """
+    Enota dela, ki zbira nove, spremenjene in izbrisane objekte.
+
+    Ob potrditvi se spremembe zapišejo v eni transakciji
+    z združenimi poizvedbami v vrstnem redu tabel iz `Tabela.TABELE`.
+    """
+
+    def __init__(self):
+        """
+        Konstruktor seje.
+        """
+        self.novi = {}
+        self.spremenjeni = {}
+        self.izbrisani = {}
+
+    def __enter__(self):
+        """
+        Vstop v kontekst z `with`.
+
+        Vrne sejo.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Izstop iz konteksta.
+
+        Če ni prišlo do napake, potrdi sejo, sicer zavrže zbrane spremembe.
+        """
+        if exc_type is None:
+            self.potrdi()
+        else:
+            self.pozabi()
+
+    def dodaj(self, objekt, /, **kwargs):
+        """
+        Zabeleži objekt za dodajanje v bazo.
+        """
+        assert objekt._v_bazi(False), "Objekt je že v bazi"
+        self.novi[id(objekt)] = (objekt, kwargs)
+
+    def posodobi(self, objekt, /, **kwargs):
+        """
+        Zabeleži objekt za posodobitev v bazi.
+
+        Če je objekt zabeležen za dodajanje, se doda s trenutnimi vrednostmi.
+        """
+        if id(objekt) in self.novi:
+            return
+        assert objekt._v_bazi(True), "Objekta še ni v bazi"
+        self.spremenjeni[id(objekt)] = (objekt, kwargs)
+
+    def izbrisi(self, objekt):
+        """
+        Zabeleži objekt za brisanje iz baze.
+
+        Če je objekt zabeležen za dodajanje, se ga le pozabi.
+        """
+        if self.novi.pop(id(objekt), None) is not None:
+            return
+        assert objekt._v_bazi(True), "Objekta še ni v bazi"
+        self.spremenjeni.pop(id(objekt), None)
+        self.izbrisani[id(objekt)] = (objekt, {})
+
+    def pozabi(self):
+        """
+        Pozabi vse zabeležene spremembe.
+        """
+        self.novi.clear()
+        self.spremenjeni.clear()
+        self.izbrisani.clear()
+
+    @staticmethod
+    def _skupine(objekti, stolpci, obratno=False):
+        """
+        Vračaj skupine objektov z enakimi stolpci in tabelo
+        v vrstnem redu tabel iz `Tabela.TABELE`.
+
+        Tabela, v kateri je objekt, se določi šele, ko je skupina na vrsti,
+        tako da imajo objekti, dodani v prejšnjih skupinah, že nastavljene ključe.
+        """
+        skupine = {}
+        for objekt, kwargs in objekti.values():
+            skupine.setdefault((type(objekt), stolpci(objekt, kwargs)), []) \
+                .append((objekt, kwargs))
+        for (razred, izbrani), objekti in sorted(skupine.items(), reverse=obratno,
+                                                  key=lambda par: Tabela.TABELE.index(par[0][0])):
+            tabele = {}
+            for objekt, kwargs in objekti:
+                tabele.setdefault(objekt._tabela(), []).append((objekt, kwargs))
+            for tabela, objekti in tabele.items():
+                yield (razred, tabela, izbrani), objekti
+
+    def potrdi(self):
+        """
+        Zapiši zbrane spremembe v bazo v eni transakciji.
+
+        Če potrditev ni uspešna, se objektom povrnejo ključi in posnetki,
+        ki so jih imeli pred potrjevanjem, zbrane spremembe pa se ohranijo.
+        Predpomnilnik spremenjenih tabel se razveljavi šele po koncu transakcije.
+        """
+        stanja = [(objekt, objekt._posnetek,
+                   getattr(objekt, objekt.KLJUC.name) if isinstance(objekt, Entiteta) else None)
+                  for objekti in (self.novi, self.spremenjeni, self.izbrisani)
+                  for objekt, kwargs in objekti.values()]
+        razredi = []
+        try:
+            with Kazalec() as cur:
+                with Transakcija():
+                    for (razred, tabela, stolpci), objekti in self._skupine(
+                            self.novi, lambda o, kw: (*o._stolpci_za_dodajanje(), *kw)):
+                        sql = razred._sql_dodaj(stolpci, tabela)
+                        if razred._samodejni_kljuc():
+                            for objekt, kwargs in objekti:
+                                cur.execute(sql, objekt._vrednosti(stolpci, kwargs))
+                                objekt._nastavi_kljuc(cur.lastrowid)
+                        else:
+                            cur.executemany(sql, [objekt._vrednosti(stolpci, kwargs)
+                                                  for objekt, kwargs in objekti])
+                        for objekt, kwargs in objekti:
+                            objekt._zapomni()
+                        razredi.append(razred)
+                    for (razred, tabela, stolpci), objekti in self._skupine(
+                            self.spremenjeni, lambda o, kw: (*o._spremenjeni_stolpci(kw), *kw)):
+                        if not stolpci:
+                            continue
+                        cur.executemany(razred._sql_posodobi(stolpci, tabela),
+                                        [objekt._vrednosti((*stolpci, *objekt._kljuci()), kwargs)
+                                         for objekt, kwargs in objekti])
+                        for objekt, kwargs in objekti:
+                            objekt._zapomni()
+                        razredi.append(razred)
+                    for (razred, tabela, stolpci), objekti in self._skupine(
+                            self.izbrisani, lambda o, kw: (), obratno=True):
+                        cur.executemany(razred._sql_izbrisi(tabela),
+                                        [objekt._vrednosti(objekt._kljuci())
+                                         for objekt, kwargs in objekti])
+                        for objekt, kwargs in objekti:
+                            objekt._nastavi_kljuc(None)
+                            objekt._posnetek = None
+                        razredi.append(razred)
+        except BaseException as napaka:
+            for objekt, posnetek, kljuc in stanja:
+                objekt._nastavi_kljuc(kljuc)
+                objekt._posnetek = posnetek
+            if isinstance(napaka, dbapi.IntegrityError):
+                raise ValueError("Potrjevanje seje ni bilo uspešno!")
+            raise
+        finally:
+            for razred in dict.fromkeys(razredi):
+                razred._razveljavi()
+        self.pozabi()
+
+
+class Razdelitev:
+    """
+    Razdelitev tabele na dele v ločenih datotekah baze.
+
+    Vrstice se razporedijo glede na vrednost stolpca `stolpec`:
+    če so podane meje, po intervalih med njimi, sicer po zgostitvi.
+    Datoteke se bazi priključijo z `ATTACH DATABASE`.
+    """
+
+    def __init__(self, stolpec, datoteke, meje=None):
+        """
+        Konstruktor razdelitve.
+
+        Če so podane meje, jih mora biti eno manj kot datotek.
+        """
+        assert meje is None or len(meje) == len(datoteke) - 1, \
+            "Število mej se ne ujema s številom datotek"
+        self.stolpec = stolpec
+        self.datoteke = datoteke
+        self.meje = meje
+        self.razred = None
+        self.conn = None
+
+    def sheme(self):
+        """
+        Vrni imena shem priključenih datotek.
+        """
+        return [f"{self.razred._ime_tabele()}_{i}" for i in range(len(self.datoteke))]
+
+    def tabele(self):
+        """
+        Vrni imena delov tabele.
+        """
+        return [f"{shema}.{self.razred._ime_tabele()}" for shema in self.sheme()]
+
+    def del_za(self, vrednost):
+        """
+        Vrni indeks dela, v katerem je vrstica s podano vrednostjo stolpca.
+        """
+        vrednost = _normaliziraj(
+            self.razred._osnovni_tip(self.razred._polje_za_stolpec(self.stolpec)), vrednost)
+        if self.meje is not None:
+            return bisect_right(self.meje, vrednost)
+        if isinstance(vrednost, (int, float)):
+            return int(vrednost) % len(self.datoteke)
+        return zlib.crc32(str(vrednost).encode('utf-8')) % len(self.datoteke)
+
+    def deli(self, kwargs):
+        """
+        Vrni indekse delov, v katerih so lahko vrstice, ki ustrezajo pogojem.
+        """
+        if self.stolpec in kwargs and not isinstance(kwargs[self.stolpec], Vzorec):
+            return [self.del_za(kwargs[self.stolpec])]
+        return range(len(self.datoteke))
+
+    def prikljuci(self):
+        """
+        Priključi datoteke delov povezavi, če še niso priključene.
+
+        Če povezava še ni odprta, se datoteke priključijo ob njenem odprtju.
+        """
+        if not conn.odprta() or self.conn is conn.conn:
+            return
+        prikljucene = {vrstica[1] for vrstica in conn.execute("PRAGMA database_list;")}
+        for shema, datoteka in zip(self.sheme(), self.datoteke):
+            if shema not in prikljucene:
+                conn.execute(f"ATTACH DATABASE ? AS {shema};", [datoteka])
+        self.conn = conn.conn
+
+    def odklopi(self):
+        """
+        Odklopi datoteke delov od povezave.
+        """
+        if self.conn is None or self.conn is not conn.conn:
+            self.conn = None
+            return
+        for shema in self.sheme():
+            conn.execute(f"DETACH DATABASE {shema};")
+        self.conn = None
+
+
+class Lestvica:
+    """
+    Materializirana lestvica najboljših vrstic entitetne tabele v vsaki skupini.
+
+    Lestvica je shranjena v ločeni tabeli, ki jo prožilci ob dodajanju,
+    posodabljanju in brisanju vrstic sproti posodabljajo.
+    Ob spremembi se na novo izračuna le lestvica prizadete skupine,
+    kar je zaradi indeksa na stolpcih skupine in urejanja poceni.
+    """
+
+    def __init__(self, skupina, uredi, n=10):
+        """
+        Konstruktor lestvice.
+
+        Vrstice se združijo po stolpcu `skupina` in uredijo po stolpcih `uredi`
+        (enako kot pri metodi `seznam`), pri enakih vrednostih pa še po ključu.
+        V vsaki skupini se hrani najboljših `n` vrstic.
+        """
+        self.skupina = skupina
+        self.uredi = uredi
+        self.n = n
+        self.razred = None
+
+    def _ime(self):
+        """
+        Vrni ime tabele z lestvico.
+        """
+        return f"{self.razred._ime_tabele()}_lestvica_{self.skupina}"
+
+    def objekti(self):
+        """
+        Vrni imena tabele, indeksa in prožilcev lestvice.
+        """
+        ime = self._ime()
+        return {ime, f"{ime}_indeks", f"{ime}_vstavi", f"{ime}_posodobi", f"{ime}_izbrisi"}
+
+    def _uredi(self):
+        """
+        Vrni stolpce za urejanje, dopolnjene s ključem.
+        """
+        return [*self.uredi, self.razred.KLJUC.name]
+
+    def _orderby(self):
+        """
+        Vrni seznam izrazov za urejanje vrstic tabele z oznako `_`.
+        """
+        return ', '.join(Tabela._stolpec_za_urejanje(stolpec) for stolpec in self._uredi())
+
+    def _sql_izracunaj(self, vrstica):
+        """
+        Vrni poizvedbi, ki na novo izračunata lestvico skupine,
+        v kateri je vrstica `NEW` ali `OLD` v prožilcu.
+        """
+        return f"""
+            DELETE FROM {self._ime()} WHERE skupina = {vrstica}.{self.skupina};
+            INSERT INTO {self._ime()} (skupina, kljuc)
+                SELECT _.{self.skupina}, _.{self.razred.KLJUC.name}
+                  FROM {self.razred._ime_tabele()} AS _
+                 WHERE _.{self.skupina} = {vrstica}.{self.skupina}
+                 ORDER BY {self._orderby()}
+                 LIMIT {self.n};
+        """
+
+    def ustvari(self, cur=None):
+        """
+        Ustvari tabelo z lestvico, indeks za njen izračun in prožilce,
+        če še ne obstajajo, ter lestvico napolni.
+        """
+        tabela = self.razred._ime_tabele()
+        ime = self._ime()
+        stolpci = [f"{stolpec.stolpec} DESC" if isinstance(stolpec, Padajoce) else stolpec
+                   for stolpec in self._uredi()]
+        spremljani = ', '.join(dict.fromkeys(
+            (self.skupina, *(stolpec.stolpec if isinstance(stolpec, Padajoce) else stolpec
+                             for stolpec in self.uredi))))
+        with Kazalec(cur) as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {ime} (
+                    skupina {self.razred._tip(self.razred._polje_za_stolpec(self.skupina))},
+                    kljuc {self.razred._tip(self.razred.KLJUC)},
+                    PRIMARY KEY (skupina, kljuc)
+                );
+            """)
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS {ime}_indeks ON {tabela} ({self.skupina}, {', '.join(stolpci)});
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {ime}_vstavi AFTER INSERT ON {tabela}
+                BEGIN
+                    {self._sql_izracunaj('NEW')}
+                END;
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {ime}_posodobi AFTER UPDATE OF {spremljani} ON {tabela}
+                BEGIN
+                    {self._sql_izracunaj('OLD')}
+                    {self._sql_izracunaj('NEW')}
+                END;
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {ime}_izbrisi AFTER DELETE ON {tabela}
+                WHEN EXISTS (SELECT 1 FROM {ime} WHERE kljuc = OLD.{self.razred.KLJUC.name})
+                BEGIN
+                    {self._sql_izracunaj('OLD')}
+                END;
+            """)
+            self.osvezi(cur=cur)
+
+    def osvezi(self, cur=None):
+        """
+        Na novo izračunaj lestvice vseh skupin.
+        """
+        with Kazalec(cur) as cur:
+            cur.execute(f"DELETE FROM {self._ime()};")
+            cur.execute(f"""
+                INSERT INTO {self._ime()} (skupina, kljuc)
+                SELECT skupina, kljuc FROM (
+                    SELECT _.{self.skupina} AS skupina, _.{self.razred.KLJUC.name} AS kljuc,
+                           ROW_NUMBER() OVER (PARTITION BY _.{self.skupina}
+                                              ORDER BY {self._orderby()}) AS mesto
+                      FROM {self.razred._ime_tabele()} AS _
+                     WHERE _.{self.skupina} IS NOT NULL
+                ) WHERE mesto <= {self.n};
+            """)
+
+    def pobrisi(self, cur=None):
+        """
+        Pobriši tabelo z lestvico, njen indeks in prožilce.
+        """
+        ime = self._ime()
+        with Kazalec(cur) as cur:
+            for operacija in ('vstavi', 'posodobi', 'izbrisi'):
+                cur.execute(f"DROP TRIGGER IF EXISTS {ime}_{operacija};")
+            cur.execute(f"DROP INDEX IF EXISTS {ime}_indeks;")
+            cur.execute(f"DROP TABLE IF EXISTS {ime};")
+
+    def seznam(self, vrednost=None, n=None, predpomni=None):
+        """
+        Vračaj najboljših `n` objektov v skupini s podano vrednostjo.
+
+        Če vrednost ni podana, vračaj najboljše objekte vseh skupin, urejene po skupinah.
+        Če je `n` večji od velikosti lestvice, se objekti poiščejo v osnovni tabeli.
+        """
+        if n is None:
+            n = self.n
+        tabela = self.razred._ime_tabele()
+        pridruzi = f"""
+            {self._ime()} AS l JOIN {tabela} AS _ ON _.{self.razred.KLJUC.name} = l.kljuc
+        """
+        if vrednost is not None:
+            if n > self.n:
+                yield from self.razred.seznam(**{self.skupina: vrednost},
+                                              uredi=self._uredi(), omejitev=n,
+                                              predpomni=predpomni)
+                return
+            yield from self.razred._seznam(
+                f"(SELECT _.* FROM {pridruzi} WHERE l.skupina = :_skupina)",
+                "", dict(_skupina=vrednost), uredi=self._uredi(), omejitev=n,
+                predpomni=predpomni)
+        else:
+            assert n <= self.n, "Lestvica je prekratka"
+            yield from self.razred._seznam(f"""(
+                SELECT * FROM (
+                    SELECT _.*, ROW_NUMBER() OVER (PARTITION BY l.skupina
+                                                   ORDER BY {self._orderby()}) AS _mesto
+                      FROM {pridruzi}
+                ) WHERE _mesto <= :_n
+            )""", "", dict(_n=n), uredi=[self.skupina, *self._uredi()],
+                predpomni=predpomni)
 
 
 class Tabela:
@@ -129,22 +1670,80 @@ class Tabela:
     """
 
     TABELE = []
+    RAZDELITEV = None
+    PREDPOMNI = False
+    _posnetek = None
+
+    def __init_subclass__(cls, /, dodaj=False, uredi=[], vir=None, enolicnost=[],
+                          spremembe=False, predpomni=None, **kwargs):
+        """
+        Inicializacija podrazreda.
+
+        Doda podrazred v seznam tabel.
+        Če je nastavljen parameter `spremembe`, se spremembe tabele
+        beležijo v dnevnik sprememb.
+        Če je nastavljen parameter `predpomni`, se rezultati poizvedb
+        privzeto shranjujejo v predpomnilnik.
+        """
+        super().__init_subclass__(**kwargs)
+        if predpomni is not None:
+            cls.PREDPOMNI = predpomni
+        if dodaj:
+            cls.TABELE.append(cls)
+            cls.VIR = vir
+            cls.ENOLICNOST = enolicnost
+            cls.UREDI = uredi
+            cls.SPREMEMBE = spremembe
+            dataclass(cls)
+
+    @classmethod
+    def _pripravi_json(cls):
+        """
+        Razredu dodaj metode za pretvorbo v JSON in iz njega.
+
+        Knjižnica `dataclasses_json` se uvozi ob prvi uporabi.
+        """
+        if 'to_dict' not in cls.__dict__:
+            from dataclasses_json import dataclass_json
+            dataclass_json(cls)
+
+    def to_dict(self, encode_json=False):
+        """
+        Vrni slovar z vrednostmi polj objekta.
+        """
+        self._pripravi_json()
+        return self.to_dict(encode_json=encode_json)
+
+    def to_json(self, *largs, **kwargs):
+        """
+        Vrni predstavitev objekta v obliki JSON.
+        """
+        self._pripravi_json()
+        return self.to_json(*largs, **kwargs)
+
+    @classmethod
+    def from_dict(cls, slovar, *, infer_missing=False):
+        """
+        Vrni objekt z vrednostmi polj iz slovarja.
+        """
+        cls._pripravi_json()
+        return cls.from_dict(slovar, infer_missing=infer_missing)
 
-    def __init_subclass__(cls, /, dodaj=False, uredi=[],
-                          vir=None, enolicnost=[], **kwargs):
+    @classmethod
+    def from_json(cls, niz, *largs, **kwargs):
         """
-        Inicializacija podrazreda.
+        Vrni objekt iz predstavitve v obliki JSON.
+        """
+        cls._pripravi_json()
+        return cls.from_json(niz, *largs, **kwargs)
 
-        Doda podrazred v seznam tabel.
+    @classmethod
+    def schema(cls, *largs, **kwargs):
         """
-        super().__init_subclass__(**kwargs)
-        if dodaj:
-            cls.TABELE.append(cls)
-            cls.VIR = vir
-            cls.ENOLICNOST = enolicnost
-            cls.UREDI = uredi
-            dataclass(cls)
-            dataclass_json(cls)
+        Vrni shemo `marshmallow` za razred.
+        """
+        cls._pripravi_json()
+        return cls.schema(*largs, **kwargs)
 
     @classmethod
     def preberi_vir(cls):
@@ -174,35 +1773,166 @@ class Tabela:
         else:
             return TIPI[f.type]
 
+    @staticmethod
+    def _osnovni_tip(f):
+        """
+        Vrni Pythonov tip vrednosti, shranjenih v podanem polju.
+        """
+        if issubclass(f.type, Entiteta):
+            return f.type._osnovni_tip(f.type.KLJUC)
+        else:
+            return f.type
+
     @classmethod
-    def ustvari_tabelo(cls, cur=None):
+    def _sql_ustvari(cls, tabela, reference=True):
         """
-        Ustvari tabelo.
+        Vrni poizvedbo za ustvarjanje tabele s podanim imenom.
+
+        Če `reference` ni nastavljeno, se tuji ključi izpustijo.
         """
-        stolpci = ', '.join(f"""
-                {f.name} {cls._tip(f)}
-                {'UNIQUE' if f.metadata['enolicno'] else ''}
-                {'NOT NULL' if f.metadata['obvezno'] else ''}
-                {f'DEFAULT ({f.default})' if f.default is not None else ''}
-                {f'''
-                    REFERENCES {f.type._ime_tabele()}
-                    ({', '.join(k.name for k in f.type._kljuc())})
-                  ''' if issubclass(f.type, Entiteta) else ''}
-            """ for f in fields(cls))
+        stolpci = ', '.join(cls._sql_stolpec(f, reference) for f in fields(cls))
         kljuc = ', '.join(f.name for f in cls._kljuc())
         #privzeto = [f.default for f in fields(cls) if f.default is not None]
         #print(privzeto)
         enolicnost = ', '.join((f'PRIMARY KEY ({kljuc})', *(
             f'UNIQUE ({', '.join(u)})' for u in cls.ENOLICNOST
         )))
-        sql = f"""
-                CREATE TABLE {cls._ime_tabele()} (
+        return f"""
+                CREATE TABLE {tabela} (
                     {stolpci},
                     {enolicnost}
                 );
             """
+
+    @classmethod
+    def _sql_stolpec(cls, f, reference=True):
+        """
+        Vrni definicijo stolpca za podano polje.
+
+        Če `reference` ni nastavljeno, se tuji ključ izpusti.
+        """
+        return f"""
+                {f.name} {cls._tip(f)}
+                {'UNIQUE' if f.metadata['enolicno'] else ''}
+                {'NOT NULL' if f.metadata['obvezno'] else ''}
+                {f'DEFAULT ({f.default})' if f.default is not None else ''}
+                {f'''
+                    REFERENCES {f.type._ime_tabele()}
+                    ({', '.join(k.name for k in f.type._kljuc())})
+                  ''' if reference and issubclass(f.type, Entiteta) else ''}
+            """
+
+    @classmethod
+    def ustvari_tabelo(cls, cur=None):
+        """
+        Ustvari tabelo.
+        """
+        with Kazalec(cur) as cur:
+            cur.execute(cls._sql_ustvari(cls._ime_tabele())) #, privzeto)
+            cls._ustvari_pomozne_objekte(cur=cur)
+
+    @classmethod
+    def _ustvari_pomozne_objekte(cls, cur=None):
+        """
+        Ustvari pomožne objekte tabele (prožilce, lestvice),
+        ki še ne obstajajo.
+        """
+        with Kazalec(cur) as cur:
+            cls._ustvari_prozilce_generacij(cur=cur)
+            if cls.SPREMEMBE:
+                cls._ustvari_prozilce(cur=cur)
+
+    @classmethod
+    def _pomozni_objekti(cls):
+        """
+        Vrni množico imen pomožnih objektov tabele,
+        ki jih preverja načrt migracije.
+
+        To so prožilci generacij, če se generacije beležijo,
+        in prožilci dnevnika sprememb, če se spremembe beležijo.
+        """
+        tabela = cls._ime_tabele()
+        objekti = set()
+        if _sledenje_generacijam():
+            objekti |= {f"{tabela}_generacija_{operacija}"
+                        for operacija in ('insert', 'update', 'delete')}
+        if cls.SPREMEMBE:
+            objekti |= {f"{tabela}_spremembe_{operacija}"
+                        for operacija in ('vstavi', 'posodobi', 'izbrisi')}
+        return objekti
+
+    @classmethod
+    def _predpone_pomoznih_objektov(cls):
+        """
+        Vrni predpone imen pomožnih objektov tabele,
+        ki jih načrt migracije odstrani, če niso več potrebni.
+        """
+        tabela = cls._ime_tabele()
+        return (f"{tabela}_generacija_", f"{tabela}_spremembe_")
+
+    @classmethod
+    def _ustvari_prozilce_generacij(cls, cur=None):
+        """
+        Ustvari prožilce, ki ob vsaki spremembi tabele
+        povečajo njeno generacijo v tabeli generacij.
+
+        Prožilci se ustvarijo le, če se generacije tabel beležijo.
+        """
+        tabela = cls._ime_tabele()
+        with Kazalec(cur) as cur:
+            if not _sledenje_generacijam(cur):
+                return
+            for operacija in ('INSERT', 'UPDATE', 'DELETE'):
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {tabela}_generacija_{operacija.lower()}
+                    AFTER {operacija} ON {tabela}
+                    BEGIN
+                        INSERT INTO {GENERACIJE} (tabela, generacija) VALUES ('{tabela}', 1)
+                        ON CONFLICT (tabela) DO UPDATE SET generacija = generacija + 1;
+                    END;
+                """)
+
+    @classmethod
+    def _ustvari_prozilce(cls, cur=None):
+        """
+        Ustvari dnevnik sprememb, če še ne obstaja,
+        in prožilce, ki vanj beležijo spremembe tabele.
+
+        Ključ vrstice se zabeleži kot tabela JSON vrednosti stolpcev ključa.
+        Če se ob posodobitvi spremeni ključ, se stari ključ zabeleži kot izbrisan.
+        """
+        tabela = cls._ime_tabele()
+        novi, stari = (f"json_array({', '.join(f'{vrstica}.{f.name}' for f in cls._kljuc())})"
+                       for vrstica in ('NEW', 'OLD'))
+        vstavi = f"INSERT INTO {DNEVNIK} (tabela, kljuc, operacija)"
         with Kazalec(cur) as cur:
-            cur.execute(sql) #, privzeto)
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {DNEVNIK} (
+                    zaporedje INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tabela TEXT NOT NULL,
+                    kljuc TEXT NOT NULL,
+                    operacija TEXT NOT NULL
+                );
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabela}_spremembe_vstavi AFTER INSERT ON {tabela}
+                BEGIN
+                    {vstavi} VALUES ('{tabela}', {novi}, 'I');
+                END;
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabela}_spremembe_posodobi AFTER UPDATE ON {tabela}
+                BEGIN
+                    {vstavi} VALUES ('{tabela}', {novi}, 'U');
+                    {vstavi} SELECT '{tabela}', {stari}, 'D' WHERE {stari} <> {novi};
+                END;
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tabela}_spremembe_izbrisi AFTER DELETE ON {tabela}
+                BEGIN
+                    {vstavi} VALUES ('{tabela}', {stari}, 'D');
+                END;
+            """)
 
     @classmethod
     def pobrisi_tabelo(cls, cur=None):
@@ -214,47 +1944,178 @@ class Tabela:
                 DROP TABLE IF EXISTS {cls._ime_tabele()};
             """)
 
+    @classmethod
+    def _razveljavi(cls):
+        """
+        Razveljavi predpomnjene rezultate poizvedb, ki vsebujejo tabelo.
+        """
+        predpomnilnik.razveljavi(cls._ime_tabele())
+
+    @classmethod
+    def _odvisne_tabele(cls):
+        """
+        Vrni imena tabel, ob spremembi katerih se spremeni vsebina tabele.
+        """
+        return (cls._ime_tabele(), )
+
+    @classmethod
+    def _samodejni_kljuc(cls):
+        """
+        Vrni, ali ima tabela samodejno generiran ključ.
+        """
+        return any(f.metadata['samodejno'] for f in fields(cls))
+
+    def _kljuci(self):
+        """
+        Vrni imena stolpcev, ki sestavljajo ključ.
+        """
+        return tuple(f.name for f in self._kljuc())
+
+    def _stolpci_za_dodajanje(self):
+        """
+        Vrni imena stolpcev, ki se zapišejo ob dodajanju.
+        """
+        return tuple(f.name for f in fields(self)
+                     if not f.metadata['samodejno'] and f.metadata['shrani'])
+
+    def _stolpci_za_posodobitev(self):
+        """
+        Vrni imena stolpcev, ki se zapišejo ob posodobitvi.
+        """
+        return tuple(f.name for f in fields(self) if f.metadata['shrani'])
+
+    def _vrednost(self, stolpec):
+        """
+        Vrni vrednost stolpca za zapis v bazo.
+
+        Namesto povezanih objektov vrne vrednosti njihovih ključev.
+        """
+        vrednost = getattr(self, stolpec)
+        if isinstance(vrednost, Entiteta):
+            return getattr(vrednost, vrednost.KLJUC.name)
+        return vrednost
+
+    def _zapomni(self):
+        """
+        Zapomni si trenutne vrednosti shranjenih stolpcev,
+        kot so zapisane v bazi.
+        """
+        self._posnetek = self._vrednosti(self._stolpci_za_posodobitev())
+
+    def _spremenjeni_stolpci(self, kwargs={}):
+        """
+        Vrni imena shranjenih stolpcev, ki so se spremenili,
+        odkar je bil objekt prebran iz baze ali vanjo zapisan.
+
+        Če objekt ni bil prebran iz baze, vrne vse shranjene stolpce.
+        Stolpci iz `kwargs` se izpustijo, saj se zapišejo v vsakem primeru.
+        """
+        if self._posnetek is None:
+            stolpci = self._stolpci_za_posodobitev()
+        else:
+            stolpci = tuple(
+                f.name for f in fields(self) if f.metadata['shrani'] and
+                _normaliziraj(self._osnovni_tip(f), self._vrednost(f.name)) !=
+                _normaliziraj(self._osnovni_tip(f), self._posnetek[f.name]))
+        return tuple(stolpec for stolpec in stolpci if stolpec not in kwargs)
+
+    def _vrednosti(self, stolpci, kwargs={}):
+        """
+        Vrni slovar parametrov z vrednostmi podanih stolpcev.
+
+        Vrednosti iz `kwargs` imajo prednost pred vrednostmi atributov.
+        """
+        return {**{stolpec: self._vrednost(stolpec)
+                   for stolpec in stolpci if stolpec not in kwargs},
+                **kwargs}
+
+    @classmethod
+    def _tabela_za(cls, vrednosti):
+        """
+        Vrni ime tabele, v kateri je vrstica s podanimi vrednostmi stolpcev.
+        """
+        return cls._ime_tabele()
+
+    def _tabela(self):
+        """
+        Vrni ime tabele, v kateri je objekt.
+        """
+        return self._tabela_za(self._vrednosti(self._kljuci()))
+
+    @classmethod
+    def _vir(cls, kwargs):
+        """
+        Vrni vir vrstic za določilo FROM in določilo WHERE za podane pogoje.
+        """
+        return cls._ime_tabele(), cls._pogoji(kwargs)
+
+    @classmethod
+    def _sql_dodaj(cls, stolpci, tabela=None):
+        """
+        Vrni poizvedbo za dodajanje vrstice s podanimi stolpci.
+        """
+        return f"""
+            INSERT INTO {tabela or cls._ime_tabele()} ({', '.join(stolpci)})
+            VALUES ({', '.join(f':{stolpec}' for stolpec in stolpci)});
+        """
+
+    @classmethod
+    def _sql_posodobi(cls, stolpci, tabela=None):
+        """
+        Vrni poizvedbo za posodobitev podanih stolpcev vrstice.
+        """
+        return f"""
+            UPDATE {tabela or cls._ime_tabele()}
+            SET {', '.join(f'{stolpec} = :{stolpec}' for stolpec in stolpci)}
+            WHERE {' AND '.join(f'{f.name} = :{f.name}' for f in cls._kljuc())};
+        """
+
+    @classmethod
+    def _sql_izbrisi(cls, tabela=None):
+        """
+        Vrni poizvedbo za brisanje vrstice.
+        """
+        return f"""
+            DELETE FROM {tabela or cls._ime_tabele()}
+            WHERE {' AND '.join(f'{f.name} = :{f.name}' for f in cls._kljuc())};
+        """
+
     def dodaj(self, transakcija=True, /, **kwargs):
         """
         Dodaj objekt v bazo.
         """
         assert self._v_bazi(False), "Objekt je že v bazi"
-        stolpci = [*(f.name for f in fields(self)
-                     if not f.metadata['samodejno'] and f.metadata['shrani']),
-                   *kwargs]
-        sql = f"""
-            INSERT INTO {self._ime_tabele()} ({', '.join(stolpci)})
-            VALUES ({', '.join(f':{stolpec}' for stolpec in stolpci)});
-        """
+        stolpci = [*self._stolpci_za_dodajanje(), *kwargs]
         try:
             with Kazalec() as cur:
                 with Transakcija(transakcija):
-                    cur.execute(sql,
-                                {**{stolpec: getattr(self, stolpec)
-                                    for stolpec in stolpci},
-                                 **kwargs})
+                    cur.execute(self._sql_dodaj(stolpci, self._tabela()),
+                                self._vrednosti(stolpci, kwargs))
                     self._nastavi_kljuc(cur.lastrowid)
+            self._zapomni()
+            self._razveljavi()
         except dbapi.IntegrityError:
             raise ValueError("Dodajanje objekta ni bilo uspešno!")
 
     def posodobi(self, transakcija=True, /, **kwargs):
         """
         Posodobi objekt v bazi.
+
+        Zapišejo se le stolpci, ki so se spremenili, odkar je bil objekt
+        prebran iz baze, in stolpci iz `kwargs`.
+        Če se ni spremenilo nič, se poizvedba ne izvede.
         """
         assert self._v_bazi(True), "Objekta še ni v bazi"
-        stolpci = [*(f.name for f in fields(self) if f.metadata['shrani']),
-                   *kwargs]
-        sql = f"""
-            UPDATE {self._ime_tabele()}
-            SET {', '.join(f'{stolpec} = :{stolpec}' for stolpec in stolpci)}
-            WHERE {' AND '.join(f'{f.name} = :{f.name}' for f in self._kljuc())};
-        """
+        stolpci = [*self._spremenjeni_stolpci(kwargs), *kwargs]
+        if not stolpci:
+            return
         try:
             with Kazalec() as cur:
                 with Transakcija(transakcija):
-                    cur.execute(sql, {**{stolpec: getattr(self, stolpec)
-                                         for stolpec in stolpci},
-                                      **kwargs})
+                    cur.execute(self._sql_posodobi(stolpci, self._tabela()),
+                                self._vrednosti([*stolpci, *self._kljuci()], kwargs))
+            self._zapomni()
+            self._razveljavi()
         except dbapi.IntegrityError:
             raise ValueError("Posodabljanje objekta ni bilo uspešno!")
 
@@ -263,15 +2124,14 @@ class Tabela:
         Izbriši objekt iz baze.
         """
         assert self._v_bazi(True), "Objekta še ni v bazi"
-        sql = f"""
-            DELETE FROM {self._ime_tabele()}
-            WHERE {' AND '.join(f'{f.name} = :{f.name}' for f in self._kljuc())};
-        """
         try:
             with Kazalec() as cur:
                 with Transakcija(transakcija):
-                    cur.execute(sql, {f.name: getattr(self, f.name) for f in self._kljuc()})
+                    cur.execute(self._sql_izbrisi(self._tabela()),
+                                self._vrednosti(self._kljuci()))
                     self._nastavi_kljuc(None)
+            self._posnetek = None
+            self._razveljavi()
         except dbapi.IntegrityError:
             raise ValueError("Brisanje objekta ni bilo uspešno!")
 
@@ -282,6 +2142,15 @@ class Tabela:
         """
         return vrstica
 
+    @classmethod
+    def _obdelaj_izvoz(cls, vrstica, pridruzeni):
+        """
+        Obdelaj vrstico pred izvozom v obliko vira.
+
+        Slovar `pridruzeni` vsebuje vrednosti stolpcev pridruženih tabel.
+        """
+        return vrstica
+
     @classmethod
     def uvozi_podatke(cls, cur=None):
         """
@@ -291,11 +2160,201 @@ class Tabela:
             return
         with Kazalec(cur) as cur:
             for vrstica in cls.preberi_vir():
-                vrstica = cls._obdelaj_podatek(vrstica)
+                identiteta, zgostitev = cls._zgostitev_vira(vrstica)
+                cls._vstavi_vrstico(cls._obdelaj_podatek(vrstica),
+                                    identiteta, zgostitev, cur=cur)
+        cls._razveljavi()
+
+    @classmethod
+    def izvozi(cls, pot_ali_tok, /, oblika='csv', pridruzi=False, uredi=None,
+               paket=1000, **kwargs):
+        """
+        Izvozi vrstice, ki ustrezajo navedenim pogojem, v datoteko ali tok
+        in vrni število izvoženih vrstic.
+
+        Podprti obliki sta 'csv' in 'jsonl'.
+        Vrstice se berejo iz kazalca po kosih velikosti `paket`
+        in sproti zapisujejo, tako da poraba pomnilnika ni odvisna od števila vrstic.
+        Vrstice so v obliki vira, kot ga pričakuje uvoz,
+        in so urejene po vrstnem redu vstavljanja, če ni podan `uredi`.
+        Če je nastavljen parameter `pridruzi`, se dodajo še stolpci pridruženih tabel
+        s predpono poti do njih (npr. `film_oznaka_kratica`).
+        """
+        assert oblika in ('csv', 'jsonl'), "Neznana oblika izvoza"
+        polja, join = cls._polja()
+        preslikava = {(tabela, f): f"{tabela}.{f.name}"
+                      for tabela, p in polja.items() for f in p}
+        stolpci = [f.name if tabela == "_" else f"{tabela[:-2]}_{f.name}"
+                   for tabela, f in preslikava]
+        lastnih = len(polja["_"])
+        if uredi is None and cls.RAZDELITEV is None and not issubclass(cls, Pogled):
+            uredi = ["rowid"]
+        vir, where = cls._vir(kwargs)
+
+        def obdelaj(vrstica):
+            izvoz = cls._obdelaj_izvoz(dict(zip(stolpci[:lastnih], vrstica[:lastnih])),
+                                       dict(zip(stolpci[lastnih:], vrstica[lastnih:])))
+            if pridruzi:
+                izvoz.update(zip(stolpci[lastnih:], vrstica[lastnih:]))
+            return izvoz
+
+        glava = list(obdelaj([None] * len(stolpci)))
+        tok = open(pot_ali_tok, 'w', encoding='utf-8', newline='') \
+            if isinstance(pot_ali_tok, (str, os.PathLike)) else pot_ali_tok
+        try:
+            if oblika == 'csv':
+                wr = csv.writer(tok, lineterminator='\n')
+                wr.writerow(glava)
+            izvozenih = 0
+            with Kazalec(branje=cls.RAZDELITEV is None) as cur:
                 cur.execute(f"""
-                    INSERT INTO {cls._ime_tabele()} ({', '.join(vrstica)})
-                    VALUES ({', '.join(f':{stolpec}' for stolpec in vrstica)});
-                """, vrstica)
+                    SELECT {', '.join(preslikava.values())}
+                      FROM {vir} AS _
+                     {cls._pridruzitve(join)}
+                     {where}
+                     {cls._sql_uredi(uredi)};
+                """, cls._parametri(kwargs))
+                while vrstice := cur.fetchmany(paket):
+                    vrstice = [obdelaj(vrstica) for vrstica in vrstice]
+                    if oblika == 'csv':
+                        wr.writerows([_vrednost_csv(vrstica[stolpec]) for stolpec in glava]
+                                     for vrstica in vrstice)
+                    else:
+                        tok.writelines(json.dumps(vrstica, ensure_ascii=False) + '\n'
+                                       for vrstica in vrstice)
+                    izvozenih += len(vrstice)
+        finally:
+            if tok is not pot_ali_tok:
+                tok.close()
+        return izvozenih
+
+    @classmethod
+    def _zgostitev_vira(cls, vrstica):
+        """
+        Vrni identiteto in zgostitev neobdelane vrstice vira.
+
+        Identiteta so vrednosti stolpcev ključa
+        ali prve enolične skupine stolpcev, ki so vsi prisotni v viru.
+        Če takih stolpcev ni, je identiteta kar zgostitev vrstice,
+        tako da se vrednosti vira (npr. gesla) ne shranjujejo v bazo.
+        """
+        zgostitev = hashlib.blake2b(json.dumps(vrstica, sort_keys=True).encode('utf-8'),
+                                    digest_size=16).hexdigest()
+        for kljuc in ([f.name for f in cls._kljuc()],
+                      *([f.name] for f in fields(cls) if f.metadata.get('enolicno')),
+                      *cls.ENOLICNOST):
+            if all(stolpec in vrstica for stolpec in kljuc):
+                return json.dumps([vrstica[stolpec] for stolpec in kljuc]), zgostitev
+        return zgostitev, zgostitev
+
+    @classmethod
+    def _vstavi_vrstico(cls, vrstica, identiteta, zgostitev, cur=None):
+        """
+        Vstavi obdelano vrstico vira v tabelo in zabeleži njeno zgostitev.
+        """
+        with Kazalec(cur) as cur:
+            cur.execute(f"""
+                INSERT INTO {cls._tabela_za(vrstica)} ({', '.join(vrstica)})
+                VALUES ({', '.join(f':{stolpec}' for stolpec in vrstica)});
+            """, vrstica)
+            kljuc = [vrstica[f.name] if f.name in vrstica else cur.lastrowid
+                     for f in cls._kljuc()]
+            cur.execute(f"""
+                INSERT OR REPLACE INTO {ZGOSTITVE} (tabela, identiteta, zgostitev, kljuc)
+                VALUES (:tabela, :identiteta, :zgostitev, :kljuc);
+            """, dict(tabela=cls._ime_tabele(), identiteta=identiteta,
+                      zgostitev=zgostitev, kljuc=json.dumps(kljuc)))
+
+    @classmethod
+    def _posodobi_vrstico(cls, vrstica, identiteta, zgostitev, kljuc, cur=None):
+        """
+        Posodobi vrstico s podanim ključem z vrednostmi obdelane vrstice vira
+        in zabeleži njeno novo zgostitev.
+        """
+        kljuc = dict(zip((f.name for f in cls._kljuc()), json.loads(kljuc)))
+        with Kazalec(cur) as cur:
+            cur.execute(f"""
+                UPDATE {cls._tabela_za(kljuc)}
+                   SET {', '.join(f'{stolpec} = :{stolpec}' for stolpec in vrstica)}
+                 WHERE {' AND '.join(f'{stolpec} = :_{stolpec}' for stolpec in kljuc)};
+            """, {**vrstica, **{f'_{stolpec}': vrednost for stolpec, vrednost in kljuc.items()}})
+            cur.execute(f"""
+                UPDATE {ZGOSTITVE} SET zgostitev = :zgostitev
+                 WHERE tabela = :tabela AND identiteta = :identiteta;
+            """, dict(tabela=cls._ime_tabele(), identiteta=identiteta, zgostitev=zgostitev))
+
+    @classmethod
+    def sinhroniziraj_vir(cls, paket=1000):
+        """
+        Dodaj nove in posodobi spremenjene vrstice vira,
+        pri čemer primerja zgostitve vrstic z zabeleženimi.
+
+        Spremembe se izvedejo v transakcijah s po `paket` vrsticami.
+        Vrne število dodanih in posodobljenih vrstic
+        ter slovar zabeleženih vrstic, ki jih v viru ni več.
+        """
+        if not cls.VIR:
+            return 0, 0, {}
+        with Kazalec() as cur:
+            cur.execute(f"""
+                SELECT identiteta, zgostitev, kljuc FROM {ZGOSTITVE} WHERE tabela = :tabela;
+            """, dict(tabela=cls._ime_tabele()))
+            znane = {identiteta: (zgostitev, kljuc) for identiteta, zgostitev, kljuc in cur}
+
+        def spremenjene():
+            for vrstica in cls.preberi_vir():
+                identiteta, zgostitev = cls._zgostitev_vira(vrstica)
+                znana = znane.pop(identiteta, None)
+                if znana is None or znana[0] != zgostitev:
+                    yield vrstica, identiteta, zgostitev, znana
+
+        dodanih = posodobljenih = 0
+        vrstice = spremenjene()
+        try:
+            with Kazalec() as cur:
+                while spremembe := list(islice(vrstice, paket)):
+                    with Transakcija():
+                        for vrstica, identiteta, zgostitev, znana in spremembe:
+                            vrstica = cls._obdelaj_podatek(vrstica)
+                            if znana is None:
+                                cls._vstavi_vrstico(vrstica, identiteta, zgostitev, cur=cur)
+                                dodanih += 1
+                            else:
+                                cls._posodobi_vrstico(vrstica, identiteta, zgostitev,
+                                                      znana[1], cur=cur)
+                                posodobljenih += 1
+                    cls._razveljavi()
+        except dbapi.IntegrityError:
+            raise ValueError("Sinhronizacija vira ni bila uspešna!")
+        return dodanih, posodobljenih, znane
+
+    @classmethod
+    def izbrisi_vrstice_vira(cls, vrstice, paket=1000):
+        """
+        Izbriši podane zabeležene vrstice vira iz tabele.
+
+        Brisanje se izvede v transakcijah s po `paket` vrsticami.
+        Vrne število izbrisanih vrstic.
+        """
+        vrstice = iter(vrstice.items())
+        izbrisanih = 0
+        try:
+            with Kazalec() as cur:
+                while brisanje := list(islice(vrstice, paket)):
+                    with Transakcija():
+                        for identiteta, (_, kljuc) in brisanje:
+                            kljuc = dict(zip((f.name for f in cls._kljuc()),
+                                             json.loads(kljuc)))
+                            cur.execute(cls._sql_izbrisi(cls._tabela_za(kljuc)), kljuc)
+                            cur.execute(f"""
+                                DELETE FROM {ZGOSTITVE}
+                                 WHERE tabela = :tabela AND identiteta = :identiteta;
+                            """, dict(tabela=cls._ime_tabele(), identiteta=identiteta))
+                    izbrisanih += len(brisanje)
+                    cls._razveljavi()
+        except dbapi.IntegrityError:
+            raise ValueError("Sinhronizacija vira ni bila uspešna!")
+        return izbrisanih
 
     @classmethod
     def _polja(cls, dodatni_stolpci=()):
@@ -320,62 +2379,275 @@ class Tabela:
         """
         Vrni objekt s podanimi podatki.
         """
-        tabela = f"{predpona}_"
-        return cls(**{f.name: f.type._objekt(slovar, polja, preslikava, f"{predpona}{f.name}_")
-                      if issubclass(f.type, Entiteta) else slovar[preslikava[tabela, f]]
-                      for f in polja[tabela]})
+        tabela = f"{predpona}_"
+        objekt = cls(**{f.name: f.type._objekt(slovar, polja, preslikava, f"{predpona}{f.name}_")
+                        if issubclass(f.type, Entiteta) else slovar[preslikava[tabela, f]]
+                        for f in polja[tabela]})
+        objekt._zapomni()
+        return objekt
+
+    @staticmethod
+    def _stolpec_za_urejanje(stolpec):
+        if isinstance(stolpec, Padajoce):
+            return str(stolpec)
+        if isinstance(stolpec, str):
+            stolpec = (stolpec, )
+        *predpone, stolpec = stolpec
+        return f"{''.join(f'{s}_' for s in predpone)}_.{stolpec}"
+
+    @classmethod
+    def _sql_uredi(cls, uredi=None):
+        """
+        Vrni določilo ORDER BY za podane stolpce za urejanje.
+
+        Če stolpci niso podani, se uporabi privzeta ureditev razreda.
+        """
+        if uredi is None:
+            uredi = cls.UREDI
+        if not uredi:
+            return ""
+        return f"ORDER BY {', '.join(
+            f"{Tabela._stolpec_za_urejanje(stolpec)}" for stolpec in uredi)}"
+
+    @classmethod
+    def _sql_json(cls, vir, where, dodatni_stolpci=(), uredi=None, limit=""):
+        """
+        Vrni podpoizvedbo, ki vrne tabelo JSON z vrsticami iz podanega vira
+        v obliki objektov JSON, ter funkcijo, ki iz vrednosti podpoizvedbe
+        sestavi seznam objektov.
+        """
+        polja, join = cls._polja(dodatni_stolpci)
+        preslikava = {(tabela, f): f"{tabela}.{f.name}"
+                      for tabela, p in polja.items() for f in p}
+        sql = f"""(
+            SELECT json_group_array(json(_objekt)) FROM (
+              SELECT json_object({', '.join(f"'{stolpec}', {stolpec}"
+                                            for stolpec in preslikava.values())}) AS _objekt
+                FROM {vir} AS _
+               {cls._pridruzitve(join)}
+               {where}
+               {cls._sql_uredi(uredi)}
+               {limit}
+            )
+        )"""
+        return sql, lambda vrednost: [cls._objekt(slovar, polja, preslikava)
+                                      for slovar in json.loads(vrednost)]
+
+    @staticmethod
+    def _pridruzitve(join):
+        """
+        Vrni stavke LEFT JOIN za podane pridružitve.
+        """
+        return '\n'.join(f"LEFT JOIN {ime_tabele} AS {tabela} ON {stolpec1} = {stolpec2}"
+                         for ime_tabele, tabela, stolpec1, stolpec2 in join)
+
+    @staticmethod
+    def _pogoji(kwargs):
+        """
+        Vrni določilo WHERE za podane pogoje.
+        """
+        if not kwargs:
+            return ""
+        return "WHERE " + ' AND '.join(
+            f'_.{stolpec} LIKE :{stolpec}' if isinstance(kwargs[stolpec], Vzorec)
+            else f'_.{stolpec} = :{stolpec}' for stolpec in kwargs)
+
+    @staticmethod
+    def _parametri(kwargs):
+        """
+        Vrni slovar parametrov poizvedbe za podane pogoje.
+        """
+        return {stolpec: str(vrednost) if isinstance(vrednost, Vzorec)
+                else vrednost for stolpec, vrednost in kwargs.items()}
+
+    @classmethod
+    def seznam(cls, /, dodatni_stolpci=(), uredi=None, omejitev=None,
+               predpomni=None, rok=None, skupina=None, na_skupino=1, **kwargs):
+        """
+        Vračaj objekte, ki ustrezajo navedenim pogojem.
 
-    @staticmethod
-    def _stolpec_za_urejanje(stolpec):
-        if isinstance(stolpec, Padajoce):
-            return str(stolpec)
-        if isinstance(stolpec, str):
-            stolpec = (stolpec, )
-        *predpone, stolpec = stolpec
-        return f"{''.join(f'{s}_' for s in predpone)}_.{stolpec}"
+        Če je nastavljen parameter `predpomni`
+        (privzeto nastavitev razreda), se rezultat poizvedbe
+        prebere iz predpomnilnika oziroma shrani vanj.
+        Če je podan `rok`, se poizvedba prekine po toliko sekundah;
+        v tem primeru se vse vrstice preberejo že ob prvem objektu,
+        tako da rok ne velja med obdelavo vrnjenih objektov.
+        Če je podan stolpec `skupina` (lahko tudi stolpec pridružene tabele),
+        se vrne le prvih `na_skupino` objektov glede na `uredi`
+        za vsako vrednost tega stolpca, urejenih po skupinah.
+        """
+        vir, where = cls._vir(kwargs)
+        yield from cls._seznam(vir, where, cls._parametri(kwargs), dodatni_stolpci,
+                               uredi, omejitev, predpomni, rok, skupina, na_skupino)
 
     @classmethod
-    def seznam(cls, /, dodatni_stolpci=(), uredi=None, omejitev=None, **kwargs):
+    def _seznam(cls, vir, where, parametri, dodatni_stolpci=(), uredi=None,
+                omejitev=None, predpomni=None, rok=None, skupina=None, na_skupino=1):
         """
-        Vračaj objekte, ki ustrezajo navedenim pogojem.
+        Vračaj objekte iz podanega vira vrstic, ki ustrezajo določilu WHERE.
+
+        Prvi objekti v vsaki skupini se izberejo
+        z oštevilčenjem vrstic znotraj skupin (ROW_NUMBER).
+        Predpomnijo se le poizvedbe izven transakcij, ki berejo iz glavne baze,
+        ne pa s posnetka ali replike, saj njihovo stanje ne ustreza generacijam tabel.
         """
         polja, join = cls._polja(dodatni_stolpci)
         preslikava = {(tabela, f): f"{tabela}.{f.name}"
                       for tabela, p in polja.items() for f in p}
         stolpci = list(preslikava.values())
-        if kwargs:
-            where = f"WHERE {' AND '.join(
-                f'_.{stolpec} LIKE :{stolpec}' if isinstance(kwargs[stolpec], Vzorec)
-                else f'_.{stolpec} = :{stolpec}' for stolpec in kwargs)}"
-        else:
-            where = ""
-        if uredi is None:
-            uredi = cls.UREDI
-        if uredi:
-            orderby = f"ORDER BY {', '.join(
-                f"{Tabela._stolpec_za_urejanje(stolpec)}" for stolpec in uredi)}"
-        else:
-            orderby = ""
         if omejitev:
             limit = "LIMIT :_omejitev"
-            kwargs['_omejitev'] = omejitev
+            parametri['_omejitev'] = omejitev
         else:
             limit = ""
-        sql = f"""
-          SELECT {', '.join(stolpci)}
-            FROM {cls._ime_tabele()} AS _
-           {'\n'.join(f"LEFT JOIN {ime_tabele} AS {tabela} ON {stolpec1} = {stolpec2}"
-                      for ime_tabele, tabela, stolpec1, stolpec2 in join)}
-           {where}
-           {orderby}
-           {limit};
-        """
-        with Kazalec() as cur:
-            cur.execute(sql, {stolpec: str(vrednost) if isinstance(vrednost, Vzorec)
-                              else vrednost for stolpec, vrednost in kwargs.items()})
+        if skupina is None:
+            sql = f"""
+              SELECT {', '.join(stolpci)}
+                FROM {vir} AS _
+               {cls._pridruzitve(join)}
+               {where}
+               {cls._sql_uredi(uredi)}
+               {limit};
+            """
+        else:
+            izraz = cls._stolpec_za_urejanje(skupina)
+            parametri['_na_skupino'] = na_skupino
+            sql = f"""
+              SELECT {', '.join(f'"{stolpec}"' for stolpec in stolpci)}
+                FROM (
+                  SELECT {', '.join(f'{stolpec} AS "{stolpec}"' for stolpec in stolpci)},
+                         {izraz} AS _skupina,
+                         ROW_NUMBER() OVER (PARTITION BY {izraz}
+                                            {cls._sql_uredi(uredi)}) AS _mesto
+                    FROM {vir} AS _
+                   {cls._pridruzitve(join)}
+                   {where}
+                )
+               WHERE _mesto <= :_na_skupino
+               ORDER BY _skupina, _mesto
+               {limit};
+            """
+        branje = cls.RAZDELITEV is None
+        if predpomni is None:
+            predpomni = cls.PREDPOMNI
+        if predpomni and Transakcija.globina() == 0 \
+                and not (branje and vir_branja is not None):
+            kljuc = repr((sql, sorted(parametri.items())))
+            tabele = (*cls._odvisne_tabele(), *sorted({t for t, *_ in join}))
+            trajni = trajni_predpomnilnik if branje else None
+            if trajni is not None and not trajni.spremlja(tabele):
+                trajni = None
+            kljuc_pomnilnika = kljuc
+            if trajni is not None:
+                trajna_generacija = trajni.generacija(tabele)
+                kljuc_pomnilnika = trajni.kljuc_pomnilnika(kljuc, trajna_generacija)
+            vrstice = predpomnilnik.preberi(kljuc_pomnilnika)
+            if vrstice is None:
+                generacija = predpomnilnik.generacija(tabele)
+                if trajni is not None:
+                    vrstice = trajni.preberi(kljuc, trajna_generacija)
+                if vrstice is None:
+                    with Kazalec(branje=branje, rok=rok) as cur:
+                        cur.execute(sql, parametri)
+                        vrstice = cur.fetchall()
+                    if trajni is not None:
+                        trajni.shrani(kljuc, tabele, trajna_generacija, vrstice)
+                predpomnilnik.shrani(kljuc_pomnilnika, tabele, generacija, vrstice)
+            yield from (cls._objekt(dict(zip(stolpci, vrstica)), polja, preslikava)
+                        for vrstica in vrstice)
+            return
+        if rok is not None:
+            with Kazalec(branje=branje, rok=rok) as cur:
+                cur.execute(sql, parametri)
+                vrstice = cur.fetchall()
+            yield from (cls._objekt(dict(zip(stolpci, vrstica)), polja, preslikava)
+                        for vrstica in vrstice)
+            return
+        with Kazalec(branje=branje) as cur:
+            cur.execute(sql, parametri)
             yield from (cls._objekt(dict(zip(stolpci, vrstica)), polja, preslikava)
                         for vrstica in cur)
 
+    @classmethod
+    def _polje_za_stolpec(cls, stolpec):
+        """
+        Vrni polje, ki ustreza podanemu stolpcu.
+
+        Stolpec je lahko podan kot zaporedje imen, ki vodi do stolpca pridružene tabele.
+        """
+        if isinstance(stolpec, str):
+            stolpec = (stolpec, )
+        razred = cls
+        for ime in stolpec:
+            f, = (f for f in fields(razred) if f.name == ime)
+            razred = f.type
+        return f
+
+    @classmethod
+    def stolpci(cls, /, *stolpci, velikost=1000, rok=None, **kwargs):
+        """
+        Vrni slovar s tabelami vrednosti podanih stolpcev
+        za vrstice, ki ustrezajo navedenim pogojem.
+
+        Stolpci so podani z imeni ali z zaporedji imen za stolpce pridruženih tabel
+        (npr. `('film', 'leto')`), ki so tudi ključi vrnjenega slovarja.
+        Če stolpci niso podani, se vrnejo vsi shranjeni stolpci tabele.
+        Vrstice se berejo iz kazalca po kosih velikosti `velikost`.
+
+        Če je na voljo NumPy, so vrednosti tipizirane tabele NumPy,
+        sicer pa tabele `array.array` (za nize in bajte seznami).
+        Manjkajoče realne vrednosti (NULL ali prazni nizi, ki jih pusti uvoz iz CSV)
+        so predstavljene z NaN,
+        manjkajoče cele in logične vrednosti pa z masko (`numpy.ma`)
+        oziroma z NaN v realni tabeli, če NumPy ni na voljo.
+        Če je podan `rok`, se poizvedba prekine po toliko sekundah.
+        """
+        numpy = _numpy()
+        if not stolpci:
+            stolpci = [f.name for f in fields(cls) if f.metadata['shrani']]
+        tipi = [cls._osnovni_tip(cls._polje_za_stolpec(stolpec)) for stolpec in stolpci]
+        _, join = cls._polja()
+        vir, where = cls._vir(kwargs)
+        sql = f"""
+          SELECT {', '.join(cls._stolpec_za_urejanje(stolpec) for stolpec in stolpci)}
+            FROM {vir} AS _
+           {cls._pridruzitve(join)}
+           {where};
+        """
+        if numpy is None:
+            tabele = [array(TIPI_ARRAY[tip]) if tip in TIPI_ARRAY else []
+                      for tip in tipi]
+        else:
+            tabele = [[] for tip in tipi]
+            maske = [[] for tip in tipi]
+        with Kazalec(branje=cls.RAZDELITEV is None, rok=rok) as cur:
+            cur.execute(sql, cls._parametri(kwargs))
+            while vrstice := cur.fetchmany(velikost):
+                for i, (tip, vrednosti) in enumerate(zip(tipi, zip(*vrstice))):
+                    if tip in TIPI_ARRAY:
+                        vrednosti = [None if v == '' else v for v in vrednosti]
+                    if numpy is None:
+                        tabele[i] = _dodaj_v_array(tabele[i], vrednosti)
+                    elif tip is float:
+                        tabele[i].append(numpy.array(vrednosti, dtype=TIPI_NUMPY[tip]))
+                    elif tip in TIPI_NUMPY:
+                        maske[i].append(numpy.fromiter((v is None for v in vrednosti),
+                                                       'bool', len(vrednosti)))
+                        tabele[i].append(numpy.fromiter((0 if v is None else v
+                                                         for v in vrednosti),
+                                                        TIPI_NUMPY[tip], len(vrednosti)))
+                    else:
+                        tabele[i].append(numpy.array(vrednosti, dtype=object))
+        if numpy is not None:
+            for i, tip in enumerate(tipi):
+                tabele[i] = numpy.concatenate(tabele[i]) if tabele[i] \
+                    else numpy.array([], dtype=TIPI_NUMPY.get(tip, object))
+                if maske[i]:
+                    maska = numpy.concatenate(maske[i])
+                    if maska.any():
+                        tabele[i] = numpy.ma.MaskedArray(tabele[i], mask=maska)
+        return dict(zip(stolpci, tabele))
+
 
 class Entiteta(Tabela):
     """
@@ -394,17 +2666,69 @@ class Entiteta(Tabela):
         return getattr(self, self.IME) if self \
             else f"<entiteta tipa {self.__class__}>"
 
-    def __init_subclass__(cls, /, kljuc='id', **kwargs):
+    NULL = _ObPrviUporabi(lambda cls: cls())
+
+    def __init_subclass__(cls, /, kljuc='id', lestvice=[], **kwargs):
         """
         Inicializacija podrazreda.
 
-        Pripravi prazen objekt.
+        Pripravi materializirane lestvice.
+        Prazen objekt `NULL` se ustvari ob prvi uporabi.
         """
         super().__init_subclass__(dodaj=True, **kwargs)
         for f in fields(cls):
             if f.name == kljuc:
                 cls.KLJUC = f
-        cls.NULL = cls()
+        cls.ODNOSI = {}
+        cls.LESTVICE = {}
+        for lestvica in lestvice:
+            lestvica.razred = cls
+            cls.LESTVICE[lestvica.skupina] = lestvica
+
+    @classmethod
+    def _ustvari_pomozne_objekte(cls, cur=None):
+        """
+        Ustvari pomožne objekte tabele, ki še ne obstajajo,
+        in materializirane lestvice.
+        """
+        with Kazalec(cur) as cur:
+            super()._ustvari_pomozne_objekte(cur=cur)
+            for lestvica in cls.LESTVICE.values():
+                lestvica.ustvari(cur=cur)
+
+    @classmethod
+    def _pomozni_objekti(cls):
+        """
+        Vrni množico imen pomožnih objektov tabele,
+        ki jih preverja načrt migracije.
+        """
+        return super()._pomozni_objekti().union(
+            *(lestvica.objekti() for lestvica in cls.LESTVICE.values()))
+
+    @classmethod
+    def _predpone_pomoznih_objektov(cls):
+        """
+        Vrni predpone imen pomožnih objektov tabele,
+        ki jih načrt migracije odstrani, če niso več potrebni.
+        """
+        return (*super()._predpone_pomoznih_objektov(), f"{cls._ime_tabele()}_lestvica_")
+
+    @classmethod
+    def pobrisi_tabelo(cls, cur=None):
+        """
+        Pobriši tabelo in njene materializirane lestvice.
+        """
+        with Kazalec(cur) as cur:
+            for lestvica in cls.LESTVICE.values():
+                lestvica.pobrisi(cur=cur)
+            super().pobrisi_tabelo(cur=cur)
+
+    @classmethod
+    def lestvica(cls, skupina, vrednost=None, n=None, predpomni=None):
+        """
+        Vračaj najboljše objekte iz materializirane lestvice za podani stolpec skupine.
+        """
+        yield from cls.LESTVICE[skupina].seznam(vrednost, n, predpomni)
 
     @classmethod
     def _kljuc(cls):
@@ -432,28 +2756,98 @@ class Entiteta(Tabela):
             setattr(self, self.KLJUC.name, vrednost)
 
     @classmethod
-    def z_id(cls, kljuc):
+    def z_id(cls, kljuc, predpomni=None):
         """
         Vrni objekt z navedenim ključem.
         Če takega objekta ni, sproži napako.
         """
         try:
-            objekt, = cls.seznam(**{cls.KLJUC.name: kljuc})
+            objekt, = cls.seznam(predpomni=predpomni, **{cls.KLJUC.name: kljuc})
             return objekt
         except ValueError:
             raise ValueError(f"Objekt s ključem {kljuc} ne obstaja!")
 
+    @classmethod
+    def z_idji(cls, kljuci, predpomni=None):
+        """
+        Vrni seznam objektov z navedenimi ključi v podanem vrstnem redu,
+        prebranih z eno samo poizvedbo.
+        Če kakšnega objekta ni, sproži napako.
+        """
+        kljuci = list(kljuci)
+        parametri = {f"_kljuc_{i}": kljuc for i, kljuc in enumerate(dict.fromkeys(kljuci))}
+        if not parametri:
+            return []
+        vir, _ = cls._vir({})
+        where = f"WHERE _.{cls.KLJUC.name} IN ({', '.join(f':{p}' for p in parametri)})"
+        objekti = {getattr(objekt, cls.KLJUC.name): objekt for objekt
+                   in cls._seznam(vir, where, parametri, predpomni=predpomni)}
+        for kljuc in kljuci:
+            if kljuc not in objekti:
+                raise ValueError(f"Objekt s ključem {kljuc} ne obstaja!")
+        return [objekti[kljuc] for kljuc in kljuci]
+
+    @classmethod
+    def z_odnosi(cls, kljuc, /, **odnosi):
+        """
+        Vrni objekt z navedenim ključem skupaj s seznami njegovih odnosov,
+        prebranimi z eno samo poizvedbo.
+
+        Odnosi so podani z imeni metod za odnose (npr. `vloga_film`),
+        vrednosti pa so slovarji z morebitnimi parametri
+        `dodatni_stolpci`, `uredi` in `omejitev` kot pri metodi `seznam`.
+        Vrne par z objektom in slovarjem, ki imenom odnosov priredi sezname objektov.
+        Če takega objekta ni, sproži napako.
+        """
+        parametri = {cls.KLJUC.name: kljuc}
+        vir, where = cls._vir(parametri)
+        polja, join = cls._polja()
+        preslikava = {(tabela, f): f"{tabela}.{f.name}"
+                      for tabela, p in polja.items() for f in p}
+        stolpci = list(preslikava.values())
+        podpoizvedbe = {}
+        branje = True
+        for ime, moznosti in odnosi.items():
+            razred, stolpec = cls.ODNOSI[ime]
+            moznosti = dict(moznosti)
+            omejitev = moznosti.pop('omejitev', None)
+            limit = ""
+            if omejitev:
+                limit = f"LIMIT :_omejitev_{ime}"
+                parametri[f"_omejitev_{ime}"] = omejitev
+            parametri[stolpec] = kljuc
+            podpoizvedbe[ime] = razred._sql_json(*razred._vir({stolpec: kljuc}),
+                                                 limit=limit, **moznosti)
+            branje = branje and razred.RAZDELITEV is None
+        sql = f"""
+          SELECT {', '.join([*stolpci, *(f"{podpoizvedba} AS {ime}"
+                                         for ime, (podpoizvedba, _) in podpoizvedbe.items())])}
+            FROM {vir} AS _
+           {cls._pridruzitve(join)}
+           {where};
+        """
+        with Kazalec(branje=branje) as cur:
+            cur.execute(sql, parametri)
+            vrstica = cur.fetchone()
+        if vrstica is None:
+            raise ValueError(f"Objekt s ključem {kljuc} ne obstaja!")
+        objekt = cls._objekt(dict(zip(stolpci, vrstica)), polja, preslikava)
+        return objekt, {ime: sestavi(vrednost) for (ime, (_, sestavi)), vrednost
+                        in zip(podpoizvedbe.items(), vrstica[len(stolpci):])}
+
 
 class Odnos(Tabela):
-    def __init_subclass__(cls, /, **kwargs):
+    def __init_subclass__(cls, /, razdelitev=None, **kwargs):
         """
         Inicializacija podrazreda.
         """
         super().__init_subclass__(dodaj=True, **kwargs)
+        cls.razdeli(razdelitev)
         for f in fields(cls):
             if issubclass(f.type, Entiteta):
                 setattr(f.type, f'{cls._ime_tabele()}_{f.name}',
                         cls._metoda_za_odnose(f.name))
+                f.type.ODNOSI[f'{cls._ime_tabele()}_{f.name}'] = (cls, f.name)
 
     @classmethod
     def _metoda_za_odnose(cls, stolpec):
@@ -475,6 +2869,82 @@ class Odnos(Tabela):
                     (f.metadata['kljuc'] is None and issubclass(f.type, Entiteta)):
                 yield f
 
+    @classmethod
+    def razdeli(cls, razdelitev):
+        """
+        Razdeli tabelo na dele v ločenih datotekah baze.
+
+        Stolpec, po katerem se razdeli, mora biti del ključa,
+        da je vsaka vrstica vedno v istem delu.
+        Deli nimajo tujih ključev, saj ti ne morejo kazati v drugo datoteko.
+        Če je razdelitev `None`, tabela ni razdeljena.
+        Tabelo je po spremembi razdelitve treba ponovno ustvariti.
+        """
+        if cls.RAZDELITEV is not None:
+            cls.RAZDELITEV.odklopi()
+        if razdelitev is not None:
+            assert razdelitev.stolpec in (f.name for f in cls._kljuc()), \
+                "Tabelo je mogoče razdeliti le po stolpcu ključa"
+            razdelitev.razred = cls
+            razdelitev.prikljuci()
+        cls.RAZDELITEV = razdelitev
+
+    @classmethod
+    def ustvari_tabelo(cls, cur=None):
+        """
+        Ustvari tabelo.
+
+        Če je tabela razdeljena, ustvari vse njene dele.
+        """
+        if cls.RAZDELITEV is None:
+            return super().ustvari_tabelo(cur=cur)
+        assert not cls.SPREMEMBE, "Beleženje sprememb razdeljenih tabel ni podprto"
+        with Kazalec(cur) as cur:
+            for tabela in cls.RAZDELITEV.tabele():
+                cur.execute(cls._sql_ustvari(tabela, reference=False))
+
+    @classmethod
+    def pobrisi_tabelo(cls, cur=None):
+        """
+        Pobriši tabelo.
+
+        Če je tabela razdeljena, pobriše tudi vse njene dele.
+        """
+        super().pobrisi_tabelo(cur=cur)
+        if cls.RAZDELITEV is not None:
+            with Kazalec(cur) as cur:
+                for tabela in cls.RAZDELITEV.tabele():
+                    cur.execute(f"DROP TABLE IF EXISTS {tabela};")
+
+    @classmethod
+    def _tabela_za(cls, vrednosti):
+        """
+        Vrni ime tabele, v kateri je vrstica s podanimi vrednostmi stolpcev.
+
+        Če je tabela razdeljena, vrne ime ustreznega dela.
+        """
+        if cls.RAZDELITEV is None:
+            return super()._tabela_za(vrednosti)
+        return cls.RAZDELITEV.tabele()[cls.RAZDELITEV.del_za(vrednosti[cls.RAZDELITEV.stolpec])]
+
+    @classmethod
+    def _vir(cls, kwargs):
+        """
+        Vrni vir vrstic za določilo FROM in določilo WHERE za podane pogoje.
+
+        Če je tabela razdeljena in je vrednost stolpca razdelitve znana,
+        se bere le iz ustreznega dela, sicer pa iz unije poizvedb po vseh delih.
+        """
+        if cls.RAZDELITEV is None:
+            return super()._vir(kwargs)
+        tabele = cls.RAZDELITEV.tabele()
+        deli = cls.RAZDELITEV.deli(kwargs)
+        where = cls._pogoji(kwargs)
+        if len(deli) == 1:
+            return tabele[deli[0]], where
+        return "(" + " UNION ALL ".join(f"SELECT * FROM {tabele[i]} AS _ {where}"
+                                        for i in deli) + ")", ""
+
     def _v_bazi(self, v_bazi):
         """
         Vrni, ali je objekt (potencialno) že v bazi.
@@ -491,13 +2961,300 @@ class Odnos(Tabela):
         """
         pass
 
+class Pogled(Tabela):
+    """
+    Nadrazred za poglede, definirane s poizvedbo v atributu `POIZVEDBA`.
+
+    Stolpci, ki jih vrne poizvedba, se po vrsti priredijo poljem razreda.
+    Pogled je v bazi ustvarjen kot pogled (VIEW)
+    ali kot materializirana tabela, ki se osveži z metodo `osvezi`.
+    """
+
+    POIZVEDBA = None
+
+    def __init_subclass__(cls, /, materializiran=False, odvisnosti=[],
+                          prozilci=False, **kwargs):
+        """
+        Inicializacija podrazreda.
+
+        Če je nastavljen parameter `materializiran`, se rezultat poizvedbe
+        shrani v tabelo.
+        Če je nastavljen tudi parameter `prozilci`, prožilci na tabelah
+        iz seznama `odvisnosti` ob vsaki spremembi označijo pogled kot zastarel,
+        pogled pa se osveži ob naslednjem branju.
+        """
+        super().__init_subclass__(dodaj=True, **kwargs)
+        assert materializiran or not prozilci, \
+            "Prožilci za osveževanje so mogoči le pri materializiranih pogledih"
+        cls.MATERIALIZIRAN = materializiran
+        cls.ODVISNOSTI = odvisnosti
+        cls.PROZILCI = prozilci
+
+    @classmethod
+    def _kljuc(cls):
+        """
+        Vračaj stolpce, ki sestavljajo ključ.
+        """
+        for f in fields(cls):
+            if f.metadata['kljuc'] or \
+                    (f.metadata['kljuc'] is None and issubclass(f.type, Entiteta)):
+                yield f
+
+    @classmethod
+    def _stolpci(cls):
+        """
+        Vrni seznam stolpcev pogleda, ločenih z vejicami.
+        """
+        return ', '.join(f.name for f in fields(cls))
+
+    @classmethod
+    def ustvari_tabelo(cls, cur=None):
+        """
+        Ustvari pogled oziroma materializirano tabelo
+        s prožilci za označevanje zastarelosti.
+        """
+        tabela = cls._ime_tabele()
+        with Kazalec(cur) as cur:
+            if not cls.MATERIALIZIRAN:
+                cur.execute(f"CREATE VIEW {tabela} ({cls._stolpci()}) AS {cls.POIZVEDBA};")
+                return
+            cur.execute(cls._sql_ustvari(tabela, reference=False))
+            cls._ustvari_pomozne_objekte(cur=cur)
+            cls.osvezi(cur=cur)
+
+    @classmethod
+    def _ustvari_pomozne_objekte(cls, cur=None):
+        """
+        Ustvari prožilce materializirane tabele, ki še ne obstajajo.
+
+        Običajni pogledi pomožnih objektov nimajo.
+        """
+        if not cls.MATERIALIZIRAN:
+            return
+        tabela = cls._ime_tabele()
+        with Kazalec(cur) as cur:
+            super()._ustvari_pomozne_objekte(cur=cur)
+            if cls.PROZILCI:
+                cur.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {ZASTARELI} (
+                        pogled TEXT PRIMARY KEY
+                    );
+                """)
+                for odvisnost in cls.ODVISNOSTI:
+                    for operacija in ('INSERT', 'UPDATE', 'DELETE'):
+                        cur.execute(f"""
+                            CREATE TRIGGER IF NOT EXISTS
+                                {tabela}_{odvisnost._ime_tabele()}_{operacija.lower()}
+                            AFTER {operacija} ON {odvisnost._ime_tabele()}
+                            BEGIN
+                                INSERT OR IGNORE INTO {ZASTARELI} (pogled) VALUES ('{tabela}');
+                            END;
+                        """)
+
+    @classmethod
+    def _pomozni_objekti(cls):
+        """
+        Vrni množico imen pomožnih objektov materializirane tabele,
+        ki jih preverja načrt migracije.
+        """
+        if not cls.MATERIALIZIRAN:
+            return set()
+        tabela = cls._ime_tabele()
+        objekti = super()._pomozni_objekti()
+        if cls.PROZILCI:
+            objekti |= {f"{tabela}_{odvisnost._ime_tabele()}_{operacija}"
+                        for odvisnost in cls.ODVISNOSTI
+                        for operacija in ('insert', 'update', 'delete')}
+        return objekti
+
+    @classmethod
+    def _predpone_pomoznih_objektov(cls):
+        """
+        Vrni predpone imen pomožnih objektov materializirane tabele,
+        ki jih načrt migracije odstrani, če niso več potrebni.
+        """
+        if not cls.MATERIALIZIRAN:
+            return ()
+        tabela = cls._ime_tabele()
+        return (*super()._predpone_pomoznih_objektov(),
+                *(f"{tabela}_{odvisnost._ime_tabele()}_" for odvisnost in cls.ODVISNOSTI))
+
+    @classmethod
+    def pobrisi_tabelo(cls, cur=None):
+        """
+        Pobriši pogled oziroma materializirano tabelo in njene prožilce.
+        """
+        tabela = cls._ime_tabele()
+        with Kazalec(cur) as cur:
+            if not cls.MATERIALIZIRAN:
+                cur.execute(f"DROP VIEW IF EXISTS {tabela};")
+                return
+            for odvisnost in cls.ODVISNOSTI:
+                for operacija in ('insert', 'update', 'delete'):
+                    cur.execute(f"""
+                        DROP TRIGGER IF EXISTS
+                            {tabela}_{odvisnost._ime_tabele()}_{operacija};
+                    """)
+            cur.execute(f"DROP TABLE IF EXISTS {tabela};")
+
+    @classmethod
+    def osvezi(cls, cur=None):
+        """
+        Na novo izračunaj vsebino materializiranega pogleda.
+        """
+        tabela = cls._ime_tabele()
+        with Kazalec(cur) as cur:
+            with Transakcija():
+                cur.execute(f"DELETE FROM {tabela};")
+                cur.execute(f"INSERT INTO {tabela} ({cls._stolpci()}) {cls.POIZVEDBA};")
+                if cls.PROZILCI:
+                    cur.execute(f"DELETE FROM {ZASTARELI} WHERE pogled = :pogled;",
+                                dict(pogled=tabela))
+        cls._razveljavi()
+
+    @classmethod
+    def zastarel(cls):
+        """
+        Vrni, ali je materializirani pogled s prožilci označen kot zastarel.
+        """
+        if not cls.PROZILCI:
+            return False
+        with Kazalec() as cur:
+            cur.execute(f"SELECT 1 FROM {ZASTARELI} WHERE pogled = :pogled;",
+                        dict(pogled=cls._ime_tabele()))
+            return cur.fetchone() is not None
+
+    @classmethod
+    def osvezi_zastarele(cls):
+        """
+        Osveži vse zastarele materializirane poglede.
+        """
+        for t in Tabela.TABELE:
+            if issubclass(t, Pogled) and t.zastarel():
+                t.osvezi()
+
+    @classmethod
+    def _vir(cls, kwargs):
+        """
+        Vrni vir vrstic za določilo FROM in določilo WHERE za podane pogoje.
+
+        Zastarel materializirani pogled se pred tem osveži,
+        razen v nitih bazena, kjer je bil osvežen že pred oddajo poizvedbe.
+        """
+        if not getattr(Bazen.LOKALNO, 'aktivna', False) and cls.zastarel():
+            cls.osvezi()
+        return super()._vir(kwargs)
+
+    @classmethod
+    def _odvisne_tabele(cls):
+        """
+        Vrni imena tabel, ob spremembi katerih se spremeni vsebina pogleda.
+
+        Vsebina materializiranega pogleda brez prožilcev se spremeni le ob osvežitvi.
+        """
+        if cls.MATERIALIZIRAN and not cls.PROZILCI:
+            return super()._odvisne_tabele()
+        return (cls._ime_tabele(), *(odvisnost._ime_tabele() for odvisnost in cls.ODVISNOSTI))
+
+    @classmethod
+    def uvozi_podatke(cls, cur=None):
+        """
+        Osveži materializirani pogled po uvozu podatkov v odvisne tabele.
+        """
+        if cls.MATERIALIZIRAN:
+            cls.osvezi(cur=cur)
+
+    def _v_bazi(self, v_bazi):
+        """
+        Vrni, ali je objekt (potencialno) že v bazi.
+
+        Vedno vrne True.
+        """
+        return True
+
+    def dodaj(self, transakcija=True, /, **kwargs):
+        """
+        Pogleda ni mogoče spreminjati.
+        """
+        raise ValueError("Pogleda ni mogoče spreminjati!")
+
+    def posodobi(self, transakcija=True, /, **kwargs):
+        """
+        Pogleda ni mogoče spreminjati.
+        """
+        raise ValueError("Pogleda ni mogoče spreminjati!")
+
+    def izbrisi(self, transakcija=True):
+        """
+        Pogleda ni mogoče spreminjati.
+        """
+        raise ValueError("Pogleda ni mogoče spreminjati!")
+
+
+def _ustvari_tabelo_generacij(cur=None):
+    """
+    Ustvari tabelo generacij tabel, če še ne obstaja.
+    """
+    with Kazalec(cur) as cur:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {GENERACIJE} (
+                tabela TEXT PRIMARY KEY,
+                generacija INTEGER NOT NULL
+            );
+        """)
+
+
+def _sledenje_generacijam(cur=None):
+    """
+    Vrni, ali se beležijo generacije tabel.
+
+    Generacije se beležijo, če je v uporabi trajni predpomnilnik
+    ali če tabela generacij v bazi že obstaja.
+    """
+    if trajni_predpomnilnik is not None:
+        return True
+    return _obstaja_tabela(GENERACIJE, cur=cur)
+
+
+def _obstaja_tabela(tabela, cur=None):
+    """
+    Vrni, ali v glavni bazi obstaja tabela s podanim imenom.
+    """
+    with Kazalec(cur) as cur:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;",
+                    [tabela])
+        return cur.fetchone() is not None
+
+
+def _ustvari_pomozne_tabele(cur=None):
+    """
+    Ustvari pomožne tabele ORM, če še ne obstajajo.
+
+    Tabela generacij se ustvari le, če je v uporabi trajni predpomnilnik.
+    """
+    with Kazalec(cur) as cur:
+        if trajni_predpomnilnik is not None:
+            _ustvari_tabelo_generacij(cur=cur)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ZGOSTITVE} (
+                tabela TEXT,
+                identiteta TEXT,
+                zgostitev TEXT NOT NULL,
+                kljuc TEXT NOT NULL,
+                PRIMARY KEY (tabela, identiteta)
+            ) WITHOUT ROWID;
+        """)
+
+
 def ustvari_tabele(cur=None):
     """
     Ustvari vse tabele.
     """
     with Kazalec(cur) as cur:
+        _ustvari_pomozne_tabele(cur=cur)
         for t in Tabela.TABELE:
             t.ustvari_tabelo(cur=cur)
+    predpomnilnik.pocisti()
 
 
 def pobrisi_tabele(cur=None):
@@ -507,6 +3264,11 @@ def pobrisi_tabele(cur=None):
     with Kazalec(cur) as cur:
         for t in reversed(Tabela.TABELE):
             t.pobrisi_tabelo(cur=cur)
+        cur.execute(f"DROP TABLE IF EXISTS {ZGOSTITVE};")
+        cur.execute(f"DROP TABLE IF EXISTS {ZASTARELI};")
+        cur.execute(f"DROP TABLE IF EXISTS {GENERACIJE};")
+        cur.execute(f"DROP TABLE IF EXISTS {DNEVNIK};")
+    predpomnilnik.pocisti()
 
 
 def uvozi_podatke(cur=None):
@@ -518,6 +3280,86 @@ def uvozi_podatke(cur=None):
             t.uvozi_podatke(cur=cur)
 
 
+def spremembe(od=0, omejitev=None):
+    """
+    Vračaj spremembe z zaporedno številko, večjo od `od`,
+    v vrstnem redu nastanka.
+
+    Operacije so označene z 'I' (dodajanje), 'U' (posodobitev) in 'D' (brisanje).
+    Če dnevnik sprememb ne obstaja, ne vrne ničesar.
+    """
+    with Kazalec() as cur:
+        if not _obstaja_tabela(DNEVNIK, cur=cur):
+            return
+        cur.execute(f"""
+            SELECT zaporedje, tabela, kljuc, operacija
+              FROM {DNEVNIK}
+             WHERE zaporedje > :od
+             ORDER BY zaporedje
+             {'LIMIT :omejitev' if omejitev else ''};
+        """, dict(od=od, omejitev=omejitev))
+        for zaporedje, tabela, kljuc, operacija in cur:
+            yield Sprememba(zaporedje, tabela, tuple(json.loads(kljuc)), operacija)
+
+
+def zadnja_sprememba():
+    """
+    Vrni zaporedno številko zadnje zabeležene spremembe.
+
+    Številka se ne zmanjša, tudi če je bil dnevnik medtem strnjen.
+    Če dnevnik sprememb ne obstaja, vrne 0.
+    """
+    with Kazalec() as cur:
+        if not _obstaja_tabela(DNEVNIK, cur=cur):
+            return 0
+        cur.execute(f"""
+            SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = '{DNEVNIK}';
+        """)
+        return cur.fetchone()[0]
+
+
+def strni_spremembe(do=None):
+    """
+    Strni dnevnik sprememb.
+
+    Za vsako vrstico ohrani le zadnjo spremembo.
+    Če je podana zaporedna številka `do`,
+    pobriše tudi vse spremembe do vključno te številke.
+    Če dnevnik sprememb ne obstaja, ne naredi ničesar.
+    """
+    with Kazalec() as cur:
+        if not _obstaja_tabela(DNEVNIK, cur=cur):
+            return
+        with Transakcija():
+            cur.execute(f"""
+                DELETE FROM {DNEVNIK}
+                 WHERE zaporedje NOT IN (
+                    SELECT MAX(zaporedje) FROM {DNEVNIK} GROUP BY tabela, kljuc
+                );
+            """)
+            if do is not None:
+                cur.execute(f"DELETE FROM {DNEVNIK} WHERE zaporedje <= :do;", dict(do=do))
+
+
+def sinhroniziraj(paket=1000):
+    """
+    Sinhroniziraj bazo z viri, ne da bi jo na novo ustvaril.
+
+    Izvedejo se le dodajanja, posodobitve in brisanja vrstic,
+    ki so se v virih spremenile od zadnjega uvoza ali sinhronizacije.
+    Vrne slovar, ki imenom tabel priredi števila
+    dodanih, posodobljenih in izbrisanih vrstic.
+    """
+    statistika = {}
+    ostale = {}
+    for t in Tabela.TABELE:
+        dodanih, posodobljenih, ostale[t] = t.sinhroniziraj_vir(paket)
+        statistika[t._ime_tabele()] = (dodanih, posodobljenih)
+    for t in reversed(Tabela.TABELE):
+        statistika[t._ime_tabele()] += (t.izbrisi_vrstice_vira(ostale[t], paket), )
+    return statistika
+
+
 def ustvari_bazo(pobrisi=False, cur=None):
     """
     Ustvari tabele in uvozi podatke.
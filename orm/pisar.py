@@ -0,0 +1,300 @@
+#
+#   Zaporedno pisanje v bazo iz ene niti
+#
+
+import os
+import queue
+import random
+import sqlite3 as dbapi
+import threading
+import time
+from concurrent.futures import Future
+from orm import conn, pot_baze
+
+
+def _zaklenjeno(napaka):
+    """
+    Vrni, ali je napaka posledica zaklenjene baze.
+    """
+    return isinstance(napaka, dbapi.OperationalError) and \
+        getattr(napaka, 'sqlite_errorcode', None) in (dbapi.SQLITE_BUSY, dbapi.SQLITE_LOCKED)
+
+
+class Pisar:
+    """
+    Nit, ki zaporedno izvaja pisanja, oddana iz poljubnih niti.
+
+    Pisanja se združujejo v transakcije z največ `paket` pisanji,
+    vsako pisanje pa se izvede v svoji shranjevalni točki,
+    tako da neuspešno pisanje ne razveljavi ostalih v isti transakciji.
+    Metode za oddajo pisanj vrnejo objekt `Future`,
+    katerega rezultat je ID zadnje vstavljene vrstice.
+    """
+
+    def __init__(self, paket=100, cakanje=5.0, poskusi=10, pavza=0.01,
+                 najvecja_pavza=1.0, vir=None):
+        """
+        Konstruktor pisarja za bazo na poti `vir` (privzeto glavna baza).
+
+        Povezava pisarja čaka na sprostitev baze, ki jo je zaklenil drug proces,
+        največ `cakanje` sekund.
+        Če je baza še vedno zaklenjena, se transakcija ponovi največ `poskusi`-krat,
+        pri čemer se pred `n`-to ponovitvijo počaka naključen čas
+        med 0 in `pavza` * 2^`n` sekund, a ne več kot `najvecja_pavza` sekund.
+        """
+        self.vir = pot_baze() if vir is None else vir
+        self.baze = [(ime, pot) for _, ime, pot in conn.execute("PRAGMA database_list;")
+                     if ime not in ('main', 'temp')] if vir is None else []
+        self.paket = paket
+        self.cakanje = cakanje
+        self.poskusi = poskusi
+        self.pavza = pavza
+        self.najvecja_pavza = najvecja_pavza
+        self.vrsta = queue.Queue()
+        self.nit = None
+        self.zapisov = 0
+        self.transakcij = 0
+        self.ponovitev = 0
+
+    def __enter__(self):
+        """
+        Vstop v kontekst z `with`.
+
+        Zažene nit pisarja in ga vrne.
+        """
+        self.zazeni()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Izstop iz konteksta.
+
+        Počaka, da se izvedejo vsa oddana pisanja, in ustavi nit pisarja.
+        """
+        self.zaustavi()
+
+    def zazeni(self):
+        """
+        Zaženi nit pisarja.
+        """
+        self.nit = threading.Thread(target=self._pisi, daemon=True)
+        self.nit.start()
+
+    def zaustavi(self):
+        """
+        Izvedi vsa oddana pisanja in ustavi nit pisarja.
+
+        Če nit ni bila zagnana, ne naredi ničesar.
+        """
+        if self.nit is None:
+            return
+        self.vrsta.put(None)
+        self.nit.join()
+        self.nit = None
+
+    def izvedi(self, sql, parametri=(), razred=None, potem=None, napaka=None):
+        """
+        Oddaj pisanje s podano poizvedbo in parametri.
+
+        Po potrditvi transakcije se v niti pisarja pokliče funkcija `potem`
+        z ID-jem zadnje vstavljene vrstice in razveljavi predpomnilnik za `razred`.
+        Če pisanje krši omejitve, se sproži `ValueError` s sporočilom `napaka`.
+        """
+        prihodnost = Future()
+        self.vrsta.put((sql, parametri, razred, potem, napaka, prihodnost))
+        return prihodnost
+
+    def dodaj(self, objekt, /, **kwargs):
+        """
+        Oddaj dodajanje objekta v bazo.
+        """
+        assert objekt._v_bazi(False), "Objekt je že v bazi"
+        stolpci = [*objekt._stolpci_za_dodajanje(), *kwargs]
+
+        def potem(kljuc):
+            objekt._nastavi_kljuc(kljuc)
+            objekt._zapomni()
+
+        return self.izvedi(objekt._sql_dodaj(stolpci, objekt._tabela()),
+                           objekt._vrednosti(stolpci, kwargs), type(objekt), potem,
+                           "Dodajanje objekta ni bilo uspešno!")
+
+    def posodobi(self, objekt, /, **kwargs):
+        """
+        Oddaj posodobitev objekta v bazi.
+
+        Zapišejo se le spremenjeni stolpci in stolpci iz `kwargs`.
+        """
+        assert objekt._v_bazi(True), "Objekta še ni v bazi"
+        stolpci = [*objekt._spremenjeni_stolpci(kwargs), *kwargs]
+        if not stolpci:
+            prihodnost = Future()
+            prihodnost.set_result(None)
+            return prihodnost
+        return self.izvedi(objekt._sql_posodobi(stolpci, objekt._tabela()),
+                           objekt._vrednosti([*stolpci, *objekt._kljuci()], kwargs),
+                           type(objekt), lambda kljuc: objekt._zapomni(),
+                           "Posodabljanje objekta ni bilo uspešno!")
+
+    def izbrisi(self, objekt):
+        """
+        Oddaj brisanje objekta iz baze.
+        """
+        assert objekt._v_bazi(True), "Objekta še ni v bazi"
+
+        def potem(kljuc):
+            objekt._nastavi_kljuc(None)
+            objekt._posnetek = None
+
+        return self.izvedi(objekt._sql_izbrisi(objekt._tabela()),
+                           objekt._vrednosti(objekt._kljuci()), type(objekt), potem,
+                           "Brisanje objekta ni bilo uspešno!")
+
+    def _povezi(self):
+        """
+        Vrni povezavo pisarja z ročnim upravljanjem transakcij.
+        """
+        povezava = dbapi.connect(self.vir, timeout=self.cakanje, isolation_level=None)
+        povezava.execute("PRAGMA foreign_keys = ON;")
+        for ime, pot in self.baze:
+            povezava.execute(f"ATTACH DATABASE ? AS {ime};", [pot])
+        return povezava
+
+    def _pisi(self):
+        """
+        Izvajaj oddana pisanja, dokler pisar ni ustavljen.
+        """
+        povezava = self._povezi()
+        try:
+            konec = False
+            while not konec:
+                naloge = [self.vrsta.get()]
+                while len(naloge) < self.paket and naloge[-1] is not None:
+                    try:
+                        naloge.append(self.vrsta.get_nowait())
+                    except queue.Empty:
+                        break
+                if naloge[-1] is None:
+                    naloge.pop()
+                    konec = True
+                if naloge:
+                    self._izvedi_skupino(povezava, naloge)
+        finally:
+            povezava.close()
+
+    def _izvedi_skupino(self, povezava, naloge):
+        """
+        Izvedi skupino pisanj v eni transakciji.
+
+        Če je baza zaklenjena, se transakcija po naključni pavzi ponovi.
+        Napake v funkcijah `potem` in pri razveljavljanju predpomnilnika
+        se sporočijo prek prihodnosti ustreznega pisanja.
+        """
+        for poskus in range(self.poskusi):
+            try:
+                rezultati = self._transakcija(povezava, naloge)
+                break
+            except Exception as napaka:
+                if not _zaklenjeno(napaka) or poskus + 1 == self.poskusi:
+                    for *_, prihodnost in naloge:
+                        prihodnost.set_exception(napaka)
+                    return
+                self.ponovitev += 1
+                time.sleep(random.uniform(0, min(self.najvecja_pavza, self.pavza * 2 ** poskus)))
+        self.transakcij += 1
+        for (sql, parametri, razred, potem, _, prihodnost), (kljuc, napaka) \
+                in zip(naloge, rezultati):
+            if napaka is not None:
+                prihodnost.set_exception(napaka)
+                continue
+            self.zapisov += 1
+            try:
+                if potem is not None:
+                    potem(kljuc)
+                if razred is not None:
+                    razred._razveljavi()
+            except Exception as napaka:
+                prihodnost.set_exception(napaka)
+            else:
+                prihodnost.set_result(kljuc)
+
+    @staticmethod
+    def _transakcija(povezava, naloge):
+        """
+        Izvedi pisanja v transakciji in vrni seznam parov
+        z ID-jem zadnje vstavljene vrstice in morebitno napako za vsako pisanje.
+        """
+        rezultati = []
+        povezava.execute("BEGIN IMMEDIATE;")
+        try:
+            for sql, parametri, razred, potem, sporocilo, prihodnost in naloge:
+                povezava.execute("SAVEPOINT pisanje;")
+                try:
+                    cur = povezava.execute(sql, parametri)
+                    rezultati.append((cur.lastrowid, None))
+                except dbapi.Error as napaka:
+                    if _zaklenjeno(napaka):
+                        raise
+                    povezava.execute("ROLLBACK TO pisanje;")
+                    if isinstance(napaka, dbapi.IntegrityError) and sporocilo is not None:
+                        napaka = ValueError(sporocilo)
+                    rezultati.append((None, napaka))
+                povezava.execute("RELEASE pisanje;")
+            povezava.execute("COMMIT;")
+        except BaseException:
+            if povezava.in_transaction:
+                povezava.execute("ROLLBACK;")
+            raise
+        return rezultati
+
+
+def _obremeni(pisatelji, zapisov, pisi):
+    """
+    Vrni število zapisov na sekundo in število neuspešnih zapisov,
+    ko `pisatelji` niti vsaka zapiše `zapisov` filmov s funkcijo `pisi`.
+    """
+    from model import Film
+    napake = []
+
+    def pisatelj(i):
+        for j in range(zapisov):
+            try:
+                pisi(Film(naslov=f"Film {i}-{j}", dolzina=90, leto=2000, ocena=5))
+            except (dbapi.Error, ValueError) as napaka:
+                napake.append(napaka)
+
+    niti = [threading.Thread(target=pisatelj, args=(i, )) for i in range(pisatelji)]
+    zacetek = time.perf_counter()
+    for nit in niti:
+        nit.start()
+    for nit in niti:
+        nit.join()
+    return pisatelji * zapisov / (time.perf_counter() - zacetek), len(napake)
+
+
+if __name__ == '__main__':
+    kopija = 'filmi.pisar.sqlite'
+    baza = dbapi.connect(kopija)
+    conn.backup(baza)
+    baza.close()
+    lokalno = threading.local()
+
+    def neposredno(film):
+        if not hasattr(lokalno, 'povezava'):
+            lokalno.povezava = dbapi.connect(kopija, timeout=0.1)
+        stolpci = film._stolpci_za_dodajanje()
+        with lokalno.povezava:
+            lokalno.povezava.execute(film._sql_dodaj(stolpci), film._vrednosti(stolpci))
+
+    try:
+        for pisatelji in (1, 2, 4, 8, 16):
+            prepustnost, napake = _obremeni(pisatelji, 200, neposredno)
+            print(f"{pisatelji:2} pisateljev, neposredno: {prepustnost:8.0f} zapisov/s, "
+                  f"napak: {napake}")
+            with Pisar(vir=kopija) as pisar:
+                prepustnost, napake = _obremeni(pisatelji, 200,
+                                                lambda film: pisar.dodaj(film).result())
+            print(f"{pisatelji:2} pisateljev, s pisarjem: {prepustnost:8.0f} zapisov/s, "
+                  f"napak: {napake}, transakcij: {pisar.transakcij}")
+    finally:
+        os.remove(kopija)
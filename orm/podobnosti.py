@@ -0,0 +1,126 @@
+#
+#   Izračun podobnosti filmov po žanrih in zasedbi
+#
+
+import numpy
+import time
+from model import Film, Pripada, Vloga, Podobnost
+from orm import Kazalec, Transakcija
+
+
+def _znacilke():
+    """
+    Vrni urejene ID-je filmov ter indekse vrstic, indekse značilk in uteži
+    neničelnih elementov matrike značilk filmov.
+
+    Značilke so žanri ter pari (oseba, tip vloge), utežene z inverzno
+    frekvenco v dokumentih, vrstice matrike pa so normirane.
+    """
+    idji = numpy.sort(Film.stolpci('id')['id'])
+    zanri = Pripada.stolpci('film', 'zanr')
+    vloge = Vloga.stolpci('film', 'oseba', 'tip')
+    vrstice = numpy.searchsorted(idji, numpy.concatenate([zanri['film'], vloge['film']]))
+    kljuci = numpy.concatenate([zanri['zanr'] * 3,
+                                vloge['oseba'] * 3 + 1 + (vloge['tip'] == 'R')])
+    _, znacilke = numpy.unique(kljuci, return_inverse=True)
+    pari = numpy.unique(vrstice * (znacilke.max() + 1) + znacilke)
+    vrstice, znacilke = numpy.divmod(pari, znacilke.max() + 1)
+    frekvence = numpy.bincount(znacilke)
+    utezi = numpy.log(len(idji) / frekvence)[znacilke]
+    utezi /= numpy.sqrt(numpy.bincount(vrstice, weights=utezi ** 2,
+                                       minlength=len(idji)))[vrstice]
+    return idji, vrstice, znacilke, utezi
+
+
+def _csr(vrstice, stolpci, utezi, n):
+    """
+    Vrni stisnjene vrstice (začetki, stolpci, uteži) za matriko z `n` vrsticami.
+    """
+    vrstni_red = numpy.lexsort((stolpci, vrstice))
+    zacetki = numpy.zeros(n + 1, dtype='int64')
+    numpy.cumsum(numpy.bincount(vrstice, minlength=n), out=zacetki[1:])
+    return zacetki, stolpci[vrstni_red], utezi[vrstni_red]
+
+
+def _zberi(csr, vrstice):
+    """
+    Vrni indekse vrstic (relativno glede na seznam), stolpce in uteži
+    vseh neničelnih elementov podanih vrstic.
+    """
+    zacetki, stolpci, utezi = csr
+    dolzine = zacetki[vrstice + 1] - zacetki[vrstice]
+    odmiki = numpy.cumsum(dolzine) - dolzine
+    pozicije = numpy.arange(dolzine.sum()) + numpy.repeat(zacetki[vrstice] - odmiki, dolzine)
+    return numpy.repeat(numpy.arange(len(vrstice)), dolzine), stolpci[pozicije], utezi[pozicije]
+
+
+def sosedi(k=10, pomnilnik=2 ** 24, gostota=0.01):
+    """
+    Vračaj trojice (ID filma, ID-ji sosedov, podobnosti) z največ `k` filmi,
+    ki so posameznemu filmu najbolj podobni po kosinusni podobnosti.
+
+    Filmi se obdelujejo v paketih, tako da ima matrika podobnosti paketa
+    največ `pomnilnik` elementov.
+    Značilke, ki jih ima vsaj delež `gostota` filmov (npr. žanri),
+    se množijo kot gosta matrika, ostale pa kot redka.
+    """
+    idji, vrstice, znacilke, utezi = _znacilke()
+    n = len(idji)
+    frekvence = numpy.bincount(znacilke)
+    goste = frekvence >= gostota * n
+    indeksi_gostih = numpy.cumsum(goste) - 1
+    gosta = numpy.zeros((n, goste.sum()), dtype='float32')
+    izbrane = goste[znacilke]
+    gosta[vrstice[izbrane], indeksi_gostih[znacilke[izbrane]]] = utezi[izbrane]
+    redke = ~izbrane
+    po_filmih = _csr(vrstice[redke], znacilke[redke], utezi[redke], n)
+    po_znacilkah = _csr(znacilke[redke], vrstice[redke], utezi[redke], len(frekvence))
+    k = min(k, n - 1)
+    paket = max(1, pomnilnik // n)
+    for zacetek in range(0, n, paket):
+        paket_vrstic = numpy.arange(zacetek, min(n, zacetek + paket))
+        podobnosti = gosta[paket_vrstic] @ gosta.T
+        vrstica, znacilka, utez = _zberi(po_filmih, paket_vrstic)
+        indeks, drugi, utez_drugega = _zberi(po_znacilkah, znacilka)
+        podobnosti += numpy.bincount(vrstica[indeks] * n + drugi,
+                                     weights=utez[indeks] * utez_drugega,
+                                     minlength=len(paket_vrstic) * n
+                                     ).reshape(len(paket_vrstic), n)
+        podobnosti[numpy.arange(len(paket_vrstic)), paket_vrstic] = -1
+        najboljsi = numpy.argpartition(-podobnosti, k - 1, axis=1)[:, :k]
+        vrednosti = numpy.take_along_axis(podobnosti, najboljsi, axis=1)
+        vrstni_red = numpy.argsort(-vrednosti, axis=1, kind='stable')
+        najboljsi = numpy.take_along_axis(najboljsi, vrstni_red, axis=1)
+        vrednosti = numpy.take_along_axis(vrednosti, vrstni_red, axis=1)
+        for i, film in enumerate(idji[paket_vrstic]):
+            pozitivni = vrednosti[i] > 0
+            yield int(film), idji[najboljsi[i][pozitivni]], vrednosti[i][pozitivni]
+
+
+def izracunaj(k=10, **kwargs):
+    """
+    Na novo izračunaj tabelo podobnosti z največ `k` sosedi vsakega filma.
+
+    Ostali parametri se podajo funkciji `sosedi`.
+    """
+    stolpci = ['film', 'podoben', 'mesto', 'podobnost']
+    with Kazalec() as cur:
+        with Transakcija():
+            cur.execute(f"DELETE FROM {Podobnost._ime_tabele()};")
+            for film, podobni, podobnosti in sosedi(k, **kwargs):
+                cur.executemany(Podobnost._sql_dodaj(stolpci), [
+                    dict(film=film, podoben=int(podoben), mesto=mesto,
+                         podobnost=float(podobnost))
+                    for mesto, (podoben, podobnost) in enumerate(zip(podobni, podobnosti), 1)
+                ])
+    Podobnost._razveljavi()
+
+
+if __name__ == '__main__':
+    zacetek = time.perf_counter()
+    for _ in sosedi():
+        pass
+    print(f"izračun sosedov: {time.perf_counter() - zacetek:.2f} s")
+    zacetek = time.perf_counter()
+    izracunaj()
+    print(f"izračun in zapis v bazo: {time.perf_counter() - zacetek:.2f} s")
@@ -9,9 +9,11 @@ import bottle
 import json
 from functools import wraps
 from model import Film, Oseba, Oznaka, Uporabnik
+from orm import Rok, PrekoracitevCasa, hkrati
 
 
 SKRIVNOST = 'nekaj, kar bo zelo težko uganiti!!!! djnskfndkjfnsd'
+ROK_ZAHTEVE = 2.0
 
 
 def izbrisi_piskotek(piskotek):
@@ -55,12 +57,18 @@ def preberi_obrazec(piskotek, privzeto=None, izbrisi=True):
     return privzeto
 
 
+def id_prijavljenega():
+    """
+    Vrni ID prijavljenega uporabnika iz piškotka.
+    """
+    return bottle.request.get_cookie('uporabnik', secret=SKRIVNOST)
+
+
 def prijavljeni_uporabnik():
     """
     Vrni prijavljenega uporabnika z ID-jem iz piškotka.
     """
-    idu = bottle.request.get_cookie('uporabnik', secret=SKRIVNOST)
-    return Uporabnik.z_id(idu)
+    return Uporabnik.z_id(id_prijavljenega())
 
 
 def prijavi_uporabnika(uporabnik, piskotek=None):
@@ -146,6 +154,23 @@ def odjavljen(uporabnik):
     return ()
 
 
+def omejitev_casa(fun):
+    """
+    Vtičnik, ki poizvedbam med obdelavo zahteve (vključno z izrisom predloge)
+    dodeli skupni rok `ROK_ZAHTEVE` sekund.
+
+    Če rok poteče, zahteva takoj vrne napako 503.
+    """
+    @wraps(fun)
+    def wrapper(*largs, **kwargs):
+        try:
+            with Rok(ROK_ZAHTEVE):
+                return fun(*largs, **kwargs)
+        except PrekoracitevCasa:
+            bottle.abort(503, "Poizvedba je trajala predolgo!")
+    return wrapper
+
+
 @bottle.get('/static/<datoteka:path>')
 def static(datoteka):
     return bottle.static_file(datoteka, root='static')
@@ -214,17 +239,18 @@ def filmi_najbolje_ocenjeni():
 
 @bottle.get('/filmi/podatki/<idf:int>/')
 @bottle.view('filmi.podatki.html')
-@kdorkoli
-def filmi_podatki(uporabnik, idf):
-    film = Film.z_id(idf)
+def filmi_podatki(idf):
+    idu = id_prijavljenega()
+    uporabnik, (film, zasedba) = hkrati(lambda: Uporabnik.z_id(idu),
+                                        lambda: Film.z_zasedbo(idf))
     igralec = []
     reziser = []
-    for vloga in film.zasedba():
+    for vloga in zasedba:
         if vloga.tip == 'I':
             igralec.append(vloga)
         else:
             reziser.append(vloga)
-    return dict(film=film, igralec=igralec, reziser=reziser)
+    return dict(film=film, igralec=igralec, reziser=reziser, uporabnik=uporabnik)
 
 
 @bottle.get("/filmi/dodaj/")
@@ -277,9 +303,19 @@ def filmi_uredi_post(uporabnik, idf):
     zasluzek = bottle.request.forms.zasluzek
     oznaka = bottle.request.forms.oznaka
     opis = bottle.request.forms.opis
-    film = Film(id=idf, naslov=naslov, dolzina=dolzina, leto=leto,
-                ocena=ocena, metascore=metascore, glasovi=glasovi,
-                zasluzek=zasluzek, oznaka=oznaka, opis=opis)
+    try:
+        film = Film.z_id(idf)
+    except ValueError:
+        bottle.abort(404, "Film ne obstaja!")
+    film.naslov = naslov
+    film.dolzina = dolzina
+    film.leto = leto
+    film.ocena = ocena
+    film.metascore = metascore
+    film.glasovi = glasovi
+    film.zasluzek = zasluzek
+    film.oznaka = oznaka
+    film.opis = opis
     try:
         film.posodobi()
         bottle.redirect(f'/filmi/podatki/{film.id}/')
@@ -315,15 +351,17 @@ def osebe_poisci():
 @bottle.get('/osebe/podatki/<ido:int>/')
 @bottle.view('osebe.podatki.html')
 def osebe_podatki(ido):
-    oseba = Oseba.z_id(ido)
+    idu = id_prijavljenega()
+    uporabnik, (oseba, vloge) = hkrati(lambda: Uporabnik.z_id(idu),
+                                       lambda: Oseba.z_vlogami(ido))
     igralec = []
     reziser = []
-    for vloga in oseba.poisci_vloge():
+    for vloga in vloge:
         if vloga.tip == 'I':
             igralec.append(vloga)
         else:
             reziser.append(vloga)
-    return dict(oseba=oseba, igralec=igralec, reziser=reziser)
+    return dict(oseba=oseba, igralec=igralec, reziser=reziser, uporabnik=uporabnik)
 
 
 bottle.BaseTemplate.defaults['prijavljeni_uporabnik'] = prijavljeni_uporabnik
@@ -332,6 +370,7 @@ bottle.BaseTemplate.defaults['preberi_obrazec'] = preberi_obrazec
 bottle.BaseTemplate.defaults['Film'] = Film
 bottle.BaseTemplate.defaults['Oseba'] = Oseba
 bottle.BaseTemplate.defaults['Oznaka'] = Oznaka
+bottle.install(omejitev_casa)
 
 if __name__ == '__main__':
     bottle.run(debug=True, reloader=True)
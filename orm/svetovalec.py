@@ -0,0 +1,360 @@
+#
+#   Svetovalec za indekse na podlagi zabeleženih poizvedb
+#
+
+import json
+import os
+import re
+import sqlite3 as dbapi
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from orm import conn, uporabi_snemalnik
+
+UKAZI = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _oblika(sql):
+    """
+    Vrni obliko poizvedbe - poizvedbo z normaliziranimi presledki.
+    """
+    return ' '.join(sql.split())
+
+
+def _stavki(skripta):
+    """
+    Vrni seznam posameznih poizvedb v skripti SQL.
+    """
+    stavki = []
+    stavek = ''
+    for del_ in skripta.split(';'):
+        stavek += del_ + ';'
+        if dbapi.complete_statement(stavek):
+            if stavek.strip(' \n\t;'):
+                stavki.append(stavek)
+            stavek = ''
+    return stavki
+
+
+@dataclass
+class Oblika:
+    """
+    Razred za zabeleženo obliko poizvedbe.
+    """
+    sql: str
+    parametri: object
+    stevilo: int = 0
+    cas: float = 0.0
+
+
+@dataclass
+class Predlog:
+    """
+    Razred za predlagani indeks z ocenjenim prihrankom časa
+    in obremenitvijo, ki jo pohitri.
+    """
+    tabela: str
+    stolpci: tuple
+    prihranek: float
+    poizvedbe: list = field(default_factory=list)
+
+    def __str__(self):
+        """
+        Vrni ukaz za ustvarjanje indeksa.
+        """
+        return f"CREATE INDEX {self.tabela}_{'_'.join(self.stolpci)}_indeks " \
+            f"ON {self.tabela} ({', '.join(self.stolpci)});"
+
+
+class _SnemalniKazalec(dbapi.Cursor):
+    """
+    Kazalec, ki čas izvajanja poizvedb sporoča snemalniku.
+
+    Beležijo se poizvedbe, izvedene z metodami `execute`, `executemany`
+    in `executescript`.
+    """
+
+    def __init__(self, povezava, snemalnik):
+        """
+        Konstruktor kazalca na podani povezavi.
+        """
+        super().__init__(povezava)
+        self.snemalnik = snemalnik
+
+    def execute(self, sql, parametri=()):
+        """
+        Izvedi poizvedbo in zabeleži njeno obliko in čas izvajanja.
+        """
+        zacetek = time.perf_counter()
+        try:
+            return super().execute(sql, parametri)
+        finally:
+            self.snemalnik.zabelezi(sql, parametri, time.perf_counter() - zacetek)
+
+    def executemany(self, sql, parametri):
+        """
+        Izvedi poizvedbo za vsak nabor parametrov in zabeleži njeno obliko,
+        število izvedb in skupni čas izvajanja.
+        """
+        parametri = list(parametri)
+        zacetek = time.perf_counter()
+        try:
+            return super().executemany(sql, parametri)
+        finally:
+            if parametri:
+                self.snemalnik.zabelezi(sql, parametri[0], time.perf_counter() - zacetek,
+                                        len(parametri))
+
+    def executescript(self, skripta):
+        """
+        Izvedi skripto in zabeleži oblike njenih poizvedb.
+
+        Čas izvajanja skripte se enakomerno porazdeli med njene poizvedbe.
+        """
+        zacetek = time.perf_counter()
+        try:
+            return super().executescript(skripta)
+        finally:
+            stavki = _stavki(skripta)
+            cas = time.perf_counter() - zacetek
+            for stavek in stavki:
+                self.snemalnik.zabelezi(stavek, (), cas / len(stavki))
+
+
+class Snemalnik:
+    """
+    Upravitelj konteksta, ki beleži oblike poizvedb ORM
+    z njihovim številom izvedb in skupnim časom izvajanja.
+
+    Za vsako obliko se shranijo tudi parametri prve izvedbe,
+    s katerimi svetovalec poizvedbo ponovi.
+    Čas izvajanja obsega izvedbo do prve vrstice rezultata.
+    """
+
+    def __init__(self):
+        """
+        Konstruktor praznega snemalnika.
+        """
+        self.oblike = {}
+        self.kljucavnica = threading.Lock()
+
+    def __enter__(self):
+        """
+        Vstop v kontekst z `with`.
+
+        Začne beležiti poizvedbe.
+        """
+        uporabi_snemalnik(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Izstop iz konteksta.
+
+        Preneha beležiti poizvedbe.
+        """
+        uporabi_snemalnik(None)
+
+    def kazalec(self, povezava):
+        """
+        Vrni kazalec na podani povezavi, ki beleži poizvedbe.
+        """
+        return _SnemalniKazalec(povezava, self)
+
+    def zabelezi(self, sql, parametri, cas, stevilo=1):
+        """
+        Zabeleži `stevilo` izvedb poizvedbe s podanimi parametri
+        in skupnim časom izvajanja.
+
+        Beležijo se le poizvedbe za branje in spreminjanje podatkov.
+        """
+        oblika = _oblika(sql)
+        if not oblika.upper().startswith(UKAZI):
+            return
+        with self.kljucavnica:
+            if oblika not in self.oblike:
+                if isinstance(parametri, dict):
+                    parametri = dict(parametri)
+                else:
+                    parametri = list(parametri)
+                try:
+                    json.dumps(parametri)
+                except (TypeError, ValueError):
+                    parametri = None
+                self.oblike[oblika] = Oblika(oblika, parametri)
+            self.oblike[oblika].stevilo += stevilo
+            self.oblike[oblika].cas += cas
+
+    def shrani(self, pot):
+        """
+        Zapiši zabeležene oblike poizvedb v datoteko v obliki JSONL.
+        """
+        with open(pot, 'w', encoding='utf-8') as f:
+            for oblika in self.oblike.values():
+                f.write(json.dumps(oblika.__dict__, ensure_ascii=False) + '\n')
+
+
+def nalozi(pot):
+    """
+    Vrni seznam oblik poizvedb, prebranih iz datoteke v obliki JSONL.
+    """
+    with open(pot, encoding='utf-8') as f:
+        return [Oblika(**json.loads(vrstica)) for vrstica in f if vrstica.strip()]
+
+
+def _tabele(povezava, sql):
+    """
+    Vrni slovar, ki imenom in vzdevkom tabel baze, uporabljenih v poizvedbi,
+    priredi imena tabel.
+    """
+    obstojece = {ime for ime, in povezava.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table';")}
+    tabele = {}
+    for ime, vzdevek in re.findall(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+AS\s+(\w+))?',
+                                   sql, re.IGNORECASE):
+        if ime in obstojece:
+            tabele[ime] = ime
+            if vzdevek:
+                tabele[vzdevek] = ime
+    return tabele
+
+
+def _kandidati(povezava, sql):
+    """
+    Vrni množico kandidatov za indekse za podano poizvedbo
+    kot parov tabele in nabora stolpcev.
+
+    Kandidati so posamezni stolpci, ki jih poizvedba uporablja v pogojih,
+    pridružitvah in urejanju, ter zaporedja prvih dveh in treh takih stolpcev.
+    """
+    tabele = _tabele(povezava, sql)
+    stolpci = {}
+    for ime in set(tabele.values()):
+        obstojeci = {vrstica[1] for vrstica in povezava.execute(f"PRAGMA table_info({ime});")}
+        stolpci[ime] = []
+        vzdevki = {vzdevek for vzdevek, tabela in tabele.items() if tabela == ime}
+        for vzdevek, stolpec in re.findall(r'\b(\w+)\.(\w+)\b', sql):
+            if vzdevek in vzdevki and stolpec in obstojeci and stolpec not in stolpci[ime]:
+                stolpci[ime].append(stolpec)
+        if len(set(tabele.values())) == 1:
+            for stolpec in re.findall(r'\b(\w+)\s*(?:=|<|>|<=|>=|\bLIKE\b|\bIN\b)',
+                                      sql, re.IGNORECASE):
+                if stolpec in obstojeci and stolpec not in stolpci[ime]:
+                    stolpci[ime].append(stolpec)
+    kandidati = set()
+    for ime, seznam in stolpci.items():
+        kandidati.update((ime, (stolpec, )) for stolpec in seznam)
+        kandidati.update((ime, tuple(seznam[:n])) for n in (2, 3) if len(seznam) >= n)
+    return kandidati
+
+
+def _pokrit(povezava, tabela, stolpci):
+    """
+    Vrni, ali že obstaja indeks, katerega začetni stolpci so podani stolpci.
+    """
+    for indeks in [vrstica[1] for vrstica in povezava.execute(f"PRAGMA index_list({tabela});")]:
+        obstojeci = tuple(ime for _, _, ime in sorted(povezava.execute(
+            f"PRAGMA index_info({indeks});")))
+        if obstojeci[:len(stolpci)] == stolpci:
+            return True
+    return False
+
+
+def _cas(povezava, oblika, ponovitve):
+    """
+    Vrni mediano časa izvedbe poizvedbe do zadnje vrstice rezultata
+    ali `None`, če poizvedbe ni mogoče ponoviti.
+
+    Vsaka izvedba se izvede v transakciji, ki se nato razveljavi.
+    """
+    casi = []
+    for _ in range(ponovitve):
+        zacetek = time.perf_counter()
+        try:
+            povezava.execute("BEGIN;")
+            povezava.execute(oblika.sql, oblika.parametri).fetchall()
+        except dbapi.Error:
+            return None
+        finally:
+            if povezava.in_transaction:
+                povezava.execute("ROLLBACK;")
+        casi.append(time.perf_counter() - zacetek)
+    return statistics.median(casi)
+
+
+def _nacrt(povezava, oblika):
+    """
+    Vrni besedilo načrta izvajanja poizvedbe.
+    """
+    return '\n'.join(vrstica[-1] for vrstica in povezava.execute(
+        f"EXPLAIN QUERY PLAN {oblika.sql}", oblika.parametri))
+
+
+def svetuj(obremenitev, baza=None, ponovitve=5, najvec=10):
+    """
+    Vrni seznam največ `najvec` predlaganih indeksov,
+    urejen padajoče po ocenjenem prihranku časa.
+
+    Obremenitev je seznam oblik poizvedb ali pot do datoteke,
+    v katero jih je zapisal snemalnik.
+    Predlogi se ocenijo na začasni kopiji baze na poti `baza` (privzeto glavne baze):
+    za vsakega kandidata, ki ga ne pokriva že obstoječi indeks, se indeks ustvari,
+    poizvedbe, katerih načrt ga uporabi, pa se ponovijo `ponovitve`-krat.
+    Prihranek je razlika med časi izvedbe brez indeksa in z njim,
+    pomnožena s številom izvedb v obremenitvi;
+    upoštevajo se tudi upočasnitve pisanja v tabelo z indeksom.
+    """
+    if isinstance(obremenitev, (str, os.PathLike)):
+        obremenitev = nalozi(obremenitev)
+    obremenitev = [oblika for oblika in obremenitev if oblika.parametri is not None]
+    vir = dbapi.connect(conn.pot if baza is None else baza)
+    with tempfile.TemporaryDirectory() as mapa:
+        povezava = dbapi.connect(os.path.join(mapa, 'kopija.sqlite'), isolation_level=None)
+        try:
+            vir.backup(povezava)
+            vir.close()
+            osnovni = {}
+            kandidati = {}
+            for oblika in obremenitev:
+                osnovni[oblika.sql] = _cas(povezava, oblika, ponovitve)
+                if osnovni[oblika.sql] is None:
+                    continue
+                for kandidat in _kandidati(povezava, oblika.sql):
+                    if not _pokrit(povezava, *kandidat):
+                        kandidati.setdefault(kandidat, []).append(oblika)
+            predlogi = []
+            for (tabela, stolpci), oblike in kandidati.items():
+                predlog = Predlog(tabela, stolpci, 0.0)
+                povezava.execute(f"CREATE INDEX svetovalec ON {tabela} ({', '.join(stolpci)});")
+                try:
+                    for oblika in obremenitev:
+                        if osnovni[oblika.sql] is None:
+                            continue
+                        pisanje = not oblika.sql.upper().startswith(('SELECT', 'WITH'))
+                        if oblika in oblike and 'svetovalec' in _nacrt(povezava, oblika):
+                            predlog.poizvedbe.append(oblika.sql)
+                        elif not (pisanje and tabela in _tabele(povezava, oblika.sql).values()):
+                            continue
+                        cas = _cas(povezava, oblika, ponovitve)
+                        if cas is not None:
+                            predlog.prihranek += oblika.stevilo * (osnovni[oblika.sql] - cas)
+                finally:
+                    povezava.execute("DROP INDEX svetovalec;")
+                if predlog.poizvedbe and predlog.prihranek > 0:
+                    predlogi.append(predlog)
+        finally:
+            povezava.close()
+    predlogi.sort(key=lambda predlog: predlog.prihranek, reverse=True)
+    return predlogi[:najvec]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(f"Uporaba: python {sys.argv[0]} obremenitev.jsonl [baza.sqlite]")
+        sys.exit(1)
+    for predlog in svetuj(sys.argv[1], *sys.argv[2:3]):
+        print(f"{predlog}  -- prihranek {predlog.prihranek * 1000:.1f} ms, "
+              f"poizvedb: {len(predlog.poizvedbe)}")
@@ -1,9 +1,37 @@
+import csv
+import io
+import json
+import os
+import sqlite3 as dbapi
+import subprocess
+import sys
+import threading
+import time
 from model import Uporabnik, Oznaka, Film, Oseba, Zanr, Vloga, Pripada
+from model import StatistikaZanra, Filmografija
+from orm import Padajoce, Vzorec
 from orm import pobrisi_tabele, ustvari_bazo
-from orm import conn
+from orm import Entiteta, Tabela, polje
+from orm import Transakcija, Seja, Razdelitev, Branje, Kazalec
+from orm import objavi_posnetek, uporabi_posnetek
+from orm import uporabi_repliko, povezava, metrike
+from orm import conn, povezi, pot_baze
+from orm import spremembe, zadnja_sprememba, strni_spremembe
+from orm import sinhroniziraj
+from orm import predpomnilnik, uporabi_trajni_predpomnilnik
+from orm import Rok, PrekoracitevCasa
+from orm import hkrati
+from pisar import Pisar
+from podobnosti import izracunaj
+from varnostna_kopija import VarnostnaKopija
+from migracije import nacrt, migriraj
+from svetovalec import Snemalnik, svetuj, nalozi
 
 pobrisi_tabele()
+assert zadnja_sprememba() == 0 and list(spremembe()) == []
+strni_spremembe()
 ustvari_bazo()
+uvozenih = zadnja_sprememba()
 
 # Izpisovanje poizvedb
 conn.set_trace_callback(print)
@@ -35,3 +63,650 @@ assert len(list(naj2008.zasedba())) == 5
 
 pitt, = Oseba.poisci('Brad Pitt')
 assert len(list(pitt.poisci_vloge())) == 39
+
+filmi2008 = Film.stolpci('ocena', 'metascore', ('oznaka', 'kratica'), leto=2008)
+assert len(filmi2008['ocena']) == len(list(Film.seznam(leto=2008)))
+assert max(filmi2008['ocena']) == naj2008.ocena
+vloge = Vloga.stolpci(('film', 'leto'), 'mesto', oseba=pitt.id)
+assert sorted(vloge[('film', 'leto')]) == [v.film.leto for v in pitt.poisci_vloge()]
+
+with Transakcija():
+    zunanji = Film(naslov='Zunanji film', dolzina=90, leto=2026, ocena=7)
+    zunanji.dodaj()
+    try:
+        with Transakcija():
+            Film(naslov='Notranji film', dolzina=90, leto=2026, ocena=8).dodaj()
+            raise RuntimeError
+    except RuntimeError:
+        pass
+assert [f.naslov for f in Film.najboljsi_v_letu(2026)] == ['Zunanji film']
+zunanji.izbrisi()
+
+with Seja() as seja:
+    oznaka = Oznaka('PB-2')
+    film = Film(naslov='Film v seji', dolzina=120, leto=2026, ocena=9, oznaka=oznaka)
+    seja.dodaj(film)
+    seja.dodaj(oznaka)
+    seja.dodaj(Vloga(film=film, oseba=pitt, tip='I', mesto=1))
+assert Film.z_id(film.id).oznaka.kratica == 'PB-2'
+assert len(list(film.zasedba())) == 1
+with Seja() as seja:
+    for vloga in film.zasedba():
+        seja.izbrisi(vloga)
+    seja.izbrisi(film)
+    seja.izbrisi(oznaka)
+assert len(list(Film.najboljsi_v_letu(2026))) == 0
+try:
+    with Seja() as seja:
+        film = Film(naslov='Neuspešna seja', dolzina=120, leto=2026, ocena=9)
+        seja.dodaj(film)
+        seja.dodaj(Vloga(film=film, oseba=pitt, tip='I', mesto=1))
+        seja.dodaj(Vloga(film=film, oseba=pitt, tip='I', mesto=2))
+    assert False, "Podvojena vloga ne bi smela biti dodana"
+except ValueError:
+    pass
+assert film.id is None and film._posnetek is None
+film.dodaj()
+assert len(list(Film.najboljsi_v_letu(2026))) == 1
+film.izbrisi()
+
+naj2008.opis = 'Nov opis'
+naj2008.ocena = str(naj2008.ocena)
+assert naj2008._spremenjeni_stolpci() == ('opis', )
+naj2008.posodobi()
+assert naj2008._spremenjeni_stolpci() == ()
+assert Film.z_id(naj2008.id).opis == 'Nov opis'
+
+objavi_posnetek('filmi.posnetek.sqlite')
+uporabi_posnetek('filmi.posnetek.sqlite')
+nov = Film(naslov='Film po posnetku', dolzina=100, leto=2026, ocena=5)
+nov.dodaj()
+assert len(list(Film.najboljsi_v_letu(2026))) == 0
+with Transakcija():
+    assert len(list(Film.najboljsi_v_letu(2026))) == 1
+objavi_posnetek('filmi.posnetek.sqlite')
+assert len(list(Film.najboljsi_v_letu(2026))) == 1
+v_niti = []
+nit = threading.Thread(target=lambda: v_niti.extend(Film.najboljsi_v_letu(2026)))
+nit.start()
+nit.join()
+assert [f.id for f in v_niti] == [nov.id]
+nov.izbrisi()
+uporabi_posnetek(None)
+os.remove('filmi.posnetek.sqlite')
+assert len(list(Film.najboljsi_v_letu(2026))) == 0
+
+deli = [f'vloga_{i}.sqlite' for i in range(3)]
+Vloga.razdeli(Razdelitev('film', deli))
+ustvari_bazo(pobrisi=True)
+assert len(list(pitt.poisci_vloge())) == 39
+assert len(list(naj2008.zasedba())) == 5
+assert sum(conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+           for tabela in Vloga.RAZDELITEV.tabele()) == 50930
+vloga = Vloga(film=naj2008, oseba=pitt, tip='I', mesto=100)
+vloga.dodaj()
+assert len(list(naj2008.zasedba())) == 6
+vloga.izbrisi()
+with Seja() as seja:
+    film = Film(naslov='Film v razdeljeni seji', dolzina=120, leto=2026, ocena=9)
+    seja.dodaj(film)
+    seja.dodaj(Vloga(film=film, oseba=pitt, tip='I', mesto=1))
+    seja.dodaj(Vloga(film=film, oseba=pitt, tip='R', mesto=1))
+assert [v.tip for v in film.zasedba()] == ['R', 'I']
+with Seja() as seja:
+    for vloga in film.zasedba():
+        seja.izbrisi(vloga)
+    seja.izbrisi(film)
+Vloga.razdeli(None)
+for datoteka in deli:
+    os.remove(datoteka)
+ustvari_bazo(pobrisi=True)
+assert zadnja_sprememba() == uvozenih
+
+uporabi_repliko('filmi.replika.sqlite', osvezitev=0.1)
+nov = Film(naslov='Film na repliki', dolzina=100, leto=2026, ocena=5)
+nov.dodaj()
+assert povezava(True) is conn
+assert len(list(Film.najboljsi_v_letu(2026))) == 1
+time.sleep(0.5)
+assert povezava(True) is not conn
+assert len(list(Film.najboljsi_v_letu(2026))) == 1
+v_niti = []
+nit = threading.Thread(target=lambda: v_niti.extend(Film.najboljsi_v_letu(2026)))
+nit.start()
+nit.join()
+assert [f.id for f in v_niti] == [nov.id]
+assert metrike()['zaostanek_replike'] < 0.5
+nov.izbrisi()
+uporabi_repliko('filmi.replika.sqlite', osvezitev=3600)
+nov = Film(naslov='Film mimo replike', dolzina=100, leto=2026, ocena=5)
+nov.dodaj()
+v_niti = []
+nit = threading.Thread(target=lambda: v_niti.extend(Film.seznam(leto=2026, predpomni=True)))
+nit.start()
+nit.join()
+assert v_niti == []
+assert [f.id for f in Film.seznam(leto=2026, predpomni=True)] == [nov.id]
+nov.izbrisi()
+uporabi_repliko(None)
+for datoteka in ['filmi.replika.sqlite', 'filmi.replika.sqlite-wal', 'filmi.replika.sqlite-shm']:
+    if os.path.exists(datoteka):
+        os.remove(datoteka)
+
+napredek = []
+statistika = VarnostnaKopija('filmi.kopija.sqlite', strani=256, pavza=0,
+                             porocaj=lambda *args: napredek.append(args)).izvedi()
+assert napredek[-1][0] == napredek[-1][1] == statistika['strani']
+with dbapi.connect('filmi.kopija.sqlite') as kopija:
+    assert kopija.execute("SELECT COUNT(*) FROM film").fetchone()[0] == 10000
+assert statistika['ponovitve'] == 0 and not statistika['v_enem_koraku']
+pisanje = dbapi.connect(pot_baze())
+
+
+def pisi_med_kopiranjem(*args):
+    with pisanje:
+        pisanje.execute("UPDATE film SET glasovi = glasovi + 1 WHERE id = ?", [naj2008.id])
+
+
+statistika = VarnostnaKopija('filmi.kopija.sqlite', strani=256, pavza=0, najvec_ponovitev=2,
+                             porocaj=pisi_med_kopiranjem).izvedi()
+assert statistika['ponovitve'] == 3 and statistika['v_enem_koraku']
+with dbapi.connect('filmi.kopija.sqlite') as kopija:
+    assert kopija.execute("SELECT glasovi FROM film WHERE id = ?", [naj2008.id]).fetchone() == \
+        pisanje.execute("SELECT glasovi FROM film WHERE id = ?", [naj2008.id]).fetchone()
+pisanje.close()
+
+
+def prekini(*args):
+    raise RuntimeError
+
+
+try:
+    VarnostnaKopija('filmi.kopija.sqlite', strani=256, pavza=0, porocaj=prekini).izvedi()
+    assert False, "Kopiranje bi moralo biti prekinjeno"
+except RuntimeError:
+    pass
+assert not os.path.exists(f'filmi.kopija.sqlite.{os.getpid()}.tmp')
+os.remove('filmi.kopija.sqlite')
+
+zacetek = zadnja_sprememba()
+nov = Film(naslov='Film v dnevniku', dolzina=100, leto=2026, ocena=5)
+nov.dodaj()
+nov.ocena = 6
+nov.posodobi()
+idf = nov.id
+nov.izbrisi()
+assert [(s.tabela, s.kljuc, s.operacija) for s in spremembe(zacetek)] == \
+    [('film', (idf, ), 'I'), ('film', (idf, ), 'U'), ('film', (idf, ), 'D')]
+strni_spremembe()
+assert [s.operacija for s in spremembe(zacetek)] == ['D']
+strni_spremembe(zadnja_sprememba())
+assert list(spremembe()) == []
+
+
+def preveri_lestvico(leta, n=10):
+    for leto in leta:
+        assert [f.id for f in Film.najboljsi_v_letu(leto, n)] == \
+            [f.id for f in Film.seznam(leto=leto, uredi=[Padajoce('ocena'), 'id'], omejitev=n)]
+
+
+preveri_lestvico(range(1990, 2027))
+preveri_lestvico([2008], 20)
+nov = Film(naslov='Najboljši film', dolzina=100, leto=2008, ocena=10)
+nov.dodaj()
+preveri_lestvico([2008])
+nov.ocena = 1
+nov.posodobi()
+preveri_lestvico([2008])
+nov.leto = 2009
+nov.ocena = 9.5
+nov.posodobi()
+preveri_lestvico([2008, 2009])
+nov.izbrisi()
+preveri_lestvico([2008, 2009])
+po_letih = list(Film.najboljsi_po_letih())
+assert len(po_letih) == len({f.leto for f in po_letih})
+assert [f.id for f in po_letih if f.leto == 2008] == [f.id for f in Film.najboljsi_v_letu(2008, 1)]
+
+sodelavci = pitt.pogosti_sodelavci(3)
+assert len(sodelavci) == 3 and sodelavci[0][1] >= sodelavci[-1][1]
+clooney, = Oseba.poisci('George Clooney')
+pot = pitt.pot_do(clooney)
+assert pot[0].id == pitt.id and pot[-1].id == clooney.id
+for oseba, film in zip(pot[::2], pot[1::2]):
+    assert any(v.oseba.id == oseba.id for v in film.zasedba())
+assert pitt.pot_do(pitt) == [pitt]
+assert [o.id for o in Oseba.z_idji([clooney.id, pitt.id, clooney.id])] == \
+    [clooney.id, pitt.id, clooney.id]
+try:
+    Oseba.z_idji([pitt.id, -1])
+    assert False, "Neobstoječ ključ bi moral sprožiti napako"
+except ValueError:
+    pass
+
+izracunaj(k=5)
+podobni = list(naj2008.podobni(3))
+assert len(podobni) == 3 and naj2008.id not in {f.id for f in podobni}
+podobnosti = [p.podobnost for p in naj2008.podobnost_film(uredi=['mesto'])]
+assert podobnosti == sorted(podobnosti, reverse=True) and 0 < podobnosti[-1] <= 1
+
+assert all(stevila == (0, 0, 0) for stevila in sinhroniziraj().values())
+conn.execute("UPDATE film SET naslov = 'Napačen naslov' WHERE id = ?", [naj2008.id])
+conn.execute("UPDATE zgostitve_virov SET zgostitev = '' WHERE tabela = 'film' AND kljuc = ?",
+             [f'["{naj2008.id}"]'])
+vloga, *_ = naj2008.zasedba()
+vloga.izbrisi()
+conn.execute("DELETE FROM zgostitve_virov WHERE tabela = 'vloga' AND kljuc = ?",
+             [f'["{vloga.film.id}", "{vloga.oseba.id}", "{vloga.tip}"]'])
+odvec = Film(naslov='Film, ki ga ni v viru', dolzina=100, leto=2026, ocena=5)
+odvec.dodaj()
+conn.execute("INSERT INTO zgostitve_virov VALUES ('film', '[\"0\"]', '', ?)",
+             [f'[{odvec.id}]'])
+conn.commit()
+statistika = sinhroniziraj()
+assert statistika['film'] == (0, 1, 1) and statistika['vloga'] == (1, 0, 0)
+assert Film.z_id(naj2008.id).naslov != 'Napačen naslov'
+assert len(list(naj2008.zasedba())) == 5
+assert len(list(Film.najboljsi_v_letu(2026))) == 0
+preberi_vir = Uporabnik.preberi_vir
+Uporabnik.preberi_vir = classmethod(lambda cls: (
+    {**vrstica, 'geslo': 'NovoGeslo'} if vrstica['uporabnisko_ime'] == 'janos' else vrstica
+    for vrstica in preberi_vir()))
+assert sinhroniziraj()['uporabnik'] == (0, 1, 0)
+assert Uporabnik.prijavi('janos', 'NovoGeslo')
+del Uporabnik.preberi_vir
+assert sinhroniziraj()['uporabnik'] == (0, 1, 0)
+assert conn.execute("""
+    SELECT identiteta FROM zgostitve_virov
+     WHERE tabela = 'uporabnik' AND identiteta LIKE '%janos%'
+""").fetchall() == [('["janos"]', )]
+assert not conn.execute("SELECT * FROM zgostitve_virov WHERE identiteta LIKE '%Geslo%'").fetchall()
+
+zadetki = metrike()['predpomnilnik_zadetki']
+assert Film.z_id(naj2008.id, predpomni=True).naslov == naj2008.naslov
+assert Film.z_id(naj2008.id, predpomni=True).naslov == naj2008.naslov
+assert metrike()['predpomnilnik_zadetki'] == zadetki + 1
+film = Film.z_id(naj2008.id, predpomni=True)
+film.naslov = 'Predpomnjen naslov'
+film.posodobi()
+assert Film.z_id(naj2008.id, predpomni=True).naslov == 'Predpomnjen naslov'
+film.naslov = naj2008.naslov
+with Seja() as seja:
+    seja.posodobi(film)
+assert Film.z_id(naj2008.id, predpomni=True).naslov == naj2008.naslov
+assert [str(f) for f in Film.lestvica('leto', 2008, predpomni=True)] == \
+    [str(f) for f in Film.lestvica('leto', 2008)]
+najvec_bajtov = predpomnilnik.najvec_bajtov
+predpomnilnik.najvec_bajtov = 10000
+assert len(list(Film.seznam(leto=2008, predpomni=True))) > 0
+assert predpomnilnik.velikost <= 10000
+predpomnilnik.najvec_bajtov = najvec_bajtov
+
+conn.commit()
+filmi = [Film(naslov=f'Vzporedni film {i}', dolzina=90, leto=2027, ocena=i / 10)
+         for i in range(20)]
+with Pisar(paket=8) as pisar:
+    prihodnosti = [pisar.dodaj(film) for film in filmi]
+    assert all(p.result() == film.id for p, film in zip(prihodnosti, filmi))
+    oznaka = Oznaka(kratica='Vzporedna')
+    pisar.dodaj(oznaka)
+    dvojnik = pisar.dodaj(Oznaka(kratica='Vzporedna'))
+    filmi[0].ocena = 10
+    pisar.posodobi(filmi[0]).result()
+try:
+    dvojnik.result()
+    assert False, "Dvojnik ne bi smel biti dodan"
+except ValueError:
+    pass
+assert pisar.zapisov == 22 and pisar.transakcij >= 3
+assert Film.z_id(filmi[0].id).ocena == 10
+assert [f.id for f in Film.najboljsi_v_letu(2027, 3)] == [filmi[0].id, filmi[19].id, filmi[18].id]
+with Pisar() as pisar:
+    for film in filmi:
+        pisar.izbrisi(film)
+    pisar.izbrisi(oznaka)
+assert len(list(Film.seznam(leto=2027))) == 0
+Pisar().zaustavi()
+with Pisar() as pisar:
+    neuspesna = pisar.izvedi("SELECT 1;", potem=lambda kljuc: 1 / 0)
+    uspesna = pisar.izvedi("SELECT 1;")
+    try:
+        neuspesna.result()
+        assert False, "Napaka v funkciji potem bi se morala sporočiti"
+    except ZeroDivisionError:
+        pass
+    uspesna.result()
+
+prekinitve = metrike()['prekinjene_poizvedbe']
+try:
+    list(Film.seznam(naslov=Vzorec('%ni takega naslova%'), rok=0))
+    assert False, "Poizvedba bi morala biti prekinjena"
+except PrekoracitevCasa:
+    pass
+with Rok(0):
+    try:
+        Film.stolpci('id')
+        assert False, "Poizvedba bi morala biti prekinjena"
+    except PrekoracitevCasa:
+        pass
+assert metrike()['prekinjene_poizvedbe'] == prekinitve + 2
+with Rok(60):
+    assert len(list(Film.seznam(naslov=Vzorec('%ni takega naslova%'), rok=60))) == 0
+filmi = Film.seznam(rok=0.05)
+next(filmi)
+time.sleep(0.1)
+assert len(list(Oseba.seznam(omejitev=10))) == 10
+assert len(list(filmi)) == 9999
+
+film, zasedba = Film.z_zasedbo(naj2008.id)
+assert film == Film.z_id(naj2008.id) and zasedba == list(naj2008.zasedba())
+oseba, vloge = Oseba.z_vlogami(pitt.id)
+assert oseba == pitt and vloge == list(pitt.poisci_vloge())
+film, odnosi = Film.z_odnosi(naj2008.id, pripada_film={}, vloga_film=dict(omejitev=2))
+assert len(odnosi['vloga_film']) == 2 and len(odnosi['pripada_film']) > 0
+try:
+    Film.z_odnosi(-1, vloga_film={})
+    assert False, "Film ne bi smel obstajati"
+except ValueError:
+    pass
+
+najboljsi = list(Film.seznam(skupina='leto', na_skupino=3, uredi=[Padajoce('ocena'), 'id']))
+assert [f.id for f in najboljsi if f.leto == 2008] == \
+    [f.id for f in Film.seznam(leto=2008, uredi=[Padajoce('ocena'), 'id'], omejitev=3)]
+assert all(sum(f.leto == g.leto for g in najboljsi) <= 3 for f in najboljsi)
+assert [f.leto for f in najboljsi] == sorted(f.leto for f in najboljsi)
+glavni = list(Vloga.seznam(skupina=('film', 'leto'), uredi=[Padajoce(('film', 'ocena')), 'mesto'],
+                           tip='I'))
+assert len(glavni) == len({f.leto for f in najboljsi})
+assert glavni[-1].film.ocena == max(f.ocena for f in Film.seznam(leto=glavni[-1].film.leto))
+assert glavni[-1].mesto == 1
+
+statistika = {str(s.zanr): s for s in StatistikaZanra.seznam()}
+drama = len(list(Pripada.seznam(zanr=statistika['Drama'].zanr.id)))
+assert statistika['Drama'].filmov == drama and not StatistikaZanra.zastarel()
+film = Film(naslov='Nova drama', dolzina=100, leto=2027, ocena=8)
+film.dodaj()
+Pripada(film=film, zanr=statistika['Drama'].zanr).dodaj()
+assert StatistikaZanra.zastarel()
+statistika, = StatistikaZanra.seznam(zanr=statistika['Drama'].zanr.id)
+assert statistika.filmov == drama + 1 and not StatistikaZanra.zastarel()
+try:
+    statistika.posodobi()
+    assert False, "Pogleda ne bi smelo biti mogoče spreminjati"
+except ValueError:
+    pass
+filmografija, = Filmografija.seznam(oseba=pitt.id)
+vloge = list(pitt.poisci_vloge())
+assert filmografija.igralec == sum(v.tip == 'I' for v in vloge) > 0
+assert filmografija.reziser == sum(v.tip == 'R' for v in vloge)
+
+conn.commit()
+druga = dbapi.connect(pot_baze(), timeout=0)
+with Transakcija(nacin='immediate'):
+    assert conn.in_transaction
+    try:
+        druga.execute("UPDATE film SET dolzina = dolzina + 1 WHERE id = ?", [naj2008.id])
+        assert False, "Baza bi morala biti zaklenjena za pisanje"
+    except dbapi.OperationalError:
+        druga.rollback()
+dolzina = Film.z_id(naj2008.id).dolzina
+with Branje():
+    assert conn.in_transaction and Film.z_id(naj2008.id).dolzina == dolzina
+    try:
+        with druga:
+            druga.execute("UPDATE film SET dolzina = dolzina + 1 WHERE id = ?", [naj2008.id])
+        zapisano = True
+    except dbapi.OperationalError:
+        zapisano = False
+    assert Film.z_id(naj2008.id).dolzina == dolzina
+assert not conn.in_transaction
+if not zapisano:
+    with druga:
+        druga.execute("UPDATE film SET dolzina = dolzina + 1 WHERE id = ?", [naj2008.id])
+assert Film.z_id(naj2008.id).dolzina == dolzina + 1
+druga.close()
+globine = []
+with Transakcija():
+    nit = threading.Thread(target=lambda: globine.append(Transakcija.globina()))
+    nit.start()
+    nit.join()
+    globine.append(Transakcija.globina())
+assert globine == [0, 1]
+conn.execute("UPDATE film SET dolzina = dolzina WHERE id = ?", [naj2008.id])
+assert conn.in_transaction
+try:
+    with Transakcija(nacin='immediate'):
+        pass
+    assert False, "Način transakcije ne bi smel biti prezrt"
+except ValueError:
+    pass
+conn.commit()
+with Transakcija():
+    try:
+        with Transakcija(nacin='exclusive'):
+            pass
+        assert False, "Način gnezdene transakcije ne bi smel biti prezrt"
+    except ValueError:
+        pass
+    assert Transakcija.globina() == 1
+
+assert subprocess.run([sys.executable, '-c', 'import model, orm; assert not orm.conn.odprta()'],
+                      stdout=subprocess.DEVNULL).returncode == 0
+pot = pot_baze()
+povezi(pot, timeout=1.0)
+assert Film.z_id(naj2008.id).id == naj2008.id and Oseba.NULL.id is None
+assert Film.z_id(naj2008.id).to_dict()['id'] == naj2008.id
+
+pot_predpomnilnika = 'testi.predpomnilnik.sqlite'
+prozilci_generacij = "SELECT name FROM sqlite_master WHERE name LIKE '%_generacija_%'"
+assert not conn.execute(prozilci_generacij).fetchall()
+uporabi_trajni_predpomnilnik(pot_predpomnilnika)
+assert ('film_generacija_update', ) in conn.execute(prozilci_generacij).fetchall()
+naslovi = [str(f) for f in Film.seznam(leto=2008, predpomni=True)]
+predpomnilnik.pocisti()
+zadetki = metrike()['trajni_predpomnilnik_zadetki']
+assert [str(f) for f in Film.seznam(leto=2008, predpomni=True)] == naslovi
+assert metrike()['trajni_predpomnilnik_zadetki'] == zadetki + 1
+with conn:
+    conn.execute("UPDATE film SET naslov = 'Trajno predpomnjen' WHERE id = ?", [naj2008.id])
+assert 'Trajno predpomnjen' in [f.naslov for f in Film.seznam(leto=2008, predpomni=True)]
+assert Film.z_id(naj2008.id, predpomni=True).naslov == 'Trajno predpomnjen'
+with dbapi.connect(pot_baze()) as zunanja:
+    zunanja.execute("UPDATE film SET naslov = 'Zunanje spremenjen' WHERE id = ?", [naj2008.id])
+zunanja.close()
+assert 'Zunanje spremenjen' in [f.naslov for f in Film.seznam(leto=2008, predpomni=True)]
+assert Film.z_id(naj2008.id, predpomni=True).naslov == 'Zunanje spremenjen'
+with conn:
+    conn.execute("UPDATE film SET naslov = 'Trajno predpomnjen' WHERE id = ?", [naj2008.id])
+assert 'Trajno predpomnjen' in [f.naslov for f in Film.seznam(leto=2008, predpomni=True)]
+uporabi_trajni_predpomnilnik(pot_predpomnilnika)
+assert metrike()['predpomnilnik_velikost'] > 0
+zadetki = metrike()['predpomnilnik_zadetki']
+assert 'Trajno predpomnjen' in [f.naslov for f in Film.seznam(leto=2008, predpomni=True)]
+assert metrike()['predpomnilnik_zadetki'] == zadetki + 1
+uporabi_trajni_predpomnilnik(pot_predpomnilnika, najvec_bajtov=200000,
+                             vroci=[('Film', {'leto': leto}) for leto in range(2000, 2010)])
+velikost, = dbapi.connect(pot_predpomnilnika).execute("SELECT TOTAL(velikost) FROM vnosi").fetchone()
+assert 0 < velikost <= 200000
+with conn:
+    conn.execute("UPDATE film SET naslov = ? WHERE id = ?", [naj2008.naslov, naj2008.id])
+uporabi_trajni_predpomnilnik(None)
+for koncnica in ('', '-wal', '-shm'):
+    if os.path.exists(pot_predpomnilnika + koncnica):
+        os.remove(pot_predpomnilnika + koncnica)
+
+film, filmi2008, (_, zasedba) = hkrati(lambda: Film.z_id(naj2008.id),
+                                       lambda: Film.seznam(leto=2008),
+                                       lambda: Film.z_zasedbo(naj2008.id))
+assert film.naslov == naj2008.naslov
+assert [str(f) for f in filmi2008] == [str(f) for f in Film.seznam(leto=2008)]
+assert [v.oseba.id for v in zasedba] == [v.oseba.id for v in Film.z_zasedbo(naj2008.id)[1]]
+rezultati = hkrati(lambda: 1 / 0, lambda: Film.z_id(naj2008.id), izjeme=True)
+assert isinstance(rezultati[0], ZeroDivisionError) and rezultati[1].id == naj2008.id
+try:
+    hkrati(lambda: Film.z_id(naj2008.id), lambda: 1 / 0)
+    assert False, "Napaka poizvedbe bi se morala prenesti"
+except ZeroDivisionError:
+    pass
+try:
+    with Transakcija():
+        film.naslov = 'Nepotrjen naslov'
+        film.posodobi()
+        assert hkrati(lambda: Film.z_id(naj2008.id).naslov) == ['Nepotrjen naslov']
+        raise ValueError
+except ValueError:
+    pass
+assert hkrati(lambda: Film.z_id(naj2008.id).naslov) == [naj2008.naslov]
+drama, = Zanr.seznam(naziv='Drama')
+film = Film(naslov='Vzporedna drama', dolzina=100, leto=2027, ocena=8)
+film.dodaj()
+pripada = Pripada(film=film, zanr=drama)
+pripada.dodaj()
+assert StatistikaZanra.zastarel()
+statistika, = hkrati(lambda: StatistikaZanra.seznam(zanr=drama.id))
+assert not StatistikaZanra.zastarel() and not conn.in_transaction
+try:
+    hkrati(lambda: Film(naslov='Film iz bazena', dolzina=100, leto=2027, ocena=8).dodaj())
+    assert False, "V niti bazena ne bi smelo biti mogoče pisati"
+except ValueError:
+    pass
+try:
+    hkrati(lambda: film.izbrisi(False))
+    assert False, "V niti bazena ne bi smelo biti mogoče pisati"
+except dbapi.OperationalError:
+    pass
+pripada.izbrisi()
+film.izbrisi()
+
+assert nacrt() == []
+Film.LESTVICE['leto'].pobrisi()
+conn.execute("CREATE TABLE film_lestvica_stara (skupina, kljuc);")
+koraki = nacrt()
+assert [(k.razred, k.dejanje) for k in koraki] == [(Film, 'dopolni')]
+assert 'manjka film_lestvica_leto' in koraki[0].razlogi and \
+    'odveč film_lestvica_stara' in koraki[0].razlogi
+migriraj()
+assert nacrt() == []
+preveri_lestvico([2008, 2009])
+conn.execute("DROP TRIGGER film_spremembe_vstavi;")
+conn.execute("DROP TRIGGER film_generacija_update;")
+conn.execute("DROP TRIGGER statistikazanra_pripada_insert;")
+conn.execute("""
+    CREATE TRIGGER oseba_spremembe_vstavi AFTER INSERT ON oseba
+    BEGIN
+        SELECT 1;
+    END;
+""")
+assert {(k.razred, k.dejanje, tuple(k.razlogi)) for k in nacrt()} == {
+    (Film, 'dopolni', ('manjka film_generacija_update', 'manjka film_spremembe_vstavi')),
+    (Oseba, 'dopolni', ('odveč oseba_spremembe_vstavi', )),
+    (StatistikaZanra, 'dopolni', ('manjka statistikazanra_pripada_insert', )),
+}
+migriraj()
+assert nacrt() == []
+
+
+class Poskus(Entiteta):
+    """
+    Razred za preizkus migracij.
+    """
+    id: int = polje(samodejno=True)
+    ime: str = polje(enolicno=True)
+    ocena: float = polje(obvezno=False)
+
+    IME = 'ime'
+
+
+assert [(k.razred, k.dejanje) for k in nacrt()] == [(Poskus, 'ustvari')]
+migriraj()
+assert nacrt() == []
+for i in range(50):
+    Poskus(ime=f"Poskus {i}", ocena=i).dodaj()
+with conn:
+    conn.execute("ALTER TABLE poskus DROP COLUMN ocena;")
+assert [(k.dejanje, k.stolpci) for k in nacrt()] == [('dodaj', ['ocena'])]
+migriraj()
+assert nacrt() == [] and Poskus.z_id(1).ocena is None
+with conn:
+    conn.execute("UPDATE poskus SET ocena = id - 1;")
+    conn.execute("ALTER TABLE poskus RENAME TO poskus_star;")
+    conn.execute("CREATE TABLE poskus (id INTEGER PRIMARY KEY, ime TEXT NOT NULL, "
+                 "ocena TEXT, opomba TEXT);")
+    conn.execute("INSERT INTO poskus SELECT id, ime, ocena, 'x' FROM poskus_star;")
+    conn.execute("DROP TABLE poskus_star;")
+    conn.execute("CREATE INDEX poskus_ocena ON poskus (ocena);")
+assert [(k.dejanje, sorted(k.razlogi)) for k in nacrt()] == \
+    [('prezidaj', ['omejitve UNIQUE', 'stolpec id spremenjen', 'stolpec ocena spremenjen',
+                   'stolpec opomba odstranjen']),
+     ('dopolni', [f'manjka poskus_generacija_{operacija}'
+                  for operacija in ('delete', 'insert', 'update')])]
+pot = pot_baze()
+
+
+def pisi():
+    pisanje = dbapi.connect(pot, timeout=10, isolation_level=None)
+    for i in range(50, 80):
+        pisanje.execute("INSERT INTO poskus (id, ime, ocena) VALUES (?, ?, ?);",
+                        [i + 1, f"Poskus {i}", i])
+        pisanje.execute("UPDATE poskus SET ocena = ocena + 100 WHERE id = ?;", [i - 49])
+        pisanje.execute("DELETE FROM poskus WHERE id = ?;", [i - 19])
+        time.sleep(0.002)
+    pisanje.close()
+
+
+pisar = threading.Thread(target=pisi)
+pisar.start()
+migriraj(paket=5, pavza=0.005)
+pisar.join()
+assert nacrt() == []
+ocene = dict(conn.execute("SELECT id, ocena FROM poskus;").fetchall())
+assert sorted(ocene) == [*range(1, 31), *range(61, 81)]
+assert all(ocene[i] == (i - 1 + 100 if i <= 30 else i - 1) for i in ocene)
+assert conn.execute("SELECT typeof(ocena) FROM poskus WHERE id = 2;").fetchone() == ('real', )
+assert sorted(ime for ime, in conn.execute("SELECT name FROM sqlite_master "
+                                           "WHERE tbl_name = 'poskus' AND sql IS NOT NULL;")) == \
+    ['poskus', *(f'poskus_generacija_{operacija}' for operacija in ('delete', 'insert', 'update')),
+     'poskus_ocena']
+try:
+    Poskus(ime="Poskus 1").dodaj()
+    assert False, "Ime bi moralo biti enolično"
+except ValueError:
+    pass
+Poskus.pobrisi_tabelo()
+Tabela.TABELE.remove(Poskus)
+
+tok = io.StringIO()
+assert Film.izvozi(tok, leto=1925) == len(list(Film.seznam(leto=1925)))
+with open('podatki/film.csv', encoding='utf-8', newline='') as f:
+    vir = [vrstica for vrstica in csv.reader(f) if vrstica[3] in ('leto', '1925')]
+assert list(csv.reader(io.StringIO(tok.getvalue()))) == vir
+tok = io.StringIO()
+Pripada.izvozi(tok, film=naj2008.id)
+assert tok.getvalue().startswith('film,naziv\n') and \
+    {vrstica['naziv'] for vrstica in csv.DictReader(io.StringIO(tok.getvalue()))} == \
+    {p.zanr.naziv for p in Pripada.seznam(film=naj2008.id)}
+tok = io.StringIO()
+n = Vloga.izvozi(tok, oblika='jsonl', pridruzi=True, paket=3, film=naj2008.id)
+vrstice = [json.loads(vrstica) for vrstica in tok.getvalue().splitlines()]
+assert n == len(vrstice) == len(Film.z_zasedbo(naj2008.id)[1])
+assert all(v['film_naslov'] == naj2008.naslov and v['oseba_ime'] for v in vrstice)
+
+with Snemalnik() as snemalnik:
+    for ido in range(1, 6):
+        list(Vloga.seznam(oseba=ido))
+    Oseba.z_id(1)
+assert sorted(oblika.stevilo for oblika in snemalnik.oblike.values()) == [1, 5]
+pot_obremenitve = 'testi.obremenitev.jsonl'
+snemalnik.shrani(pot_obremenitve)
+assert [oblika.sql for oblika in nalozi(pot_obremenitve)] == list(snemalnik.oblike)
+predlogi = svetuj(pot_obremenitve, ponovitve=3)
+os.remove(pot_obremenitve)
+assert str(predlogi[0]) == "CREATE INDEX vloga_oseba_indeks ON vloga (oseba);"
+assert predlogi[0].prihranek > 0 and len(predlogi[0].poizvedbe) == 1
+assert not any(predlog.tabela == 'oseba' for predlog in predlogi)
+with Snemalnik() as snemalnik:
+    with Kazalec() as cur:
+        cur.executemany("UPDATE film SET dolzina = dolzina WHERE id = ?;", [(naj2008.id, )] * 3)
+        cur.executescript("SELECT 1; SELECT 'a;b';")
+assert {oblika.sql: oblika.stevilo for oblika in snemalnik.oblike.values()} == \
+    {"UPDATE film SET dolzina = dolzina WHERE id = ?;": 3, "SELECT 1;": 1, "SELECT 'a;b';": 1}
@@ -0,0 +1,96 @@
+#
+#   Primerjava načinov transakcij in bralnih posnetkov
+#   pri sočasnem dostopu več procesov
+#
+
+import multiprocessing
+import os
+import random
+import sqlite3 as dbapi
+import time
+from orm import conn, povezi, Transakcija, Branje
+
+
+def _pisi(pot, nacin, idji, trajanje, rezultati):
+    """
+    Čim večkrat preberi in posodobi naključen film v transakciji podanega načina
+    ter v vrsto rezultatov zapiši število uspešnih in neuspešnih transakcij.
+    """
+    from model import Film
+    povezi(pot, timeout=1.0)
+    uspesnih = neuspesnih = 0
+    konec = time.monotonic() + trajanje
+    while time.monotonic() < konec:
+        try:
+            with Transakcija(nacin=nacin):
+                film = Film.z_id(random.choice(idji))
+                film.glasovi = (film.glasovi or 0) + 1
+                film.posodobi()
+            uspesnih += 1
+        except (dbapi.OperationalError, ValueError):
+            neuspesnih += 1
+    rezultati.put((uspesnih, neuspesnih))
+
+
+def _beri(pot, branje, idji, trajanje, rezultati):
+    """
+    Čim večkrat preberi podatke o naključnem filmu z več poizvedbami,
+    po potrebi v bralni transakciji, in v vrsto rezultatov zapiši
+    število branj in število neskladnih branj.
+    """
+    from model import Film
+    povezi(pot, timeout=1.0)
+    branj = neskladnih = 0
+    konec = time.monotonic() + trajanje
+    while time.monotonic() < konec:
+        idf = random.choice(idji)
+        try:
+            if branje:
+                with Branje():
+                    prej, potem = Film.z_id(idf).glasovi, Film.z_id(idf).glasovi
+            else:
+                prej, potem = Film.z_id(idf).glasovi, Film.z_id(idf).glasovi
+        except dbapi.OperationalError:
+            continue
+        branj += 1
+        neskladnih += prej != potem
+    rezultati.put((branj, neskladnih))
+
+
+def primerjaj(pot, pisarji=4, bralci=2, trajanje=3, filmov=20):
+    """
+    Izpiši prepustnost in število napak pisarjev za vse načine transakcij
+    ter število neskladnih branj z in brez bralne transakcije.
+
+    Pisarji posodabljajo le `filmov` filmov, da prihaja do sporov.
+    """
+    from model import Film
+    idji = [int(idf) for idf in Film.stolpci('id')['id'][:filmov]]
+    kontekst = multiprocessing.get_context('spawn')
+    for nacin in (None, *Transakcija.NACINI):
+        for branje in (False, True):
+            pisanja, branja = kontekst.Queue(), kontekst.Queue()
+            procesi = [kontekst.Process(target=_pisi, args=(pot, nacin, idji, trajanje, pisanja))
+                       for _ in range(pisarji)] + \
+                      [kontekst.Process(target=_beri, args=(pot, branje, idji, trajanje, branja))
+                       for _ in range(bralci)]
+            for proces in procesi:
+                proces.start()
+            uspesnih, neuspesnih = map(sum, zip(*(pisanja.get() for _ in range(pisarji))))
+            branj, neskladnih = map(sum, zip(*(branja.get() for _ in range(bralci))))
+            for proces in procesi:
+                proces.join()
+            print(f"{nacin or 'implicitno':10} {'z branjem' if branje else 'brez branja':12}: "
+                  f"{uspesnih / trajanje:6.0f} transakcij/s, neuspešnih: {neuspesnih:4}, "
+                  f"branj: {branj:5}, neskladnih: {neskladnih}")
+
+
+if __name__ == '__main__':
+    kopija = 'filmi.transakcije.sqlite'
+    baza = dbapi.connect(kopija)
+    conn.backup(baza)
+    baza.close()
+    try:
+        primerjaj(kopija)
+    finally:
+        os.remove(kopija)
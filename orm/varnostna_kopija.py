@@ -0,0 +1,198 @@
+#
+#   Varnostno kopiranje baze filmi.sqlite med delovanjem
+#
+
+import os
+import sqlite3 as dbapi
+import threading
+import time
+from orm import pot_baze
+
+
+class _Prekinitev(Exception):
+    """
+    Napaka, s katero se prekine postopno kopiranje, ki se je prevečkrat začelo znova.
+    """
+
+
+class VarnostnaKopija:
+    """
+    Varnostno kopiranje baze z omejeno pasovno širino.
+    """
+
+    def __init__(self, cilj, strani=64, pavza=0.01, porocaj=None, vir=None,
+                 najvec_ponovitev=10):
+        """
+        Konstruktor varnostnega kopiranja baze na poti `vir` v datoteko `cilj`.
+
+        Če vir ni podan, se kopira glavna baza.
+
+        Kopira se po `strani` strani naenkrat, med koraki pa se počaka `pavza` sekund,
+        tako da je prepustnost omejena na približno `strani` * velikost strani / `pavza`.
+        Funkcija `porocaj` se po vsakem koraku pokliče s številom prenesenih strani,
+        številom vseh strani in dosedanjo prepustnostjo v bajtih na sekundo.
+
+        Če v bazo med kopiranjem piše druga povezava, se kopiranje začne znova.
+        Ko se to zgodi več kot `najvec_ponovitev`-krat,
+        se baza namesto tega kopira v enem koraku brez omejitve prepustnosti.
+        """
+        self.cilj = cilj
+        self.vir = pot_baze() if vir is None else vir
+        self.strani = strani
+        self.pavza = pavza
+        self.porocaj = porocaj
+        self.najvec_ponovitev = najvec_ponovitev
+        self.napredek = (0, None)
+        self.ponovitve = 0
+
+    def izvedi(self):
+        """
+        Izvedi varnostno kopiranje in vrni slovar s statistiko.
+
+        Kopija se zapiše v začasno datoteko, ki na koncu atomarno zamenja ciljno.
+        Če kopiranje ni uspešno, se začasna datoteka odstrani.
+        Statistika vsebuje tudi število ponovnih začetkov kopiranja
+        in podatek, ali je bila baza na koncu kopirana v enem koraku.
+        """
+        zacasna = f"{self.cilj}.{os.getpid()}.tmp"
+        vir = dbapi.connect(self.vir)
+        velikost = vir.execute("PRAGMA page_size;").fetchone()[0]
+        zacetek = time.monotonic()
+        self.napredek = (0, None)
+        self.ponovitve = 0
+        v_enem_koraku = False
+
+        def korak(status, preostalo, skupaj):
+            if skupaj - preostalo <= self.napredek[0]:
+                self.ponovitve += 1
+                if self.ponovitve > self.najvec_ponovitev:
+                    raise _Prekinitev
+            self.napredek = (skupaj - preostalo, skupaj)
+            if self.porocaj:
+                self.porocaj(skupaj - preostalo, skupaj,
+                             (skupaj - preostalo) * velikost / (time.monotonic() - zacetek))
+            if preostalo:
+                time.sleep(self.pavza)
+
+        try:
+            kopija = dbapi.connect(zacasna)
+            try:
+                try:
+                    vir.backup(kopija, pages=self.strani, progress=korak)
+                except _Prekinitev:
+                    v_enem_koraku = True
+                    vir.backup(kopija)
+                    strani = vir.execute("PRAGMA page_count;").fetchone()[0]
+                    self.napredek = (strani, strani)
+            finally:
+                kopija.close()
+            os.replace(zacasna, self.cilj)
+        except BaseException:
+            if os.path.exists(zacasna):
+                os.remove(zacasna)
+            raise
+        finally:
+            vir.close()
+        cas = time.monotonic() - zacetek
+        strani, _ = self.napredek
+        return dict(strani=strani, bajti=strani * velikost, cas=cas,
+                    prepustnost=strani * velikost / cas, ponovitve=self.ponovitve,
+                    v_enem_koraku=v_enem_koraku)
+
+
+class Razpored:
+    """
+    Periodično varnostno kopiranje v niti v ozadju.
+    """
+
+    def __init__(self, cilj, interval, **kwargs):
+        """
+        Konstruktor razporeda.
+
+        Kopija se naredi vsakih `interval` sekund.
+        Ime ciljne datoteke lahko vsebuje oznake za `time.strftime`
+        (npr. `kopije/filmi-%Y%m%d-%H%M.sqlite`).
+        Ostali parametri se podajo razredu `VarnostnaKopija`.
+        """
+        self.cilj = cilj
+        self.interval = interval
+        self.kwargs = kwargs
+        self.kwargs.setdefault('vir', pot_baze())
+        self.zadnja = None
+        self.napaka = None
+        self.ustavi = threading.Event()
+        self.nit = None
+
+    def _kopiraj(self):
+        """
+        Periodično izvajaj varnostno kopiranje, dokler razpored ni ustavljen.
+        """
+        while not self.ustavi.wait(self.interval):
+            try:
+                self.zadnja = VarnostnaKopija(time.strftime(self.cilj),
+                                              **self.kwargs).izvedi()
+                self.napaka = None
+            except (dbapi.Error, OSError) as napaka:
+                self.napaka = napaka
+
+    def zazeni(self):
+        """
+        Zaženi nit za varnostno kopiranje.
+        """
+        self.ustavi.clear()
+        self.nit = threading.Thread(target=self._kopiraj, daemon=True)
+        self.nit.start()
+
+    def zaustavi(self):
+        """
+        Ustavi nit za varnostno kopiranje in počakaj, da se zaključi.
+        """
+        self.ustavi.set()
+        self.nit.join()
+
+
+def _zakasnitve(trajanje):
+    """
+    Vrni urejen seznam zakasnitev nalaganja najbolje ocenjenih filmov
+    v milisekundah, merjenih `trajanje` sekund.
+    """
+    from model import Film
+    zakasnitve = []
+    konec = time.monotonic() + trajanje
+    leto = 1990
+    while time.monotonic() < konec:
+        zacetek = time.perf_counter()
+        list(Film.najboljsi_v_letu(leto))
+        zakasnitve.append((time.perf_counter() - zacetek) * 1000)
+        leto = 1990 + (leto - 1989) % 30
+    return sorted(zakasnitve)
+
+
+if __name__ == '__main__':
+    cilj = 'filmi.kopija.sqlite'
+    vir = pot_baze()
+    for opis, kwargs in [('brez kopiranja', None),
+                         ('neomejeno kopiranje', dict(strani=-1, pavza=0, vir=vir)),
+                         ('omejeno kopiranje', dict(strani=64, pavza=0.01, vir=vir))]:
+        kopije = []
+        ustavi = threading.Event()
+
+        def kopiraj():
+            while not ustavi.is_set():
+                kopije.append(VarnostnaKopija(cilj, **kwargs).izvedi())
+
+        if kwargs is not None:
+            nit = threading.Thread(target=kopiraj)
+            nit.start()
+        zakasnitve = _zakasnitve(3)
+        if kwargs is not None:
+            ustavi.set()
+            nit.join()
+        p50 = zakasnitve[len(zakasnitve) // 2]
+        p99 = zakasnitve[int(len(zakasnitve) * 0.99)]
+        prepustnost = sum(k['prepustnost'] for k in kopije) / len(kopije) / 2 ** 20 \
+            if kopije else 0
+        print(f"{opis:20}: p50 = {p50:.2f} ms, p99 = {p99:.2f} ms, "
+              f"kopij: {len(kopije)}, prepustnost: {prepustnost:.1f} MiB/s")
+    if os.path.exists(cilj):
+        os.remove(cilj)